@@ -0,0 +1,28 @@
+"""Link crypto trades to assets for multi-coin ledger
+
+Revision ID: crypto_trades_asset_id
+Revises: uuid_initial_schema_v2
+Create Date: 2026-10-19 10:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+# revision identifiers, used by Alembic.
+revision: str = 'crypto_trades_asset_id'
+down_revision: Union[str, None] = 'uuid_initial_schema_v2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # NULLの既存行はBTCとして扱う
+    op.add_column('btc_trades', sa.Column('asset_id', UUID(as_uuid=True), nullable=True))
+    op.create_foreign_key('fk_btc_trades_asset_id', 'btc_trades', 'assets', ['asset_id'], ['id'])
+    op.create_index('ix_btc_trades_asset_timestamp', 'btc_trades', ['asset_id', 'timestamp'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_btc_trades_asset_timestamp', table_name='btc_trades')
+    op.drop_constraint('fk_btc_trades_asset_id', 'btc_trades', type_='foreignkey')
+    op.drop_column('btc_trades', 'asset_id')
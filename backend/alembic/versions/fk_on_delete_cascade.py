@@ -0,0 +1,35 @@
+"""Cascade holding / price deletes in the database
+
+Revision ID: fk_on_delete_cascade
+Revises: valuation_rollups
+Create Date: 2026-10-19 15:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'fk_on_delete_cascade'
+down_revision: Union[str, None] = 'valuation_rollups'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (テーブル, 列, 参照先テーブル) -- 制約名はPostgreSQLの自動命名
+FOREIGN_KEYS = [
+    ('holdings', 'asset_id', 'assets'),
+    ('holdings', 'owner_id', 'owners'),
+    ('prices', 'asset_id', 'assets'),
+]
+
+def _recreate(ondelete: Union[str, None]) -> None:
+    for table, column, referent in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referent, [column], ['id'], ondelete=ondelete)
+
+def upgrade() -> None:
+    # ORMで子行を読み込んで削除する代わりに、DBのON DELETE CASCADEで削除
+    _recreate('CASCADE')
+
+def downgrade() -> None:
+    _recreate(None)
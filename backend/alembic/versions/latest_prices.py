@@ -0,0 +1,142 @@
+"""Add latest_prices, maintained by a trigger on prices
+
+Revision ID: latest_prices
+Revises: prices_partitioned
+Create Date: 2026-10-19 17:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'latest_prices'
+down_revision: Union[str, None] = 'prices_partitioned'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# デフォルトパーティションから切り出した行を latest_prices に反映する版（prices_partitioned の関数を置き換え）
+ENSURE_PARTITION_WITH_LATEST = """
+    CREATE OR REPLACE FUNCTION ensure_prices_partition(year int) RETURNS void AS $$
+    DECLARE
+        name text := 'prices_' || year;
+        lower date := make_date(year, 1, 1);
+        upper date := make_date(year + 1, 1, 1);
+    BEGIN
+        IF to_regclass(name) IS NOT NULL THEN
+            RETURN;
+        END IF;
+        EXECUTE format('CREATE TABLE %I (LIKE prices INCLUDING DEFAULTS)', name);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM prices_default WHERE date >= %L AND date < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            lower, upper, name
+        );
+        EXECUTE format('ALTER TABLE prices ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', name, lower, upper);
+        -- 移動した行はアタッチ前のテーブルに入ったのでトリガーが動いていない
+        EXECUTE format(
+            'INSERT INTO latest_prices (asset_id, date, price, source, updated_at) '
+            'SELECT DISTINCT ON (asset_id) asset_id, date, price, source, updated_at FROM %I '
+            'ORDER BY asset_id, date DESC '
+            'ON CONFLICT (asset_id) DO UPDATE SET date = EXCLUDED.date, price = EXCLUDED.price, '
+            'source = EXCLUDED.source, updated_at = EXCLUDED.updated_at '
+            'WHERE latest_prices.date <= EXCLUDED.date',
+            name
+        );
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+# prices_partitioned の元の版（downgrade用）
+ENSURE_PARTITION = """
+    CREATE OR REPLACE FUNCTION ensure_prices_partition(year int) RETURNS void AS $$
+    DECLARE
+        name text := 'prices_' || year;
+        lower date := make_date(year, 1, 1);
+        upper date := make_date(year + 1, 1, 1);
+    BEGIN
+        IF to_regclass(name) IS NOT NULL THEN
+            RETURN;
+        END IF;
+        EXECUTE format('CREATE TABLE %I (LIKE prices INCLUDING DEFAULTS)', name);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM prices_default WHERE date >= %L AND date < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            lower, upper, name
+        );
+        EXECUTE format('ALTER TABLE prices ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', name, lower, upper);
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+def upgrade() -> None:
+    op.create_table(
+        'latest_prices',
+        sa.Column('asset_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('source', sa.String(length=50), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['asset_id'], ['assets.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('asset_id')
+    )
+
+    # 行トリガー（パーティションにも継承される）。
+    # INSERT/UPDATE は日付が同じか新しければ置き換え、
+    # 最新行が削除・移動された場合はその銘柄の最新行を探し直す
+    op.execute("""
+        CREATE OR REPLACE FUNCTION prices_sync_latest() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                IF TG_OP = 'DELETE' OR OLD.asset_id <> NEW.asset_id OR OLD.date <> NEW.date THEN
+                    DELETE FROM latest_prices WHERE asset_id = OLD.asset_id AND date = OLD.date;
+                    IF FOUND THEN
+                        -- 銘柄ごと削除中（ON DELETE CASCADE）の場合は assets に行がないので作らない
+                        INSERT INTO latest_prices (asset_id, date, price, source, updated_at)
+                        SELECT p.asset_id, p.date, p.price, p.source, p.updated_at
+                        FROM prices p
+                        JOIN assets a ON a.id = p.asset_id
+                        WHERE p.asset_id = OLD.asset_id
+                        ORDER BY p.date DESC
+                        LIMIT 1
+                        ON CONFLICT (asset_id) DO NOTHING;
+                    END IF;
+                END IF;
+            END IF;
+
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO latest_prices (asset_id, date, price, source, updated_at)
+                VALUES (NEW.asset_id, NEW.date, NEW.price, NEW.source, NEW.updated_at)
+                ON CONFLICT (asset_id) DO UPDATE SET
+                    date = EXCLUDED.date,
+                    price = EXCLUDED.price,
+                    source = EXCLUDED.source,
+                    updated_at = EXCLUDED.updated_at
+                WHERE latest_prices.date <= EXCLUDED.date;
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER prices_sync_latest
+        AFTER INSERT OR UPDATE OR DELETE ON prices
+        FOR EACH ROW EXECUTE FUNCTION prices_sync_latest()
+    """)
+
+    op.execute(ENSURE_PARTITION_WITH_LATEST)
+
+    op.execute("""
+        INSERT INTO latest_prices (asset_id, date, price, source, updated_at)
+        SELECT DISTINCT ON (asset_id) asset_id, date, price, source, updated_at
+        FROM prices
+        ORDER BY asset_id, date DESC
+    """)
+
+def downgrade() -> None:
+    op.execute(ENSURE_PARTITION)
+    op.execute("DROP TRIGGER prices_sync_latest ON prices")
+    op.execute("DROP FUNCTION prices_sync_latest()")
+    op.drop_table('latest_prices')
@@ -0,0 +1,122 @@
+"""Partition prices by year with time-ordered ids
+
+Revision ID: prices_partitioned
+Revises: fk_on_delete_cascade
+Create Date: 2026-10-19 16:00:00.000000
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'prices_partitioned'
+down_revision: Union[str, None] = 'fk_on_delete_cascade'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "id, asset_id, date, price, open, high, low, volume, source, created_at, updated_at"
+
+def upgrade() -> None:
+    # UUIDv7（先頭48bitがミリ秒のUnix時刻）。gen_random_uuid() のversionビットを7に書き換える
+    op.execute("""
+        CREATE OR REPLACE FUNCTION uuid_generate_v7() RETURNS uuid AS $$
+            SELECT encode(
+                set_bit(set_bit(
+                    overlay(uuid_send(gen_random_uuid())
+                        placing substring(int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::bigint) FROM 3)
+                        FROM 1 FOR 6),
+                    52, 1), 53, 1),
+                'hex')::uuid
+        $$ LANGUAGE sql VOLATILE
+    """)
+
+    # 年のパーティションを作成（デフォルトパーティションに入っていた行は移動してからATTACH）
+    op.execute("""
+        CREATE OR REPLACE FUNCTION ensure_prices_partition(year int) RETURNS void AS $$
+        DECLARE
+            name text := 'prices_' || year;
+            lower date := make_date(year, 1, 1);
+            upper date := make_date(year + 1, 1, 1);
+        BEGIN
+            IF to_regclass(name) IS NOT NULL THEN
+                RETURN;
+            END IF;
+            EXECUTE format('CREATE TABLE %I (LIKE prices INCLUDING DEFAULTS)', name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM prices_default WHERE date >= %L AND date < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                lower, upper, name
+            );
+            EXECUTE format('ALTER TABLE prices ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', name, lower, upper);
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    # 既存テーブルを退避（インデックス名はスキーマ内で一意なので改名）
+    op.execute("ALTER TABLE prices RENAME TO prices_legacy")
+    op.execute("ALTER INDEX prices_pkey RENAME TO prices_legacy_pkey")
+    op.execute("ALTER INDEX _asset_date_uc RENAME TO prices_legacy_asset_date_uc")
+
+    op.execute(f"""
+        CREATE TABLE prices (
+            id uuid NOT NULL DEFAULT uuid_generate_v7(),
+            asset_id uuid NOT NULL REFERENCES assets (id) ON DELETE CASCADE,
+            date date NOT NULL,
+            price double precision NOT NULL,
+            open double precision,
+            high double precision,
+            low double precision,
+            volume double precision,
+            source varchar(50),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT prices_pkey PRIMARY KEY (id, date),
+            CONSTRAINT _asset_date_uc UNIQUE (asset_id, date)
+        ) PARTITION BY RANGE (date)
+    """)
+    op.execute("CREATE TABLE prices_default PARTITION OF prices DEFAULT")
+    # 日付順に追記されるのでBRINで十分（旧 ix_prices_date / ix_prices_id / ix_prices_asset_date は不要）
+    op.execute("CREATE INDEX ix_prices_date_brin ON prices USING brin (date)")
+
+    bind = op.get_bind()
+    first_year = bind.exec_driver_sql("SELECT min(date) FROM prices_legacy").scalar()
+    first_year = first_year.year if first_year else date.today().year
+    for year in range(first_year, date.today().year + 2):
+        op.execute(f"SELECT ensure_prices_partition({year})")
+
+    # 既存行はIDを維持したまま移す
+    op.execute(f"INSERT INTO prices ({COLUMNS}) SELECT {COLUMNS} FROM prices_legacy")
+    op.execute("DROP TABLE prices_legacy")
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE prices RENAME TO prices_partitioned")
+    op.execute("ALTER INDEX prices_pkey RENAME TO prices_partitioned_pkey")
+    op.execute("ALTER INDEX _asset_date_uc RENAME TO prices_partitioned_asset_date_uc")
+    op.execute("ALTER INDEX ix_prices_date_brin RENAME TO ix_prices_partitioned_date_brin")
+
+    op.execute("""
+        CREATE TABLE prices (
+            id uuid NOT NULL DEFAULT uuid_generate_v4(),
+            asset_id uuid NOT NULL REFERENCES assets (id) ON DELETE CASCADE,
+            date date NOT NULL,
+            price double precision NOT NULL,
+            open double precision,
+            high double precision,
+            low double precision,
+            volume double precision,
+            source varchar(50),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT prices_pkey PRIMARY KEY (id),
+            CONSTRAINT _asset_date_uc UNIQUE (asset_id, date)
+        )
+    """)
+    op.execute(f"INSERT INTO prices ({COLUMNS}) SELECT {COLUMNS} FROM prices_partitioned")
+    op.execute("DROP TABLE prices_partitioned")
+    op.create_index('ix_prices_id', 'prices', ['id'], unique=False)
+    op.create_index('ix_prices_date', 'prices', ['date'], unique=False)
+    op.create_index('ix_prices_asset_date', 'prices', ['asset_id', 'date'], unique=False)
+
+    op.execute("DROP FUNCTION ensure_prices_partition(int)")
+    op.execute("DROP FUNCTION uuid_generate_v7()")
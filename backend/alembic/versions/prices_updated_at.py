@@ -0,0 +1,24 @@
+"""Track when each price row was last refreshed
+
+Revision ID: prices_updated_at
+Revises: crypto_trades_asset_id
+Create Date: 2026-10-19 11:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'prices_updated_at'
+down_revision: Union[str, None] = 'crypto_trades_asset_id'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.add_column('prices', sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    # 既存行は作成時刻を鮮度とみなす
+    op.execute("UPDATE prices SET updated_at = created_at WHERE created_at IS NOT NULL")
+
+def downgrade() -> None:
+    op.drop_column('prices', 'updated_at')
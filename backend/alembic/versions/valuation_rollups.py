@@ -0,0 +1,67 @@
+"""Add weekly / monthly / yearly valuation rollups
+
+Revision ID: valuation_rollups
+Revises: prices_updated_at
+Create Date: 2026-10-19 14:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'valuation_rollups'
+down_revision: Union[str, None] = 'prices_updated_at'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_table(
+        'valuation_rollups',
+        sa.Column('granularity', sa.String(length=10), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('last_date', sa.Date(), nullable=False),
+        sa.Column('total_jpy', sa.Float(), nullable=False),
+        sa.Column('total_usd', sa.Float(), nullable=False),
+        sa.Column('total_btc', sa.Float(), nullable=False),
+        sa.Column('breakdown_by_category', sa.JSON(), nullable=True),
+        sa.Column('breakdown_by_currency', sa.JSON(), nullable=True),
+        sa.Column('breakdown_by_account_type', sa.JSON(), nullable=True),
+        sa.Column('high_jpy', sa.Float(), nullable=False),
+        sa.Column('low_jpy', sa.Float(), nullable=False),
+        sa.Column('snapshot_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('granularity', 'period_start')
+    )
+
+    # 既存スナップショットから一括で作成（date_trunc('week') は月曜始まり）
+    for granularity in ('week', 'month', 'year'):
+        op.execute(f"""
+            INSERT INTO valuation_rollups (
+                granularity, period_start, last_date, total_jpy, total_usd, total_btc,
+                breakdown_by_category, breakdown_by_currency, breakdown_by_account_type,
+                high_jpy, low_jpy, snapshot_count
+            )
+            SELECT
+                '{granularity}', last.period_start, last.date, last.total_jpy, last.total_usd, last.total_btc,
+                last.breakdown_by_category, last.breakdown_by_currency, last.breakdown_by_account_type,
+                stats.high_jpy, stats.low_jpy, stats.snapshot_count
+            FROM (
+                SELECT DISTINCT ON (date_trunc('{granularity}', date))
+                    date_trunc('{granularity}', date)::date AS period_start, *
+                FROM valuation_snapshots
+                ORDER BY date_trunc('{granularity}', date), date DESC
+            ) AS last
+            JOIN (
+                SELECT
+                    date_trunc('{granularity}', date)::date AS period_start,
+                    max(total_jpy) AS high_jpy,
+                    min(total_jpy) AS low_jpy,
+                    count(*) AS snapshot_count
+                FROM valuation_snapshots
+                GROUP BY 1
+            ) AS stats USING (period_start)
+        """)
+
+def downgrade() -> None:
+    op.drop_table('valuation_rollups')
@@ -1,21 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List, Optional
+from sqlalchemy import delete, exists, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from typing import Dict, Iterable, List, Optional, Tuple
 import logging
 import traceback
 import uuid  # 🔧 追加: uuid インポート
-from sqlalchemy.orm import selectinload
-from app.database import get_db
-from app.models import Asset, User
+from app.database import get_db, get_read_db
+from app.models import Asset, BTCTrade, Holding, User
 from app.api.auth import get_current_user
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from app.models.asset import AssetClass, AssetType, Region
+from app.responses import FastJSONResponse
+from app.services.read_models import ASSET_COLUMNS, read
 from uuid import UUID
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# 一括登録・更新の1リクエストあたりの上限
+MAX_BULK_ROWS = 1000
+
 # Pydantic models
 class AssetCreate(BaseModel):
     symbol: Optional[str] = None  # ティッカーは任意
@@ -54,6 +60,48 @@ class AssetResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class AssetBulkCreate(BaseModel):
+    assets: List[AssetCreate] = Field(..., min_length=1, max_length=MAX_BULK_ROWS)
+
+class AssetBulkUpdateItem(AssetUpdate):
+    id: UUID
+
+class AssetBulkUpdate(BaseModel):
+    assets: List[AssetBulkUpdateItem] = Field(..., min_length=1, max_length=MAX_BULK_ROWS)
+
+class BulkRowError(BaseModel):
+    index: int  # リクエスト内の行番号（0始まり）
+    error: str
+
+class AssetBulkResponse(BaseModel):
+    processed: int
+    errors: List[BulkRowError]
+    assets: List[AssetResponse]
+
+def _unique_key(symbol: Optional[str], asset_type: Optional[AssetType]) -> Optional[Tuple[str, AssetType]]:
+    """Key of _symbol_asset_type_uc (rows with a NULL part never conflict)"""
+    if symbol and asset_type:
+        return symbol, asset_type
+    return None
+
+async def _existing_unique_keys(db: AsyncSession, keys: Iterable[Tuple[str, AssetType]]) -> Dict[Tuple[str, AssetType], uuid.UUID]:
+    """(symbol, asset_type) -> id of the assets that already use one of keys, in one query"""
+    keys = list(keys)
+    if not keys:
+        return {}
+    result = await db.execute(
+        select(Asset.symbol, Asset.asset_type, Asset.id)
+        .where(tuple_(Asset.symbol, Asset.asset_type).in_(keys))
+    )
+    return {(row.symbol, row.asset_type): row.id for row in result}
+
+def _bulk_response(processed: int, errors: List[dict], rows: List[dict]) -> FastJSONResponse:
+    return FastJSONResponse({
+        "processed": processed,
+        "errors": sorted(errors, key=lambda error: error["index"]),
+        "assets": rows,
+    })
+
 # Routes
 @router.get("/", response_model=List[AssetResponse])
 async def get_assets(
@@ -61,12 +109,13 @@ async def get_assets(
     asset_type: Optional[AssetType] = None,
     region: Optional[Region] = None,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     try:
         logger.info("Starting get_assets")
         
-        query = select(Asset)
+        # ORMオブジェクト/Pydanticモデルを作らず、列をそのままJSON化
+        query = select(*ASSET_COLUMNS)
         if asset_class:
             query = query.where(Asset.asset_class == asset_class)
         if asset_type:
@@ -74,33 +123,8 @@ async def get_assets(
         if region:
             query = query.where(Asset.region == region)
 
-        result = await db.execute(query.order_by(Asset.name))
-        assets = result.scalars().all()
-        
-        logger.info(f"Found {len(assets)} assets")
-        
-        response_list = []
-        for a in assets:
-            try:
-                asset_response = AssetResponse(
-                    id=str(a.id),  # UUID to string
-                    symbol=a.symbol,
-                    name=a.name,
-                    asset_class=a.asset_class.value,
-                    asset_type=a.asset_type.value if a.asset_type else None,
-                    region=a.region.value if a.region else None,
-                    sub_category=a.sub_category,  # サブカテゴリ追加
-                    currency=a.currency,
-                    exchange=a.exchange,
-                    isin=a.isin,
-                )
-                response_list.append(asset_response)
-            except Exception as e:
-                logger.error(f"Error processing asset {a.id}: {str(e)}")
-                continue
-        
-        logger.info(f"Successfully processed {len(response_list)} assets")
-        return response_list
+        rows = await read(db, query.order_by(Asset.name))
+        return FastJSONResponse([row._asdict() for row in rows])
         
     except Exception as e:
         logger.error(f"Error in get_assets: {str(e)}")
@@ -146,6 +170,128 @@ async def create_asset(
         logger.error(f"Error creating asset: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating asset: {str(e)}")
 
+@router.post("/bulk", response_model=AssetBulkResponse)
+async def bulk_create_assets(
+    payload: AssetBulkCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create many assets in one transaction.
+
+    Rows that duplicate an existing asset (or an earlier row of the request)
+    are reported in errors; the remaining rows are still created.
+    """
+    errors = []
+    rows: Dict[int, dict] = {}
+    index_by_key: Dict[Tuple[str, AssetType], int] = {}
+
+    for index, item in enumerate(payload.assets):
+        values = item.dict()
+        key = _unique_key(values["symbol"], values["asset_type"])
+        if key is not None:
+            if key in index_by_key:
+                errors.append({"index": index, "error": f"Duplicate of row {index_by_key[key]}"})
+                continue
+            index_by_key[key] = index
+        # IDを先に振っておき、RETURNINGの結果を行番号に対応付ける
+        rows[index] = {"id": uuid.uuid4(), **values}
+
+    for key in await _existing_unique_keys(db, index_by_key):
+        index = index_by_key[key]
+        rows.pop(index)
+        errors.append({"index": index, "error": "Asset already exists"})
+
+    created = {}
+    if rows:
+        # 確認後に他のリクエストが同じ銘柄を登録した場合も、その行だけスキップ
+        result = await db.execute(
+            insert(Asset)
+            .values(list(rows.values()))
+            .on_conflict_do_nothing(constraint="_symbol_asset_type_uc")
+            .returning(*ASSET_COLUMNS)
+        )
+        created = {row["id"]: dict(row) for row in result.mappings()}
+        await db.commit()
+
+    created_rows = []
+    for index, values in rows.items():
+        if values["id"] in created:
+            created_rows.append(created[values["id"]])
+        else:
+            errors.append({"index": index, "error": "Asset already exists"})
+
+    logger.info(f"Bulk created {len(created_rows)} assets ({len(errors)} rejected)")
+    return _bulk_response(len(created_rows), errors, created_rows)
+
+@router.put("/bulk", response_model=AssetBulkResponse)
+async def bulk_update_assets(
+    payload: AssetBulkUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Update many assets in one transaction; only the fields sent for a row change"""
+    result = await db.execute(
+        select(Asset.id, Asset.symbol, Asset.asset_type)
+        .where(Asset.id.in_({item.id for item in payload.assets}))
+    )
+    current = {row.id: row for row in result}
+
+    errors = []
+    updates: Dict[int, dict] = {}
+    index_by_id: Dict[uuid.UUID, int] = {}
+    index_by_key: Dict[Tuple[str, AssetType], int] = {}
+
+    for index, item in enumerate(payload.assets):
+        if item.id not in current:
+            errors.append({"index": index, "error": "Asset not found"})
+            continue
+        if item.id in index_by_id:
+            errors.append({"index": index, "error": f"Duplicate of row {index_by_id[item.id]}"})
+            continue
+
+        values = item.dict(exclude_unset=True, exclude={"id"})
+        key = _unique_key(
+            values.get("symbol", current[item.id].symbol),
+            values.get("asset_type", current[item.id].asset_type),
+        )
+        if key is not None:
+            if key in index_by_key:
+                errors.append({"index": index, "error": f"Same symbol and type as row {index_by_key[key]}"})
+                continue
+            index_by_key[key] = index
+
+        index_by_id[item.id] = index
+        updates[index] = {"id": item.id, **values}
+
+    for key, existing_id in (await _existing_unique_keys(db, index_by_key)).items():
+        index = index_by_key[key]
+        if existing_id != updates[index]["id"]:
+            del index_by_id[updates.pop(index)["id"]]
+            errors.append({"index": index, "error": "Asset with this symbol and type already exists"})
+
+    for index, values in list(updates.items()):
+        if len(values) == 1:
+            continue
+        try:
+            # 行ごとのセーブポイント（例: 2行でシンボルを入れ替えると途中で一意制約に当たる）。
+            # 失敗した行だけ取り消し、他の行は反映する
+            async with db.begin_nested():
+                await db.execute(update(Asset), [values])
+        except IntegrityError as e:
+            logger.warning(f"Bulk asset update row {index} conflicted: {e}")
+            del index_by_id[updates.pop(index)["id"]]
+            errors.append({"index": index, "error": "Asset with this symbol and type already exists"})
+
+    rows = []
+    if updates:
+        result = await db.execute(select(*ASSET_COLUMNS).where(Asset.id.in_(index_by_id)))
+        updated = {row["id"]: dict(row) for row in result.mappings()}
+        rows = [updated[values["id"]] for values in updates.values()]
+    await db.commit()
+
+    logger.info(f"Bulk updated {len(rows)} assets ({len(errors)} rejected)")
+    return _bulk_response(len(rows), errors, rows)
+
 @router.get("/enums")
 async def get_asset_enums(current_user: User = Depends(get_current_user)):
     """Get asset enum values with Japanese labels"""
@@ -189,7 +335,7 @@ async def get_asset_enums(current_user: User = Depends(get_current_user)):
 async def get_asset(
     asset_id: str,  # UUID string
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     try:
         asset_uuid = uuid.UUID(asset_id)  # 🔧 修正: uuid.UUID を正しく使用
@@ -225,20 +371,24 @@ async def delete_asset(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid asset ID format")
     
+    # Holdings・取引履歴がある場合は削除を拒否（EXISTSで確認し、コレクションは読み込まない）
     result = await db.execute(
-        select(Asset)
-        .options(selectinload(Asset.holdings))
-        .where(Asset.id == asset_uuid)
+        select(
+            exists().where(Asset.id == asset_uuid),
+            exists().where(Holding.asset_id == asset_uuid),
+            exists().where(BTCTrade.asset_id == asset_uuid)
+        )
     )
-    asset = result.scalar_one_or_none()
-    if asset is None:
+    asset_exists, has_holdings, has_trades = result.one()
+    if not asset_exists:
         raise HTTPException(status_code=404, detail="Asset not found")
-
-    # 任意: Holdings がある場合は削除を拒否
-    if asset.holdings:
+    if has_holdings:
         raise HTTPException(status_code=400, detail="Cannot delete asset with holdings")
+    if has_trades:
+        raise HTTPException(status_code=400, detail="Cannot delete asset with trades")
 
-    await db.delete(asset)
+    # 価格履歴はON DELETE CASCADEでDB側が削除する
+    await db.execute(delete(Asset).where(Asset.id == asset_uuid))
     await db.commit()
     return {"message": "Asset deleted"}
 
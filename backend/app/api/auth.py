@@ -10,9 +10,11 @@ import qrcode
 import io
 import base64
 
-from app.database import get_db
+from app.database import current_writer, get_db
 from app.config import settings
 from app.models import User
+from app.executors import run_in_thread
+from app.services.principal_cache import Principal, cache_principal, get_cached_principal, principal_generation
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -47,6 +49,17 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def render_qr_code(data: str) -> str:
+    """PNG QR code as a data URI"""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    
+    img = qr.make_image(fill_color="black", back_color="white")
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return f"data:image/png;base64,{base64.b64encode(buf.getvalue()).decode()}"
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -57,7 +70,13 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Principal:
+    """Authenticated principal for the request.
+
+    Served from the principal cache when possible, so most requests run no
+    users query. Returns a read-only Principal; handlers that modify the user
+    depend on get_current_user_for_update instead.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -71,10 +90,35 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise credentials_exception
     
-    result = await db.execute(select(User).where(User.username == username))
-    user = result.scalar_one_or_none()
-    if user is None:
+    principal = await get_cached_principal(username)
+    if principal is None:
+        # 読み込み中に無効化された場合に古い行をキャッシュしないよう、先に世代を取る
+        generation = await principal_generation(username)
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalar_one_or_none()
+        if user is None:
+            raise credentials_exception
+        principal = Principal.from_user(user)
+        await cache_principal(principal, generation)
+    
+    if not principal.is_active:
         raise credentials_exception
+    # このリクエストの書き込みを read-your-writes の対象にする
+    current_writer.set(str(principal.id))
+    return principal
+
+async def get_current_user_for_update(
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """The authenticated user loaded into the request session, for handlers that change it"""
+    user = await db.get(User, principal.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 # Routes
@@ -89,8 +133,8 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     if result.scalar_one_or_none():
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    # Create new user（bcryptはイベントループ外で実行）
+    hashed_password = await run_in_thread(get_password_hash, user_data.password)
     user = User(
         username=user_data.username,
         email=user_data.email,
@@ -112,7 +156,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSessi
     result = await db.execute(select(User).where(User.username == form_data.username))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await run_in_thread(verify_password, form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -124,7 +168,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSessi
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/setup-totp", response_model=TOTPSetup)
-async def setup_totp(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def setup_totp(current_user: User = Depends(get_current_user_for_update), db: AsyncSession = Depends(get_db)):
     if current_user.totp_enabled:
         raise HTTPException(status_code=400, detail="TOTP already enabled")
     
@@ -137,23 +181,16 @@ async def setup_totp(current_user: User = Depends(get_current_user), db: AsyncSe
         issuer_name="Asset Dashboard"
     )
     
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(totp_uri)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    buf = io.BytesIO()
-    img.save(buf, format='PNG')
-    qr_code_b64 = base64.b64encode(buf.getvalue()).decode()
+    qr_code = await run_in_thread(render_qr_code, totp_uri)
     
     # Store secret (not enabled yet)
     current_user.totp_secret = secret
     await db.commit()
     
-    return {"secret": secret, "qr_code": f"data:image/png;base64,{qr_code_b64}"}
+    return {"secret": secret, "qr_code": qr_code}
 
 @router.post("/verify-totp")
-async def verify_totp(data: TOTPVerify, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def verify_totp(data: TOTPVerify, current_user: User = Depends(get_current_user_for_update), db: AsyncSession = Depends(get_db)):
     if not current_user.totp_secret:
         raise HTTPException(status_code=400, detail="TOTP not setup")
     
@@ -168,7 +205,7 @@ async def verify_totp(data: TOTPVerify, current_user: User = Depends(get_current
     return {"message": "TOTP enabled successfully"}
 
 @router.get("/me")
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_user)):
     return {
         "id": str(current_user.id),
         "username": current_user.username,
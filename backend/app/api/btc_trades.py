@@ -1,21 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, case
-from typing import List
-from datetime import datetime
-import io
-import pandas as pd
-
-from app.database import get_db
-from app.models import BTCTrade, User
+from sqlalchemy import select, func, case, tuple_
+from typing import Dict, List
+from datetime import datetime, date, time, timedelta
+from zoneinfo import ZoneInfo
+import uuid
+
+from app.database import get_db, get_read_db
+from app.models import BTCTrade, User, Asset
+from app.models.asset import AssetClass
 from app.api.auth import get_current_user
-from app.services.btc_gain_calculator import BTCGainCalculator, CostBasisMethod
-from pydantic import BaseModel
+from app.config import settings
+from app.services.btc_gain_calculator import BTCGainCalculator, CostBasisMethod, write_report_workbook
+from app.executors import run_in_process
+from app.services.sell_planner import SellPlanner
+from app.responses import rows_response
+from app.pagination import decode_cursor, keyset_page_response
+from pydantic import BaseModel, Field
+from typing import Literal
 
 router = APIRouter()
 
 # Pydantic models
 class BTCTradeCreate(BaseModel):
+    asset_id: str | None = None  # 暗号資産のUUID（省略時はBTC）
     txid: str | None = None
     amount_btc: float
     counter_value_jpy: float
@@ -27,7 +35,8 @@ class BTCTradeCreate(BaseModel):
     notes: str | None = None
 
 class BTCTradeResponse(BaseModel):
-    id: int
+    id: str  # UUID string
+    asset_id: str | None
     txid: str | None
     amount_btc: float
     counter_value_jpy: float
@@ -45,34 +54,109 @@ class BTCTradeResponse(BaseModel):
 class GainCalculationRequest(BaseModel):
     method: CostBasisMethod = CostBasisMethod.FIFO
 
+class SellPlanRequest(BaseModel):
+    asset_id: str | None = None  # 省略時はBTC
+    objective: Literal["min_gain", "harvest_loss"] = "min_gain"
+    target_jpy: float | None = Field(default=None, gt=0)  # min_gain: 売却目標額
+    loss_limit_jpy: float | None = Field(default=None, gt=0)  # harvest_loss: 実現損失の上限
+    price_jpy: float | None = Field(default=None, gt=0)  # 省略時は最新の保存価格
+    method: CostBasisMethod = CostBasisMethod.FIFO  # 既存の売却をどう消化済みとみなすか
+    whole_lots: bool = False
+    tax_rate: float | None = Field(default=None, ge=0, le=1)
+
+class UnrealizedPnLPoint(BaseModel):
+    date: date
+    btc_quantity: float
+    cost_basis_jpy: float
+    btc_price_jpy: float | None
+    market_value_jpy: float | None
+    unrealized_pnl_jpy: float | None
+
+def _parse_uuid(value: str | None, label: str):
+    if value is None:
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {label} ID format")
+
+async def _get_crypto_asset_id(db: AsyncSession, asset_id: str | None):
+    """Validate that asset_id refers to a Crypto asset"""
+    asset_uuid = _parse_uuid(asset_id, "asset")
+    if asset_uuid is None:
+        return None
+    result = await db.execute(select(Asset.asset_class).where(Asset.id == asset_uuid))
+    asset_class = result.scalar_one_or_none()
+    if asset_class is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    if asset_class != AssetClass.Crypto:
+        raise HTTPException(status_code=400, detail="Asset is not a crypto asset")
+    return asset_uuid
+
 # Routes
 @router.get("/", response_model=List[BTCTradeResponse])
 async def get_btc_trades(
+    asset_id: str | None = None,
+    exchange: str | None = None,
+    trade_type: Literal["buy", "sell"] | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    cursor: str | None = None,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get all BTC trades"""
-    result = await db.execute(
-        select(BTCTrade).order_by(BTCTrade.timestamp.desc())
-    )
-    trades = result.scalars().all()
-    
-    return [
-        BTCTradeResponse(
-            id=trade.id,
-            txid=trade.txid,
-            amount_btc=trade.amount_btc,
-            counter_value_jpy=trade.counter_value_jpy,
-            jpy_rate=trade.jpy_rate,
-            fee_btc=trade.fee_btc,
-            fee_jpy=trade.fee_jpy,
-            timestamp=trade.timestamp,
-            exchange=trade.exchange,
-            trade_type="buy" if trade.amount_btc > 0 else "sell",
-            notes=trade.notes
-        )
-        for trade in trades
-    ]
+    """Get crypto trades, newest first.
+
+    With limit, results are paged by (timestamp, id); the next page's cursor
+    is returned in the X-Next-Cursor header. Without limit every matching
+    trade is returned as before.
+    """
+    query = select(
+        BTCTrade.id,
+        BTCTrade.asset_id,
+        BTCTrade.txid,
+        BTCTrade.amount_btc,
+        BTCTrade.counter_value_jpy,
+        BTCTrade.jpy_rate,
+        BTCTrade.fee_btc,
+        BTCTrade.fee_jpy,
+        BTCTrade.timestamp,
+        BTCTrade.exchange,
+        case((BTCTrade.amount_btc > 0, "buy"), else_="sell").label("trade_type"),
+        BTCTrade.notes,
+    ).order_by(BTCTrade.timestamp.desc(), BTCTrade.id.desc())
+    asset_uuid = _parse_uuid(asset_id, "asset")
+    if asset_uuid is not None:
+        query = query.where(await BTCGainCalculator(db, asset_uuid).trade_filter())
+    if exchange:
+        query = query.where(BTCTrade.exchange == exchange)
+    if trade_type == "buy":
+        query = query.where(BTCTrade.amount_btc > 0)
+    elif trade_type == "sell":
+        query = query.where(BTCTrade.amount_btc <= 0)
+
+    # 日付はローカルタイムゾーンの暦日として扱う
+    tz = ZoneInfo(settings.TIMEZONE)
+    if start_date:
+        query = query.where(BTCTrade.timestamp >= datetime.combine(start_date, time.min, tzinfo=tz))
+    if end_date:
+        query = query.where(BTCTrade.timestamp < datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=tz))
+
+    if cursor:
+        try:
+            after_timestamp, after_id = decode_cursor(cursor, 2)
+            after = (datetime.fromisoformat(after_timestamp), uuid.UUID(after_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # (timestamp, id) の行値比較で ix_btc_trades_timestamp を範囲スキャン
+        query = query.where(tuple_(BTCTrade.timestamp, BTCTrade.id) < after)
+
+    if limit is None:
+        result = await db.execute(query)
+        return rows_response(result)
+    result = await db.execute(query.limit(limit + 1))
+    return keyset_page_response(result, limit, ("timestamp", "id"))
 
 @router.post("/", response_model=BTCTradeResponse)
 async def create_btc_trade(
@@ -80,7 +164,9 @@ async def create_btc_trade(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Create a new BTC trade"""
+    """Create a new crypto trade"""
+    asset_uuid = await _get_crypto_asset_id(db, trade_data.asset_id)
+    
     # Check for duplicate txid
     if trade_data.txid:
         result = await db.execute(
@@ -92,7 +178,7 @@ async def create_btc_trade(
                 detail=f"Trade with txid {trade_data.txid} already exists"
             )
     
-    trade = BTCTrade(**trade_data.dict())
+    trade = BTCTrade(**trade_data.dict(exclude={"asset_id"}), asset_id=asset_uuid)
     trade.trade_type = "buy" if trade.amount_btc > 0 else "sell"
     
     db.add(trade)
@@ -100,7 +186,8 @@ async def create_btc_trade(
     await db.refresh(trade)
     
     return BTCTradeResponse(
-        id=trade.id,
+        id=str(trade.id),
+        asset_id=str(trade.asset_id) if trade.asset_id else None,
         txid=trade.txid,
         amount_btc=trade.amount_btc,
         counter_value_jpy=trade.counter_value_jpy,
@@ -115,7 +202,7 @@ async def create_btc_trade(
 
 @router.post("/{trade_id}/calculate-gain")
 async def calculate_gain(
-    trade_id: int,
+    trade_id: str,
     request: GainCalculationRequest,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
@@ -123,7 +210,7 @@ async def calculate_gain(
     """Calculate realized gain for a sell trade"""
     # Get the trade
     result = await db.execute(
-        select(BTCTrade).where(BTCTrade.id == trade_id)
+        select(BTCTrade).where(BTCTrade.id == _parse_uuid(trade_id, "trade"))
     )
     trade = result.scalar_one_or_none()
     
@@ -134,7 +221,7 @@ async def calculate_gain(
         raise HTTPException(status_code=400, detail="Not a sell trade")
     
     # Calculate gain
-    calculator = BTCGainCalculator(db)
+    calculator = BTCGainCalculator(db, trade.asset_id)
     try:
         gain_result = await calculator.calculate_realized_gain(trade, request.method)
         return gain_result
@@ -146,40 +233,22 @@ async def generate_yearly_report(
     year: int,
     method: CostBasisMethod = CostBasisMethod.FIFO,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Generate yearly realized gain report"""
+    """Generate yearly realized gain report (one sheet per coin plus a summary)"""
     calculator = BTCGainCalculator(db)
     
     try:
-        df = await calculator.generate_gain_report(year, method)
+        sheets = await calculator.generate_multi_coin_report(year, method)
         
-        # Convert to Excel
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name=f'BTC_Gains_{year}', index=False)
-            
-            # Format the Excel file
-            worksheet = writer.sheets[f'BTC_Gains_{year}']
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        output.seek(0)
+        # Convert to Excel（openpyxlはCPU負荷が高いのでプロセスプールで実行）
+        content = await run_in_process(write_report_workbook, sheets)
         
         return Response(
-            content=output.getvalue(),
+            content=content,
             media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             headers={
-                'Content-Disposition': f'attachment; filename=btc_gains_{year}_{method.value}.xlsx'
+                'Content-Disposition': f'attachment; filename=crypto_gains_{year}_{method.value}.xlsx'
             }
         )
     except Exception as e:
@@ -188,9 +257,14 @@ async def generate_yearly_report(
 @router.get("/summary")
 async def get_btc_summary(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get BTC trading summary"""
+    return await build_btc_summary(db)
+
+async def build_btc_summary(db: AsyncSession) -> Dict:
+    btc_filter = await BTCGainCalculator(db).trade_filter()
+    
     # Calculate total BTC holdings
     result = await db.execute(
         select(
@@ -198,15 +272,18 @@ async def get_btc_summary(
             func.sum(case((BTCTrade.amount_btc > 0, BTCTrade.amount_btc), else_=0)).label('total_bought'),
             func.sum(case((BTCTrade.amount_btc < 0, BTCTrade.amount_btc), else_=0)).label('total_sold'),
             func.avg(case((BTCTrade.amount_btc > 0, BTCTrade.jpy_rate), else_=None)).label('avg_buy_rate')
-        )
+        ).where(btc_filter)
     )
     summary = result.one()
     
     # Get latest trade
     result = await db.execute(
-        select(BTCTrade).order_by(BTCTrade.timestamp.desc()).limit(1)
+        select(BTCTrade.timestamp, BTCTrade.amount_btc, BTCTrade.jpy_rate)
+        .where(btc_filter)
+        .order_by(BTCTrade.timestamp.desc())
+        .limit(1)
     )
-    latest_trade = result.scalar_one_or_none()
+    latest_trade = result.first()
     
     return {
         "total_btc": float(summary.total_btc or 0),
@@ -220,15 +297,68 @@ async def get_btc_summary(
         } if latest_trade else None
     }
 
+@router.get("/unrealized-pnl", response_model=List[UnrealizedPnLPoint])
+async def get_unrealized_pnl(
+    start_date: date | None = None,
+    end_date: date | None = None,
+    method: CostBasisMethod = CostBasisMethod.FIFO,
+    asset_id: str | None = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get daily coin quantity, remaining cost basis and unrealized P&L (BTC by default)"""
+    if not end_date:
+        # 系列の暦日と同じくローカルタイムゾーンの今日（サーバーのローカル日付ではなく）
+        end_date = datetime.now(ZoneInfo(settings.TIMEZONE)).date()
+    if not start_date:
+        start_date = end_date - timedelta(days=365)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be before end_date")
+    
+    calculator = BTCGainCalculator(db, await _get_crypto_asset_id(db, asset_id))
+    df = await calculator.calculate_unrealized_series(start_date, end_date, method)
+    
+    # NaN（価格未取得の日）はNoneとして返す
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict(orient="records")
+
+@router.post("/sell-plan")
+async def plan_btc_sell(
+    request: SellPlanRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Plan which open lots to sell to minimize realized gain or harvest losses"""
+    if request.objective == "min_gain" and not request.target_jpy:
+        raise HTTPException(status_code=400, detail="target_jpy is required for min_gain")
+    if request.objective == "harvest_loss" and not request.loss_limit_jpy:
+        raise HTTPException(status_code=400, detail="loss_limit_jpy is required for harvest_loss")
+    
+    calculator = BTCGainCalculator(db, await _get_crypto_asset_id(db, request.asset_id))
+    price_jpy = request.price_jpy or await calculator.get_latest_price()
+    if not price_jpy:
+        raise HTTPException(status_code=400, detail="No price available, specify price_jpy")
+    
+    open_lots = await calculator.get_open_lots(request.method)
+    tax_rate = request.tax_rate if request.tax_rate is not None else settings.CRYPTO_TAX_RATE
+    planner = SellPlanner(open_lots, price_jpy, tax_rate)
+    
+    if request.objective == "min_gain":
+        plan = planner.minimize_gain(request.target_jpy, whole_lots=request.whole_lots)
+    else:
+        plan = planner.harvest_losses(request.loss_limit_jpy, whole_lots=request.whole_lots)
+    plan["method"] = request.method.value
+    return plan
+
 @router.delete("/{trade_id}")
 async def delete_btc_trade(
-    trade_id: int,
+    trade_id: str,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Delete a BTC trade"""
+    """Delete a crypto trade"""
     result = await db.execute(
-        select(BTCTrade).where(BTCTrade.id == trade_id)
+        select(BTCTrade).where(BTCTrade.id == _parse_uuid(trade_id, "trade"))
     )
     trade = result.scalar_one_or_none()
     
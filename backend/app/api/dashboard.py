@@ -1,20 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy import select, func
 from datetime import datetime, date, timedelta
-from typing import Dict, List
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Tuple, Union
+import asyncio
 import logging
+import time
 
-from app.database import get_db
+from app.database import AsyncSessionLocal, get_db, get_read_db, read_sessionmaker
 from app.models import User, ValuationSnapshot
 from app.api.auth import get_current_user
 from app.services.valuation_calculator import ValuationCalculator
+from app.services.price_queries import fetch_latest_prices
+from app.services.dashboard_cache import Uncached, cached_response
+from app.services.live_events import hub
+from app.services.valuation_rollups import fetch_rollups
+from app.services.read_models import fetch_latest_snapshot, fetch_snapshot_history, fetch_snapshot_total
 from app.tasks.scheduled_tasks import trigger_price_fetch
+from app.api.holdings import build_holdings
+from app.api.prices import build_latest_prices
+from app.api.btc_trades import build_btc_summary
+from app.responses import FastJSONResponse
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# プロキシにアイドル切断されないよう送るコメント行の間隔
+STREAM_KEEPALIVE_SECONDS = 15
+
 # Response models
 class DashboardOverview(BaseModel):
     total_jpy: float
@@ -34,18 +49,20 @@ class RefreshResponse(BaseModel):
 # Routes
 @router.get("/overview", response_model=DashboardOverview)
 async def get_dashboard_overview(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Get dashboard overview data"""
-    
-    # Get latest valuation snapshot
-    result = await db.execute(
-        select(ValuationSnapshot)
-        .order_by(ValuationSnapshot.date.desc())
-        .limit(1)
+    # 履歴の範囲が日付に依存するため、今日の日付もキーに含める
+    return await cached_response(
+        request, "overview", {"today": date.today()},
+        lambda: _build_overview(db)
     )
-    latest_snapshot = result.scalar_one_or_none()
+
+async def _build_overview(db: AsyncSession) -> Union[DashboardOverview, Uncached]:
+    # Get latest valuation snapshot
+    latest_snapshot = await fetch_latest_snapshot(db)
     
     if not latest_snapshot:
         # 🔧 修正: snapshotが存在しない場合の処理を改善
@@ -67,7 +84,8 @@ async def get_dashboard_overview(
     # 🔧 修正: データがない場合のデフォルトレスポンスを明確に定義
     if not latest_snapshot:
         logger.info("Returning default dashboard data - no holdings or valuations available")
-        return DashboardOverview(
+        # スナップショットができるまでの暫定値なのでキャッシュしない
+        return Uncached(DashboardOverview(
             total_jpy=0.0,
             total_usd=0.0,
             total_btc=0.0,
@@ -77,32 +95,23 @@ async def get_dashboard_overview(
             breakdown_by_currency={},
             breakdown_by_account_type={},
             history=[]
-        )
+        ))
     
     # Get previous day snapshot for comparison
     yesterday = latest_snapshot.date - timedelta(days=1)
-    result = await db.execute(
-        select(ValuationSnapshot)
-        .where(ValuationSnapshot.date == yesterday)
-    )
-    previous_snapshot = result.scalar_one_or_none()
+    previous_total = await fetch_snapshot_total(db, yesterday)
     
     # Calculate changes
     change_24h = 0.0
     change_percentage = 0.0
-    if previous_snapshot:
-        change_24h = latest_snapshot.total_jpy - previous_snapshot.total_jpy
-        if previous_snapshot.total_jpy > 0:
-            change_percentage = (change_24h / previous_snapshot.total_jpy) * 100
+    if previous_total is not None:
+        change_24h = latest_snapshot.total_jpy - previous_total
+        if previous_total > 0:
+            change_percentage = (change_24h / previous_total) * 100
     
     # Get historical data (last 365 days)
     one_year_ago = date.today() - timedelta(days=365)
-    result = await db.execute(
-        select(ValuationSnapshot)
-        .where(ValuationSnapshot.date >= one_year_ago)
-        .order_by(ValuationSnapshot.date)
-    )
-    history_snapshots = result.scalars().all()
+    history_snapshots = await fetch_snapshot_history(db, one_year_ago)
     
     history = [
         {
@@ -126,22 +135,106 @@ async def get_dashboard_overview(
         history=history
     )
 
+@router.get("/bootstrap")
+async def get_dashboard_bootstrap(
+    current_user: User = Depends(get_current_user)
+):
+    """Everything the dashboard needs for its first render, in one round-trip.
+
+    Each section runs concurrently on its own session (and pooled connection).
+    A failing section is returned as null with its error, so the rest of the
+    page still renders. Per-section latency is in timings_ms and Server-Timing.
+    """
+    # overview はスナップショットが無い場合に作成するのでプライマリ、他はレプリカ可
+    started = time.perf_counter()
+    read_sessions = await read_sessionmaker()
+    sections: Dict[str, Tuple[async_sessionmaker, Callable[[AsyncSession], Awaitable[Any]]]] = {
+        "overview": (AsyncSessionLocal, _build_overview),
+        "summary": (read_sessions, _build_summary),
+        "holdings": (read_sessions, build_holdings),
+        "latest_prices": (read_sessions, build_latest_prices),
+        "btc_summary": (read_sessions, build_btc_summary),
+    }
+
+    results = await asyncio.gather(*(
+        _run_section(name, sessions, build) for name, (sessions, build) in sections.items()
+    ))
+
+    payload: Dict[str, Any] = {}
+    timings_ms: Dict[str, float] = {}
+    errors: Dict[str, str] = {}
+    for name, (data, elapsed_ms, error) in zip(sections, results):
+        if isinstance(data, Uncached):
+            data = data.payload
+        payload[name] = data.dict() if isinstance(data, BaseModel) else data
+        timings_ms[name] = round(elapsed_ms, 1)
+        if error:
+            errors[name] = error
+    timings_ms["total"] = round((time.perf_counter() - started) * 1000, 1)
+
+    payload["timings_ms"] = timings_ms
+    payload["errors"] = errors
+    return FastJSONResponse(
+        payload,
+        headers={"Server-Timing": ", ".join(f"{name};dur={ms}" for name, ms in timings_ms.items())}
+    )
+
+async def _run_section(
+    name: str,
+    sessions: async_sessionmaker,
+    build: Callable[[AsyncSession], Awaitable[Any]]
+) -> Tuple[Any, float, str | None]:
+    """Run one bootstrap section on its own session -> (data, elapsed ms, error)"""
+    started = time.perf_counter()
+    try:
+        async with sessions() as session:
+            data = await build(session)
+        return data, (time.perf_counter() - started) * 1000, None
+    except Exception as e:
+        logger.error(f"Dashboard bootstrap section {name} failed: {e}")
+        return None, (time.perf_counter() - started) * 1000, str(e)
+
 @router.get("/history")
 async def get_valuation_history(
+    request: Request,
     days: int = 365,
+    granularity: Literal["day", "week", "month", "year"] = "day",
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get valuation history for specified number of days"""
-    
+    """Get valuation history for specified number of days
+
+    granularity=week/month/year reads one precomputed row per period (the
+    period's last snapshot plus its JPY high/low) instead of every daily row.
+    """
+    return await cached_response(
+        request, "history", {"days": days, "granularity": granularity, "today": date.today()},
+        lambda: _build_history(db, days, granularity)
+    )
+
+async def _build_history(db: AsyncSession, days: int, granularity: str = "day") -> List[Dict]:
     start_date = date.today() - timedelta(days=days)
     
-    result = await db.execute(
-        select(ValuationSnapshot)
-        .where(ValuationSnapshot.date >= start_date)
-        .order_by(ValuationSnapshot.date)
-    )
-    snapshots = result.scalars().all()
+    if granularity != "day":
+        rollups = await fetch_rollups(db, granularity, start_date)
+        return [
+            {
+                "date": rollup.last_date.isoformat(),
+                "period_start": rollup.period_start.isoformat(),
+                "total_jpy": rollup.total_jpy,
+                "total_usd": rollup.total_usd,
+                "total_btc": rollup.total_btc,
+                "high_jpy": rollup.high_jpy,
+                "low_jpy": rollup.low_jpy,
+                "snapshot_count": rollup.snapshot_count,
+                "breakdown_by_category": rollup.breakdown_by_category,
+                "breakdown_by_currency": rollup.breakdown_by_currency,
+                "breakdown_by_account_type": rollup.breakdown_by_account_type
+            }
+            for rollup in rollups
+        ]
+    
+    snapshots = await fetch_snapshot_history(db, start_date, breakdowns=True)
     
     return [
         {
@@ -156,6 +249,33 @@ async def get_valuation_history(
         for snapshot in snapshots
     ]
 
+@router.get("/stream")
+async def stream_live_events(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """Server-sent events: prices, fx, refresh_complete and valuation updates"""
+    queue = hub.subscribe()
+
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {message}\n\n"
+        finally:
+            hub.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/refresh-prices", response_model=RefreshResponse)
 async def refresh_prices(
     background_tasks: BackgroundTasks,
@@ -181,22 +301,23 @@ async def refresh_prices(
 
 @router.get("/summary")
 async def get_portfolio_summary(
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get detailed portfolio summary"""
-    
-    # Get latest snapshot
-    result = await db.execute(
-        select(ValuationSnapshot)
-        .order_by(ValuationSnapshot.date.desc())
-        .limit(1)
+    return await cached_response(
+        request, "summary", {"today": date.today()},
+        lambda: _build_summary(db)
     )
-    latest_snapshot = result.scalar_one_or_none()
+
+async def _build_summary(db: AsyncSession) -> Union[Dict, Uncached]:
+    # Get latest snapshot
+    latest_snapshot = await fetch_latest_snapshot(db)
     
     if not latest_snapshot:
-        # 🔧 修正: データがない場合の適切なレスポンス
-        return {
+        # 🔧 修正: データがない場合の適切なレスポンス（キャッシュしない）
+        return Uncached({
             "date": date.today().isoformat(),
             "total_value_jpy": 0.0,
             "total_value_usd": 0.0,
@@ -205,7 +326,7 @@ async def get_portfolio_summary(
             "currency_exposure": {},
             "account_type_breakdown": {},
             "fx_rates": {}
-        }
+        })
     
     # Calculate additional metrics
     total_value = latest_snapshot.total_jpy
@@ -249,7 +370,7 @@ async def get_portfolio_summary(
 @router.get("/debug")
 async def debug_dashboard(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Debug endpoint to check dashboard state"""
     try:
@@ -263,12 +384,7 @@ async def debug_dashboard(
         snapshots_count = result.scalar()
         
         # Latest snapshot info
-        result = await db.execute(
-            select(ValuationSnapshot)
-            .order_by(ValuationSnapshot.date.desc())
-            .limit(1)
-        )
-        latest_snapshot = result.scalar_one_or_none()
+        latest_snapshot = await fetch_latest_snapshot(db)
         
         return {
             "holdings_count": holdings_count,
@@ -284,34 +400,22 @@ async def debug_dashboard(
 @router.get("/prices")
 async def get_current_prices(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get current prices for all assets"""
     try:
-        from app.models import Asset, Price
-        
-        # Get all assets with their latest prices
-        result = await db.execute(select(Asset))
-        assets = result.scalars().all()
+        # Get all assets with their latest prices in one query
+        rows = await fetch_latest_prices(db)
         
-        prices = {}
-        for asset in assets:
-            # Get latest price for this asset
-            result = await db.execute(
-                select(Price)
-                .where(Price.asset_id == asset.id)
-                .order_by(Price.date.desc())
-                .limit(1)
-            )
-            price = result.scalar_one_or_none()
-            
-            if price:
-                prices[asset.symbol or asset.name] = {
-                    "price": price.price,
-                    "date": price.date.isoformat(),
-                    "currency": asset.currency,
-                    "source": price.source
-                }
+        prices = {
+            row.symbol or row.name: {
+                "price": row.price,
+                "date": row.date.isoformat(),
+                "currency": row.currency,
+                "source": row.source
+            }
+            for row in rows
+        }
         
         return {"prices": prices, "timestamp": datetime.now().isoformat()}
     except Exception as e:
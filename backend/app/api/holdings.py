@@ -1,19 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from typing import List
+from sqlalchemy import insert, literal, select, union_all, update
+from typing import Dict, List, Set
 from datetime import date
 import uuid
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models import Holding, Asset, Owner, User
 from app.api.auth import get_current_user
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from app.models.holding import AccountType
+from app.responses import FastJSONResponse
+from app.services.read_models import holding_row_dict, holding_rows_query, read
 
 router = APIRouter()
 
+# 一括登録・更新の1リクエストあたりの上限
+MAX_BULK_ROWS = 1000
+
 # Pydantic models - データベーススキーマと完全一致
 class HoldingCreate(BaseModel):
     asset_id: str  # UUID string
@@ -51,49 +55,75 @@ class HoldingResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class HoldingBulkCreate(BaseModel):
+    holdings: List[HoldingCreate] = Field(..., min_length=1, max_length=MAX_BULK_ROWS)
+
+# HoldingUpdate で省略はできるが null にはできない列
+REQUIRED_HOLDING_FIELDS = ("asset_id", "owner_id", "quantity", "cost_total", "acquisition_date", "account_type")
+
+class HoldingBulkUpdateItem(HoldingUpdate):
+    id: str  # UUID string
+
+class HoldingBulkUpdate(BaseModel):
+    holdings: List[HoldingBulkUpdateItem] = Field(..., min_length=1, max_length=MAX_BULK_ROWS)
+
+class BulkRowError(BaseModel):
+    index: int  # リクエスト内の行番号（0始まり）
+    error: str
+
+class HoldingBulkResponse(BaseModel):
+    processed: int
+    errors: List[BulkRowError]
+    holdings: List[HoldingResponse]
+
+async def _existing_ids(db: AsyncSession, ids: Dict[str, Set[uuid.UUID]]) -> Dict[str, Set[uuid.UUID]]:
+    """Which of the given holding / asset / owner ids exist, checked in one query"""
+    tables = {"holding": Holding, "asset": Asset, "owner": Owner}
+    selects = [
+        select(literal(kind).label("kind"), tables[kind].id.label("id")).where(tables[kind].id.in_(values))
+        for kind, values in ids.items()
+        if values
+    ]
+    found = {kind: set() for kind in ids}
+    if selects:
+        result = await db.execute(union_all(*selects))
+        for row in result:
+            found[row.kind].add(row.id)
+    return found
+
+def _parse_uuid(value: str, field: str) -> uuid.UUID:
+    try:
+        return uuid.UUID(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {field} format")
+
+async def _fetch_holding(db: AsyncSession, holding_id: uuid.UUID) -> dict:
+    rows = await read(db, holding_rows_query().where(Holding.id == holding_id))
+    return holding_row_dict(rows[0])
+
+async def _bulk_response(db: AsyncSession, processed_ids: List[uuid.UUID], errors: List[dict]) -> FastJSONResponse:
+    rows = {}
+    if processed_ids:
+        result = await read(db, holding_rows_query().where(Holding.id.in_(processed_ids)))
+        rows = {row.id: holding_row_dict(row) for row in result}
+    return FastJSONResponse({
+        "processed": len(processed_ids),
+        "errors": sorted(errors, key=lambda error: error["index"]),
+        "holdings": [rows[holding_id] for holding_id in processed_ids],
+    })
+
 # Routes
 @router.get("/", response_model=List[HoldingResponse])
 async def get_holdings(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get all holdings with proper relationships"""
-    result = await db.execute(
-        select(Holding).options(
-            selectinload(Holding.asset),
-            selectinload(Holding.owner)  # 名義人情報を含める
-        )
-    )
-    holdings = result.scalars().all()
-    
-    return [
-        HoldingResponse(
-            id=str(h.id),
-            asset={
-                "id": str(h.asset.id),
-                "symbol": h.asset.symbol,
-                "name": h.asset.name,
-                "asset_class": h.asset.asset_class.value,
-                "asset_type": h.asset.asset_type.value if h.asset.asset_type else None,
-                "region": h.asset.region.value if h.asset.region else None,
-                "sub_category": h.asset.sub_category,
-                "currency": h.asset.currency,
-            },
-            owner={  # 正しい名義人情報
-                "id": str(h.owner.id),
-                "name": h.owner.name,
-                "owner_type": h.owner.owner_type.value
-            },
-            quantity=h.quantity,
-            cost_total=h.cost_total,
-            acquisition_date=h.acquisition_date,
-            account_type=h.account_type.value,
-            broker=h.broker,
-            notes=h.notes,
-            cost_per_unit=h.cost_per_unit
-        )
-        for h in holdings
-    ]
+    # 1クエリのJOINで列だけ取得し、Pydanticを通さずにJSON化
+    return FastJSONResponse(await build_holdings(db))
+
+async def build_holdings(db: AsyncSession) -> List[dict]:
+    return [holding_row_dict(row) for row in await read(db, holding_rows_query())]
 
 @router.post("/", response_model=HoldingResponse)
 async def create_holding(
@@ -109,20 +139,11 @@ async def create_holding(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid UUID format")
     
-    # Check asset exists
-    result = await db.execute(
-        select(Asset).where(Asset.id == asset_uuid)
-    )
-    asset = result.scalar_one_or_none()
-    if not asset:
+    # Check asset and owner exist (one query)
+    found = await _existing_ids(db, {"asset": {asset_uuid}, "owner": {owner_uuid}})
+    if asset_uuid not in found["asset"]:
         raise HTTPException(status_code=404, detail="Asset not found")
-    
-    # Check owner exists
-    result = await db.execute(
-        select(Owner).where(Owner.id == owner_uuid)
-    )
-    owner = result.scalar_one_or_none()
-    if not owner:
+    if owner_uuid not in found["owner"]:
         raise HTTPException(status_code=404, detail="Owner not found")
     
     # Create holding
@@ -138,36 +159,115 @@ async def create_holding(
     )
     db.add(holding)
     await db.commit()
-    await db.refresh(holding)
     
-    # Load relationships
-    await db.refresh(holding, attribute_names=['asset', 'owner'])
-    
-    return HoldingResponse(
-        id=str(holding.id),
-        asset={
-            "id": str(holding.asset.id),
-            "symbol": holding.asset.symbol,
-            "name": holding.asset.name,
-            "asset_class": holding.asset.asset_class.value,
-            "asset_type": holding.asset.asset_type.value if holding.asset.asset_type else None,
-            "region": holding.asset.region.value if holding.asset.region else None,
-            "sub_category": holding.asset.sub_category,
-            "currency": holding.asset.currency,
-        },
-        owner={
-            "id": str(holding.owner.id),
-            "name": holding.owner.name,
-            "owner_type": holding.owner.owner_type.value
-        },
-        quantity=holding.quantity,
-        cost_total=holding.cost_total,
-        acquisition_date=holding.acquisition_date,
-        account_type=holding.account_type.value,
-        broker=holding.broker,
-        notes=holding.notes,
-        cost_per_unit=holding.cost_per_unit
-    )
+    # 資産・名義人はリレーションを読まずにJOINで取得
+    return FastJSONResponse(await _fetch_holding(db, holding.id))
+
+@router.post("/bulk", response_model=HoldingBulkResponse)
+async def bulk_create_holdings(
+    payload: HoldingBulkCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create many holdings in one transaction.
+
+    Rows with an invalid or unknown asset / owner are reported in errors;
+    the remaining rows are still created.
+    """
+    errors = []
+    rows: Dict[int, dict] = {}
+    for index, item in enumerate(payload.holdings):
+        try:
+            values = {
+                **item.dict(),
+                "asset_id": _parse_uuid(item.asset_id, "asset ID"),
+                "owner_id": _parse_uuid(item.owner_id, "owner ID"),
+            }
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        rows[index] = values
+
+    found = await _existing_ids(db, {
+        "asset": {values["asset_id"] for values in rows.values()},
+        "owner": {values["owner_id"] for values in rows.values()},
+    })
+    for index, values in list(rows.items()):
+        if values["asset_id"] not in found["asset"]:
+            errors.append({"index": index, "error": "Asset not found"})
+        elif values["owner_id"] not in found["owner"]:
+            errors.append({"index": index, "error": "Owner not found"})
+        else:
+            continue
+        del rows[index]
+
+    created_ids = []
+    if rows:
+        # IDを先に振っておき、レスポンスをリクエストの行順に並べる
+        for values in rows.values():
+            values["id"] = uuid.uuid4()
+        result = await db.execute(insert(Holding).values(list(rows.values())).returning(Holding.id))
+        returned = set(result.scalars())
+        created_ids = [values["id"] for values in rows.values() if values["id"] in returned]
+
+    response = await _bulk_response(db, created_ids, errors)
+    await db.commit()
+    return response
+
+@router.put("/bulk", response_model=HoldingBulkResponse)
+async def bulk_update_holdings(
+    payload: HoldingBulkUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Update many holdings in one transaction; only the fields sent for a row change"""
+    errors = []
+    updates: Dict[int, dict] = {}
+    for index, item in enumerate(payload.holdings):
+        values = item.dict(exclude_unset=True)
+        # NOT NULL列への null はUPDATEで失敗し一括全体が500になるので、行単位で弾く
+        nulls = [field for field in REQUIRED_HOLDING_FIELDS if field in values and values[field] is None]
+        if nulls:
+            errors.append({"index": index, "error": f"{', '.join(nulls)} cannot be null"})
+            continue
+        try:
+            values["id"] = _parse_uuid(item.id, "holding ID")
+            for field, label in (("asset_id", "asset ID"), ("owner_id", "owner ID")):
+                if field in values:
+                    values[field] = _parse_uuid(values[field], label)
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        updates[index] = values
+
+    found = await _existing_ids(db, {
+        "holding": {values["id"] for values in updates.values()},
+        "asset": {values["asset_id"] for values in updates.values() if "asset_id" in values},
+        "owner": {values["owner_id"] for values in updates.values() if "owner_id" in values},
+    })
+    index_by_id: Dict[uuid.UUID, int] = {}
+    for index, values in list(updates.items()):
+        if values["id"] not in found["holding"]:
+            errors.append({"index": index, "error": "Holding not found"})
+        elif values["id"] in index_by_id:
+            errors.append({"index": index, "error": f"Duplicate of row {index_by_id[values['id']]}"})
+        elif "asset_id" in values and values["asset_id"] not in found["asset"]:
+            errors.append({"index": index, "error": "Asset not found"})
+        elif "owner_id" in values and values["owner_id"] not in found["owner"]:
+            errors.append({"index": index, "error": "Owner not found"})
+        else:
+            index_by_id[values["id"]] = index
+            continue
+        del updates[index]
+
+    changed = [values for values in updates.values() if len(values) > 1]
+    if changed:
+        # ORMの主キー指定バルクUPDATE（executemany）
+        await db.execute(update(Holding), changed)
+
+    response = await _bulk_response(db, [values["id"] for values in updates.values()], errors)
+    await db.commit()
+    return response
 
 @router.put("/{holding_id}", response_model=HoldingResponse)
 async def update_holding(
@@ -182,13 +282,7 @@ async def update_holding(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid holding ID format")
     
-    result = await db.execute(
-        select(Holding).where(Holding.id == holding_uuid).options(
-            selectinload(Holding.asset),
-            selectinload(Holding.owner)
-        )
-    )
-    holding = result.scalar_one_or_none()
+    holding = await db.get(Holding, holding_uuid)
     
     if not holding:
         raise HTTPException(status_code=404, detail="Holding not found")
@@ -213,33 +307,9 @@ async def update_holding(
         setattr(holding, field, value)
     
     await db.commit()
-    await db.refresh(holding)
     
-    return HoldingResponse(
-        id=str(holding.id),
-        asset={
-            "id": str(holding.asset.id),
-            "symbol": holding.asset.symbol,
-            "name": holding.asset.name,
-            "asset_class": holding.asset.asset_class.value,
-            "asset_type": holding.asset.asset_type.value if holding.asset.asset_type else None,
-            "region": holding.asset.region.value if holding.asset.region else None,
-            "sub_category": holding.asset.sub_category,
-            "currency": holding.asset.currency,
-        },
-        owner={
-            "id": str(holding.owner.id),
-            "name": holding.owner.name,
-            "owner_type": holding.owner.owner_type.value
-        },
-        quantity=holding.quantity,
-        cost_total=holding.cost_total,
-        acquisition_date=holding.acquisition_date,
-        account_type=holding.account_type.value,
-        broker=holding.broker,
-        notes=holding.notes,
-        cost_per_unit=holding.cost_per_unit
-    )
+    # 変更後の資産・名義人をJOINで取得
+    return FastJSONResponse(await _fetch_holding(db, holding.id))
 
 @router.delete("/{holding_id}")
 async def delete_holding(
@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import delete, exists, select
 from typing import List
 import uuid
 
-from app.database import get_db
-from app.models import User
+from app.database import get_db, get_read_db
+from app.models import Holding, User
 from app.models.owner import Owner, OwnerType  # 正しいインポートパス
 from app.api.auth import get_current_user
+from app.responses import FastJSONResponse
+from app.services.read_models import fetch_owners
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -35,24 +37,11 @@ class OwnerResponse(BaseModel):
 @router.get("/", response_model=List[OwnerResponse])
 async def get_owners(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get all owners"""
-    result = await db.execute(
-        select(Owner).order_by(Owner.name)
-    )
-    owners = result.scalars().all()
-    
-    return [
-        OwnerResponse(
-            id=str(owner.id),
-            name=owner.name,
-            owner_type=owner.owner_type.value,
-            created_at=owner.created_at.isoformat(),
-            updated_at=owner.updated_at.isoformat()
-        )
-        for owner in owners
-    ]
+    # 列だけ読み、ORMインスタンスを作らずにJSON化
+    return FastJSONResponse([row._asdict() for row in await fetch_owners(db)])
 
 @router.post("/", response_model=OwnerResponse)
 async def create_owner(
@@ -86,7 +75,7 @@ async def create_owner(
 async def get_owner(
     owner_id: str,  # UUID string
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get a specific owner"""
     try:
@@ -94,18 +83,11 @@ async def get_owner(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid owner ID format")
     
-    result = await db.execute(select(Owner).where(Owner.id == owner_uuid))
-    owner = result.scalar_one_or_none()
-    if not owner:
+    rows = await fetch_owners(db, owner_uuid)
+    if not rows:
         raise HTTPException(status_code=404, detail="Owner not found")
     
-    return OwnerResponse(
-        id=str(owner.id),
-        name=owner.name,
-        owner_type=owner.owner_type.value,
-        created_at=owner.created_at.isoformat(),
-        updated_at=owner.updated_at.isoformat()
-    )
+    return FastJSONResponse(rows[0]._asdict())
 
 @router.put("/{owner_id}", response_model=OwnerResponse)
 async def update_owner(
@@ -160,19 +142,23 @@ async def delete_owner(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid owner ID format")
     
-    result = await db.execute(select(Owner).where(Owner.id == owner_uuid))
-    owner = result.scalar_one_or_none()
-    if not owner:
+    # Check if owner has any holdings (EXISTS, without loading the collection)
+    result = await db.execute(
+        select(
+            exists().where(Owner.id == owner_uuid),
+            exists().where(Holding.owner_id == owner_uuid)
+        )
+    )
+    owner_exists, has_holdings = result.one()
+    if not owner_exists:
         raise HTTPException(status_code=404, detail="Owner not found")
-    
-    # Check if owner has any holdings
-    if owner.holdings:
+    if has_holdings:
         raise HTTPException(
             status_code=400, 
             detail="Cannot delete owner with holdings. Please reassign or delete holdings first."
         )
     
-    await db.delete(owner)
+    await db.execute(delete(Owner).where(Owner.id == owner_uuid))
     await db.commit()
     
     return {"message": "Owner deleted successfully"}
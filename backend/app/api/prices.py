@@ -1,17 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from sqlalchemy.orm import selectinload
-from typing import List, Dict
-from datetime import date, timedelta, datetime
+from sqlalchemy import select, and_, tuple_
+from typing import List, Dict, Literal
+from datetime import date, timedelta, datetime, timezone
+import json
+import logging
 import uuid
 
-from app.database import get_db
-from app.models import Price, Asset, User, Holding
+from app.database import get_db, get_read_db
+from app.models import LatestPrice, Price, Asset, User
 from app.api.auth import get_current_user
 from app.services.price_fetcher import PriceFetcher
-from pydantic import BaseModel
+from app.services.price_ingestion import PriceIngestor
+from app.services.price_planner import plan_nightly_fetch
+from app.services.price_queries import fetch_latest_prices, fetch_price_matrix
+from app.services.downsampling import downsample_price_rows, ohlc_buckets
+from app.services.price_refresher import PriceRefresher, schedule_refresh, price_ttl_seconds
+from app.responses import FastJSONResponse, rows_response
+from app.pagination import decode_cursor, keyset_page_response
+from pydantic import BaseModel, Field
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 # Pydantic models
@@ -33,177 +42,140 @@ class PriceHistoryRequest(BaseModel):
     asset_id: str
     start_date: date | None = None
     end_date: date | None = None
+    limit: int | None = Field(default=None, ge=1, le=5000)  # 指定時はページング
+    cursor: str | None = None  # 前ページの X-Next-Cursor
+    points: int | None = Field(default=None, ge=3, le=10000)  # 指定時は最大この点数に間引く
+    downsample: Literal["lttb", "ohlc"] = "lttb"
+
+class BulkPriceHistoryRequest(BaseModel):
+    asset_ids: List[str] = Field(min_length=1, max_length=200)
+    start_date: date | None = None
+    end_date: date | None = None
+    format: Literal["json", "arrow"] = "json"  # arrow: zstd圧縮のArrow IPCストリーム
+    points: int | None = Field(default=None, ge=3, le=10000)  # 指定時は日付軸をOHLCバケットに集約
 
 class CurrentPricesResponse(BaseModel):
     prices: Dict[str, Dict]
     last_updated: str
     fx_rates: Dict[str, float]
+    stale_count: int = 0  # TTL切れの価格数
+    refresh_scheduled: bool = False  # バックグラウンド再取得を開始したか
 
 # Routes
 @router.get("/current", response_model=CurrentPricesResponse)
 async def get_current_prices(
+    wait: bool = False,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """保有資産の現在価格を一括取得"""
-    
-    # 保有資産から必要な価格データを特定
-    result = await db.execute(
-        select(Holding).options(
-            selectinload(Holding.asset)
-        ).distinct(Holding.asset_id)
-    )
-    holdings = result.scalars().all()
+    """保有資産の現在価格を一括取得
+
+    DBに保存済みの最新価格を即座に返し、TTLを過ぎた価格はバックグラウンドで再取得する。
+    wait=true の場合は従来通り外部APIから取得してから返す。
+    """
+    refresher = PriceRefresher(db)
+    assets = await refresher.get_held_assets()
     
-    if not holdings:
+    if not assets:
         return CurrentPricesResponse(
             prices={},
             last_updated=datetime.now().isoformat(),
             fx_rates={}
         )
     
-    # 価格取得対象のアセット情報を収集
-    price_fetcher = PriceFetcher()
-    symbols_to_fetch = []
-    asset_map = {}
-    
-    for holding in holdings:
-        asset = holding.asset
-        if asset.symbol:  # シンボルがある場合のみ価格取得
-            symbols_to_fetch.append((
-                asset.symbol,
-                asset.asset_class.value,
-                asset.currency
-            ))
-            asset_map[asset.symbol] = {
-                "id": str(asset.id),
-                "name": asset.name,
-                "currency": asset.currency,
-                "asset_class": asset.asset_class.value
-            }
+    fx_rates = None
+    if wait:
+        _, fx_rates = await refresher.refresh(assets)
     
-    # 並列で価格取得
-    price_results = await price_fetcher.fetch_multiple_prices(symbols_to_fetch)
+    quotes = await refresher.get_stored_quotes(assets)
+    now = datetime.now(timezone.utc)
     
-    # 為替レート取得
-    fx_rates = {}
-    currencies = set(asset["currency"] for asset in asset_map.values())
-    for currency in currencies:
-        if currency != "JPY":
-            rate = await price_fetcher.fetch_fx_rate(currency, "JPY")
-            if rate:
-                fx_rates[f"{currency}/JPY"] = rate
-    
-    # BTC価格も取得
-    btc_data = await price_fetcher._fetch_crypto_price("bitcoin")
-    if btc_data:
-        fx_rates["BTC/JPY"] = btc_data['price']
-        fx_rates["BTC/USD"] = btc_data.get('price_usd', 0)
-    
-    # レスポンス構築
     current_prices = {}
-    today = date.today()
+    stale_asset_ids = []
+    last_updated = None
+    for asset in assets:
+        if not asset.symbol:  # シンボルがある場合のみ価格取得
+            continue
+        
+        quote = quotes.get(asset.id)
+        fetched_at = quote.updated_at if quote else None
+        if fetched_at is not None and fetched_at.tzinfo is None:
+            fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+        stale = fetched_at is None or (now - fetched_at).total_seconds() > price_ttl_seconds(asset.asset_class)
+        if stale:
+            stale_asset_ids.append(asset.id)
+        if not quote:
+            continue
+        
+        if last_updated is None or fetched_at > last_updated:
+            last_updated = fetched_at
+        current_prices[asset.symbol] = {
+            "asset_id": str(asset.id),
+            "symbol": asset.symbol,
+            "name": asset.name,
+            "price": quote.price,
+            "currency": asset.currency,
+            "asset_class": asset.asset_class.value,
+            "date": quote.date.isoformat(),
+            "source": quote.source,
+            "fetched_at": fetched_at.isoformat(),
+            "stale": stale
+        }
     
-    for symbol, price_data in price_results.items():
-        if price_data and symbol in asset_map:
-            asset_info = asset_map[symbol]
-            
-            # DBに価格を保存（今日の分がまだない場合）
-            try:
-                asset_uuid = uuid.UUID(asset_info["id"])
-                existing = await db.execute(
-                    select(Price).where(
-                        and_(
-                            Price.asset_id == asset_uuid,
-                            Price.date == today
-                        )
-                    )
-                )
-                
-                if not existing.scalar_one_or_none():
-                    new_price = Price(
-                        asset_id=asset_uuid,
-                        date=price_data['date'],
-                        price=price_data['price'],
-                        open=price_data.get('open'),
-                        high=price_data.get('high'),
-                        low=price_data.get('low'),
-                        volume=price_data.get('volume'),
-                        source=price_data.get('source')
-                    )
-                    db.add(new_price)
-                
-                # レスポンスに追加
-                current_prices[symbol] = {
-                    "asset_id": asset_info["id"],
-                    "symbol": symbol,
-                    "name": asset_info["name"],
-                    "price": price_data['price'],
-                    "currency": asset_info["currency"],
-                    "asset_class": asset_info["asset_class"],
-                    "change_24h": price_data.get('change_24h'),
-                    "date": price_data['date'].isoformat(),
-                    "source": price_data.get('source')
-                }
-                
-            except Exception as e:
-                logger.error(f"Error saving price for {symbol}: {e}")
+    refresh_scheduled = False
+    if stale_asset_ids and not wait:
+        refresh_scheduled = await schedule_refresh(stale_asset_ids)
     
-    # DBの変更をコミット
-    try:
-        await db.commit()
-    except Exception as e:
-        logger.error(f"Error committing prices: {e}")
-        await db.rollback()
+    if fx_rates is None:
+        fx_rates = await refresher.get_fx_rates()
     
     return CurrentPricesResponse(
         prices=current_prices,
-        last_updated=datetime.now().isoformat(),
-        fx_rates=fx_rates
+        last_updated=(last_updated or now).isoformat(),
+        fx_rates=fx_rates,
+        stale_count=len(stale_asset_ids),
+        refresh_scheduled=refresh_scheduled
     )
 
 @router.get("/latest")
 async def get_latest_prices(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get latest prices for all assets"""
-    # Get all assets
-    result = await db.execute(select(Asset))
-    assets = result.scalars().all()
-    
-    latest_prices = {}
-    
-    for asset in assets:
-        # Get latest price for each asset
-        result = await db.execute(
-            select(Price)
-            .where(Price.asset_id == asset.id)
-            .order_by(Price.date.desc())
-            .limit(1)
-        )
-        price = result.scalar_one_or_none()
-        
-        if price:
-            latest_prices[asset.symbol or str(asset.id)] = {
-                "asset_id": str(asset.id),
-                "symbol": asset.symbol,
-                "name": asset.name,
-                "price": price.price,
-                "date": price.date.isoformat(),
-                "currency": asset.currency,
-                "source": price.source
-            }
+    return await build_latest_prices(db)
+
+async def build_latest_prices(db: AsyncSession) -> Dict:
+    rows = await fetch_latest_prices(db)
     
-    return latest_prices
+    return {
+        row.symbol or str(row.asset_id): {
+            "asset_id": str(row.asset_id),
+            "symbol": row.symbol,
+            "name": row.name,
+            "price": row.price,
+            "date": row.date.isoformat(),
+            "currency": row.currency,
+            "source": row.source
+        }
+        for row in rows
+    }
 
 @router.post("/history", response_model=List[PriceResponse])
 async def get_price_history(
     request: PriceHistoryRequest,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get price history for a specific asset"""
+    """Get price history for a specific asset
+
+    With limit, results are paged by (date, id); the next page's cursor is
+    returned in the X-Next-Cursor header. With points, the range is instead
+    downsampled on the server to at most that many rows (LTTB or OHLC bars).
+    """
+    if request.points is not None and (request.limit is not None or request.cursor):
+        raise HTTPException(status_code=400, detail="points cannot be combined with limit/cursor")
+
     # Default date range if not provided
     if not request.end_date:
         request.end_date = date.today()
@@ -216,8 +188,18 @@ async def get_price_history(
         raise HTTPException(status_code=400, detail="Invalid asset ID format")
     
     # Get prices
-    result = await db.execute(
-        select(Price)
+    query = (
+        select(
+            Price.id,
+            Price.asset_id,
+            Price.date,
+            Price.price,
+            Price.open,
+            Price.high,
+            Price.low,
+            Price.volume,
+            Price.source,
+        )
         .where(
             and_(
                 Price.asset_id == asset_uuid,
@@ -225,25 +207,112 @@ async def get_price_history(
                 Price.date <= request.end_date
             )
         )
-        .order_by(Price.date)
+        .order_by(Price.date, Price.id)
     )
-    prices = result.scalars().all()
-    
-    return [
-        PriceResponse(
-            id=str(price.id),
-            asset_id=str(price.asset_id),
-            date=price.date,
-            price=price.price,
-            open=price.open,
-            high=price.high,
-            low=price.low,
-            volume=price.volume,
-            source=price.source
-        )
-        for price in prices
+
+    if request.cursor:
+        try:
+            after_date, after_id = decode_cursor(request.cursor, 2)
+            after = (date.fromisoformat(after_date), uuid.UUID(after_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # _asset_date_uc を (asset_id, date) で範囲スキャン（期間外の年パーティションは除外される）
+        query = query.where(tuple_(Price.date, Price.id) > after)
+
+    if request.points is not None:
+        result = await db.execute(query)
+        rows = [dict(row) for row in result.mappings()]
+        return FastJSONResponse(downsample_price_rows(rows, request.points, request.downsample))
+
+    if request.limit is None:
+        return rows_response(await db.execute(query))
+    result = await db.execute(query.limit(request.limit + 1))
+    return keyset_page_response(result, request.limit, ("date", "id"))
+
+@router.post("/history/bulk")
+async def get_bulk_price_history(
+    request: BulkPriceHistoryRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Price history of many assets in columnar form.
+
+    JSON: {"dates": [...], "series": {asset_id: [price | null, ...]}, "assets": [...]}
+    with every series aligned to the shared date axis. With format=arrow the
+    same table (a date column plus one float64 column per asset) is returned
+    as an Arrow IPC stream.
+
+    With points, the shared date axis is cut into at most that many buckets;
+    series then holds each bucket's close, dates its first day, and per-asset
+    open/high/low arrays are added. (LTTB would pick different days for each
+    asset and break the shared axis, so bulk downsampling uses OHLC buckets.)
+    """
+    end_date = request.end_date or date.today()
+    start_date = request.start_date or end_date - timedelta(days=365)
+
+    try:
+        asset_uuids = list(dict.fromkeys(uuid.UUID(asset_id) for asset_id in request.asset_ids))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid asset ID format")
+
+    result = await db.execute(
+        select(Asset.id, Asset.symbol, Asset.name, Asset.currency).where(Asset.id.in_(asset_uuids))
+    )
+    assets = {row.id: row for row in result.all()}
+    missing = [str(asset_id) for asset_id in asset_uuids if asset_id not in assets]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Assets not found: {', '.join(missing)}")
+
+    dates, series = await fetch_price_matrix(db, asset_uuids, start_date, end_date)
+    ohlc = {}
+    if request.points is not None and len(dates) > request.points:
+        for asset_id, values in series.items():
+            bars = ohlc_buckets(values, request.points)
+            series[asset_id] = bars["close"]
+            ohlc[str(asset_id)] = {key: bars[key] for key in ("open", "high", "low")}
+        dates = [dates[i] for i in bars["start"]]
+    asset_meta = [
+        {
+            "asset_id": str(asset_id),
+            "symbol": assets[asset_id].symbol,
+            "name": assets[asset_id].name,
+            "currency": assets[asset_id].currency,
+        }
+        for asset_id in asset_uuids
     ]
 
+    if request.format == "arrow":
+        return Response(
+            content=_arrow_ipc(dates, series, ohlc, asset_meta),
+            media_type="application/vnd.apache.arrow.stream"
+        )
+
+    return FastJSONResponse({
+        "start_date": start_date,
+        "end_date": end_date,
+        "dates": dates,
+        "series": {str(asset_id): values for asset_id, values in series.items()},
+        **({"ohlc": ohlc} if ohlc else {}),
+        "assets": asset_meta,
+    })
+
+def _arrow_ipc(dates: List[date], series: Dict, ohlc: Dict, asset_meta: List[Dict]) -> bytes:
+    import pyarrow as pa  # import が重いので arrow 形式の時だけ読み込む
+
+    columns = {"date": pa.array(dates, type=pa.date32())}
+    for asset_id, values in series.items():
+        # NaN（価格なし）はArrowのnullにする
+        columns[str(asset_id)] = pa.array(values, type=pa.float64(), from_pandas=True)
+        for key, bar_values in ohlc.get(str(asset_id), {}).items():
+            columns[f"{asset_id}:{key}"] = pa.array(bar_values, type=pa.float64(), from_pandas=True)
+    table = pa.table(columns).replace_schema_metadata({"assets": json.dumps(asset_meta)})
+
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
 @router.post("/fetch/{asset_id}")
 async def fetch_price(
     asset_id: str,
@@ -268,19 +337,14 @@ async def fetch_price(
     if not asset.symbol:
         raise HTTPException(status_code=400, detail="Asset has no symbol for price fetching")
     
-    # Check if we already have today's price
+    # Check if we already have today's price（latest_pricesの主キー検索）
     today = date.today()
     result = await db.execute(
-        select(Price).where(
-            and_(
-                Price.asset_id == asset_uuid,
-                Price.date == today
-            )
-        )
+        select(LatestPrice.price, LatestPrice.date).where(LatestPrice.asset_id == asset_uuid)
     )
-    existing_price = result.scalar_one_or_none()
+    existing_price = result.first()
     
-    if existing_price:
+    if existing_price and existing_price.date == today:
         return {
             "message": "Price already exists for today",
             "price": existing_price.price,
@@ -302,27 +366,29 @@ async def fetch_price(
     if not price_data:
         raise HTTPException(status_code=503, detail="Failed to fetch price")
     
-    # Save price
-    price = Price(
-        asset_id=asset_uuid,
-        date=price_data['date'],
-        price=price_data['price'],
-        open=price_data.get('open'),
-        high=price_data.get('high'),
-        low=price_data.get('low'),
-        volume=price_data.get('volume'),
-        source=price_data.get('source')
-    )
-    db.add(price)
-    await db.commit()
+    # Save price（他の取得経路と同じUPSERT）
+    ingestor = PriceIngestor(db)
+    price = ingestor.add(asset_uuid, price_data)
+    report = await ingestor.flush()
+    if report.failed:
+        raise HTTPException(status_code=500, detail="Failed to save price")
     
     return {
         "message": "Price fetched successfully",
-        "price": price.price,
-        "date": price.date.isoformat(),
-        "source": price.source
+        "price": price["price"],
+        "date": price["date"].isoformat(),
+        "source": price["source"]
     }
 
+@router.get("/fetch-plan")
+async def get_fetch_plan(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Dry run of the nightly fetch: which provider each symbol goes to and how many upstream calls it takes"""
+    plan = await plan_nightly_fetch(db)
+    return plan.as_dict()
+
 @router.get("/fx-rates")
 async def get_fx_rates(
     current_user: User = Depends(get_current_user)
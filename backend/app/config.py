@@ -4,6 +4,7 @@ from typing import List
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str
+    DATABASE_REPLICA_URL: str = ""  # 読み取り専用レプリカ（任意）
     
     # Redis
     REDIS_URL: str
@@ -42,11 +43,54 @@ class Settings(BaseSettings):
     # Application
     TIMEZONE: str = "Asia/Tokyo"
     BASE_CURRENCY: str = "JPY"
+    CRYPTO_TAX_RATE: float = 0.55  # 暗号資産の雑所得（所得税+住民税の最高税率）
     
     # Price fetch settings
     PRICE_FETCH_HOUR: int = 0  # 00:30 JST
     PRICE_FETCH_MINUTE: int = 30
     
+    # /api/prices/current の鮮度（秒）。これより古い価格はバックグラウンドで再取得
+    PRICE_TTL_SECONDS: int = 3600
+    CRYPTO_PRICE_TTL_SECONDS: int = 300
+    PRICE_REFRESH_LOCK_SECONDS: int = 120  # ワーカー間の重複リフレッシュ防止
+    PRICE_UPSERT_BATCH_SIZE: int = 500  # 価格のUPSERTを何行ずつ書き込むか（バッチごとにコミット）
+    
+    # 夜間の価格取得パイプライン（取得・解析・書き込みを並行実行）
+    PRICE_PIPELINE_FETCH_WORKERS: int = 8
+    PRICE_PIPELINE_QUEUE_SIZE: int = 100  # ステージ間キューの上限（満杯なら上流が待つ）
+    PRICE_PIPELINE_FLUSH_SECONDS: float = 2.0  # バッチが埋まらなくてもこの秒数で書き込む
+    
+    # ダッシュボードのレスポンスキャッシュ（スナップショット書き込みで無効化）
+    DASHBOARD_CACHE_TTL_SECONDS: int = 86400
+    
+    # 認証済みユーザーのキャッシュ（ユーザー更新時に破棄）
+    AUTH_CACHE_REDIS: bool = True  # ワーカー間で共有する場合
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_LOCAL_CACHE_TTL_SECONDS: int = 5  # プロセス内。他ワーカーでの変更はこの秒数で反映
+    
+    # イベントループ外で実行するCPU処理のワーカー数
+    EXECUTOR_THREAD_WORKERS: int = 4  # bcrypt, QRコード
+    EXECUTOR_PROCESS_WORKERS: int = 2  # pandas, openpyxl
+    EXECUTOR_SLOW_WAIT_SECONDS: float = 0.5  # これ以上キューで待ったら警告ログ
+    
+    # DB接続プール（プロセスごと）。uvicornワーカー数 × (POOL_SIZE + MAX_OVERFLOW) が
+    # PostgreSQLの max_connections（またはPgBouncerのプール）に収まるように設定
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # -1 で無効
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100  # asyncpgのプリペアドステートメントキャッシュ（接続ごと）
+    DB_PGBOUNCER_MODE: bool = False  # PgBouncer（transaction pooling）経由の場合はTrue
+    
+    # 読み取り専用レプリカの遅延がこの秒数を超えたらプライマリから読む
+    REPLICA_MAX_LAG_SECONDS: float = 10
+    REPLICA_LAG_CHECK_SECONDS: float = 5
+    
+    # テスト用: eager loadを指定していないリレーションへのアクセスを、
+    # identity mapで解決できる場合も含めてすべて例外にする
+    STRICT_ORM_LOADING: bool = False
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,27 +1,253 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional, TypeVar
+from sqlalchemy import event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import Session, declarative_base, raiseload
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
+from app.redis_client import close_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that also tracks callers waiting for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+        self.timeouts = 0
+        self.wait_times = deque(maxlen=256)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+            self.wait_times.append(time.perf_counter() - started)
+
+def _connect_args() -> dict:
+    if settings.DB_PGBOUNCER_MODE:
+        # PgBouncerのtransaction poolingではサーバー接続が入れ替わるため、
+        # プリペアドステートメントをキャッシュせず、名前も毎回ユニークにする
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+
+def _create_engine(url: str):
+    return create_async_engine(
+        url.replace("postgresql://", "postgresql+asyncpg://"),
+        echo=False,
+        future=True,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=_connect_args()
+    )
+
+# コミット後に await する処理（session.info に積む）
+AFTER_COMMIT_HOOKS = "after_commit_hooks"
+
+def defer_after_commit(session: Session, hook: Callable[[], Awaitable[None]]):
+    """Await hook once the session's commit has returned.
+
+    ORM event listeners are synchronous and, under AsyncSession, run on the
+    event loop thread, so they must not do network I/O themselves; they queue
+    it here instead.
+    """
+    session.info.setdefault(AFTER_COMMIT_HOOKS, []).append(hook)
+
+class AppSession(AsyncSession):
+    """AsyncSession that runs the hooks queued with defer_after_commit"""
+
+    async def commit(self):
+        await super().commit()
+        for hook in self.sync_session.info.pop(AFTER_COMMIT_HOOKS, []):
+            try:
+                await hook()
+            except Exception as e:
+                logger.warning(f"After-commit hook {getattr(hook, '__qualname__', hook)} failed: {e}")
 
 # Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
-    echo=False,
-    future=True
-)
+engine = _create_engine(settings.DATABASE_URL)
 
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
     engine,
-    class_=AsyncSession,
+    class_=AppSession,
     expire_on_commit=False
 )
 
+# 読み取り専用エンドポイント用のレプリカ（DATABASE_REPLICA_URL 未設定ならプライマリのみ）
+replica_engine = _create_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else None
+ReplicaSessionLocal = async_sessionmaker(
+    replica_engine,
+    class_=AppSession,
+    expire_on_commit=False
+) if replica_engine is not None else None
+
 # Create base class for models
 Base = declarative_base()
 
+# リレーションはモデル側で lazy="raise_on_sql"（SQLを伴う遅延ロードは例外）。
+# STRICT_ORM_LOADING では、クエリで明示的に読み込んでいないリレーションへの
+# アクセスをすべて例外にして、計画外の遅延ロードをテストで検出する
+if settings.STRICT_ORM_LOADING:
+    @event.listens_for(Session, "do_orm_execute")
+    def _raiseload_unplanned_relationships(orm_execute_state):
+        if (
+            orm_execute_state.is_select
+            and not orm_execute_state.is_column_load
+            and not orm_execute_state.is_relationship_load
+        ):
+            orm_execute_state.statement = orm_execute_state.statement.options(raiseload("*"))
+
+def run_async(func: Callable[[], Awaitable[T]]) -> T:
+    """asyncio.run() for Celery tasks.
+
+    Pooled asyncpg and Redis connections belong to the event loop that opened
+    them, so the pools are emptied before this task's loop closes; the next
+    task's asyncio.run() then starts with fresh connections.
+    """
+    async def runner():
+        try:
+            return await func()
+        finally:
+            await engine.dispose()
+            if replica_engine is not None:
+                await replica_engine.dispose()
+            await close_redis()
+    return asyncio.run(runner())
+
+# ─────────────────────────────
+# レプリカへの振り分け
+# ─────────────────────────────
+
+# 書き込んだユーザーを全ワーカーに知らせるキー（REPLICA_MAX_LAG_SECONDS で消える）
+RECENT_WRITE_KEY = "db:recent-write"
+
+# リクエストの書き込み主（get_current_user が設定）。read-your-writes はこの単位で、
+# 書き込み主のないセッション（Celeryの夜間取得など）はレプリカの読み取りを止めない
+current_writer: ContextVar[Optional[str]] = ContextVar("current_writer", default=None)
+
+# レプリカ遅延（秒）。0 = 追いついている
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+# 直近の遅延チェック結果（lag=None はレプリカに接続できない）
+replica_state = {"checked_at": 0.0, "lag": None}
+
+# 書き込み主ごとの、このプロセスでの最後の書き込み時刻
+_recent_writes: dict = {}
+
+def _recent_write_key(writer: str) -> str:
+    return f"{RECENT_WRITE_KEY}:{writer}"
+
+async def replica_lag() -> Optional[float]:
+    """Replica lag in seconds, checked at most every REPLICA_LAG_CHECK_SECONDS"""
+    now = time.monotonic()
+    if now - replica_state["checked_at"] < settings.REPLICA_LAG_CHECK_SECONDS:
+        return replica_state["lag"]
+    replica_state["checked_at"] = now
+    try:
+        async with replica_engine.connect() as conn:
+            lag = (await conn.execute(REPLICA_LAG_QUERY)).scalar()
+        replica_state["lag"] = float(lag or 0)
+    except Exception as e:
+        logger.warning(f"Replica lag check failed, reading from primary: {e}")
+        replica_state["lag"] = None
+    return replica_state["lag"]
+
+async def use_replica() -> bool:
+    """Whether reads can go to the replica right now.
+
+    Not right after the current writer's own write (read-your-writes: once
+    the replica is within REPLICA_MAX_LAG_SECONDS, a write older than that is
+    already replayed), and not while the replica lags more than that or is
+    unreachable.
+    """
+    if ReplicaSessionLocal is None:
+        return False
+    writer = current_writer.get()
+    if writer is not None:
+        if time.monotonic() - _recent_writes.get(writer, 0.0) < settings.REPLICA_MAX_LAG_SECONDS:
+            return False
+        try:
+            if await get_redis().exists(_recent_write_key(writer)):
+                return False
+        except Exception as e:
+            logger.warning(f"Recent-write check failed, reading from primary: {e}")
+            return False
+    lag = await replica_lag()
+    return lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS
+
+async def read_sessionmaker() -> async_sessionmaker:
+    return ReplicaSessionLocal if await use_replica() else AsyncSessionLocal
+
+if replica_engine is not None:
+    # プライマリへの書き込みをコミット時に記録（ORMのflushとCoreのINSERT/UPDATE/DELETE）
+    @event.listens_for(Session, "after_flush")
+    def _track_flush_write(session, flush_context):
+        session.info["db_write"] = True
+
+    @event.listens_for(Session, "do_orm_execute")
+    def _track_statement_write(orm_execute_state):
+        state = orm_execute_state
+        if state.is_insert or state.is_update or state.is_delete:
+            state.session.info["db_write"] = True
+
+    async def _record_recent_write():
+        writer = current_writer.get()
+        if writer is None:
+            return
+        _recent_writes[writer] = time.monotonic()
+        await get_redis().set(
+            _recent_write_key(writer), "1", ex=max(int(settings.REPLICA_MAX_LAG_SECONDS + 0.999), 1)
+        )
+
+    @event.listens_for(Session, "after_commit")
+    def _mark_recent_write(session):
+        if session.info.pop("db_write", False):
+            defer_after_commit(session, _record_recent_write)
+
+    @event.listens_for(Session, "after_rollback")
+    def _discard_write(session):
+        session.info.pop("db_write", None)
+
 # Dependency to get database session
 async def get_db():
     async with AsyncSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+async def get_read_db():
+    """Session for read-only endpoints: the replica when it is configured and
+    fresh, otherwise the primary. Never write through it."""
+    async with (await read_sessionmaker())() as session:
         try:
             yield session
         finally:
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 直近の待ち時間・実行時間を保持する件数
+STATS_WINDOW = 256
+
+def _timed_call(func: Callable, args: tuple):
+    """Runs inside the worker; the start time lets the caller measure queue wait
+    (time.time() so it is comparable across processes)"""
+    started_at = time.time()
+    result = func(*args)
+    return started_at, time.time(), result
+
+class InstrumentedExecutor:
+    """A thread or process pool that records queue depth and wait/run times"""
+
+    def __init__(self, name: str, factory: Callable[[], Executor], max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._factory = factory
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._waits = deque(maxlen=STATS_WINDOW)
+        self._runs = deque(maxlen=STATS_WINDOW)
+
+    async def run(self, func: Callable, *args):
+        if self._executor is None:
+            self._executor = self._factory()
+
+        submitted_at = time.time()
+        self._in_flight += 1
+        self._submitted += 1
+        try:
+            started_at, finished_at, result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _timed_call, func, args
+            )
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+
+        self._completed += 1
+        wait = max(started_at - submitted_at, 0.0)
+        self._waits.append(wait)
+        self._runs.append(finished_at - started_at)
+        if wait > settings.EXECUTOR_SLOW_WAIT_SECONDS:
+            logger.warning(
+                f"{self.name} executor: {getattr(func, '__name__', func)} waited {wait:.3f}s "
+                f"({self._in_flight} in flight, {self.max_workers} workers)"
+            )
+        return result
+
+    def stats(self) -> Dict:
+        def summary(values):
+            if not values:
+                return {"avg": 0.0, "max": 0.0}
+            return {"avg": sum(values) / len(values), "max": max(values)}
+
+        return {
+            "max_workers": self.max_workers,
+            "started": self._executor is not None,
+            "in_flight": self._in_flight,
+            # FIFOなので、ワーカー数を超えた分がキューで待っている
+            "queue_depth": max(self._in_flight - self.max_workers, 0),
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "wait_seconds": summary(self._waits),
+            "run_seconds": summary(self._runs),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# bcrypt・QRコード生成など（GILを解放する or 短時間のCPU処理）
+thread_pool = InstrumentedExecutor(
+    "thread",
+    lambda: ThreadPoolExecutor(max_workers=settings.EXECUTOR_THREAD_WORKERS, thread_name_prefix="cpu"),
+    settings.EXECUTOR_THREAD_WORKERS,
+)
+
+# pandas・openpyxl などの重い処理（初回利用時に起動）
+process_pool = InstrumentedExecutor(
+    "process",
+    lambda: ProcessPoolExecutor(max_workers=settings.EXECUTOR_PROCESS_WORKERS),
+    settings.EXECUTOR_PROCESS_WORKERS,
+)
+
+async def run_in_thread(func: Callable, *args):
+    return await thread_pool.run(func, *args)
+
+async def run_in_process(func: Callable, *args):
+    """func and args must be picklable (module-level function)"""
+    return await process_pool.run(func, *args)
+
+def executor_stats() -> Dict:
+    return {pool.name: pool.stats() for pool in (thread_pool, process_pool)}
+
+def shutdown_executors():
+    for pool in (thread_pool, process_pool):
+        pool.shutdown()
@@ -7,6 +7,8 @@ from app.config import settings
 from app.database import engine, Base
 from app.api import auth, assets, owners, holdings, prices, btc_trades, dashboard
 from app.tasks.scheduled_tasks import setup_periodic_tasks
+from app.metrics import QueryCountMiddleware, QUERY_COUNT_HEADER, pool_stats
+from app.executors import executor_stats, shutdown_executors
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +27,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Asset Dashboard API...")
+    shutdown_executors()
 
 # Create FastAPI app
 app = FastAPI(
@@ -46,8 +49,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", QUERY_COUNT_HEADER],  # ページングのカーソル、リクエストごとのSQL数
 )
 
+# リクエストごとのSQL実行回数をレスポンスヘッダーに付与
+app.add_middleware(QueryCountMiddleware)
+
 # 🔧 修正: ルーター登録の順序と詳細ログ追加
 logger.info("Registering API routes...")
 
@@ -99,6 +106,16 @@ async def health_check():
         "service": "asset-dashboard-api"
     }
 
+@app.get("/health/executors")
+async def executor_health():
+    """Queue depth and wait/run times of the CPU executors"""
+    return executor_stats()
+
+@app.get("/health/db-pool")
+async def db_pool_health():
+    """Connection pool usage of this worker process"""
+    return pool_stats()
+
 # 🔧 追加: デバッグ用エンドポイント
 @app.get("/debug/routes")
 async def debug_routes():
@@ -0,0 +1,117 @@
+import logging
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Optional
+from sqlalchemy import event
+
+from app.config import settings
+from app.database import engine, replica_engine, replica_state
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = "X-DB-Queries"
+
+# リクエスト中に発行したSQLの数（ミドルウェアがリクエストごとにリストをセット）
+_query_counter: ContextVar[Optional[list]] = ContextVar("query_counter", default=None)
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+class QueryCountMiddleware:
+    """Report the number of SQL statements each request executed in an
+    X-DB-Queries response header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = [0]
+        token = _query_counter.set(counter)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                # ヘッダー送信時点までのクエリ数（ストリーミング中のクエリは含まない）
+                headers = list(message.get("headers", []))
+                headers.append((QUERY_COUNT_HEADER.lower().encode(), str(counter[0]).encode()))
+                message = {**message, "headers": headers}
+                logger.debug(f"{scope['method']} {scope['path']}: {counter[0]} queries")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _query_counter.reset(token)
+
+# ─────────────────────────────
+# 接続プール（プロセスごと）
+# ─────────────────────────────
+
+# エンジンごとの新規接続数と、接続の確立にかかった時間（直近）
+_connects: Dict[str, Dict] = {}
+
+def _connect_started(dialect, conn_rec, cargs, cparams):
+    conn_rec.info["connect_started"] = time.perf_counter()
+
+def _instrument(name: str, sync_engine):
+    """Count queries and time new connections on one engine"""
+    stats = _connects[name] = {"count": 0, "times": deque(maxlen=256)}
+
+    def _connect_finished(dbapi_connection, connection_record):
+        started = connection_record.info.pop("connect_started", None)
+        if started is not None:
+            stats["times"].append(time.perf_counter() - started)
+        stats["count"] += 1
+
+    event.listen(sync_engine, "before_cursor_execute", _count_query)
+    event.listen(sync_engine, "do_connect", _connect_started)
+    event.listen(sync_engine, "connect", _connect_finished)
+
+_instrument("primary", engine.sync_engine)
+if replica_engine is not None:
+    _instrument("replica", replica_engine.sync_engine)
+
+def _connect_usage(name: str) -> Dict:
+    return {"connects": _connects[name]["count"], "connect_seconds": _summary(_connects[name]["times"])}
+
+def _summary(values) -> Dict:
+    if not values:
+        return {"avg": 0.0, "max": 0.0}
+    return {"avg": sum(values) / len(values), "max": max(values)}
+
+def _pool_usage(pool) -> Dict:
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # overflow() はプールが埋まるまで負の値
+        "overflow": max(pool.overflow(), 0),
+        "waiting": getattr(pool, "waiting", 0),
+        "checkout_timeouts": getattr(pool, "timeouts", 0),
+        "checkout_wait_seconds": _summary(getattr(pool, "wait_times", ())),
+    }
+
+def pool_stats() -> Dict:
+    """Usage of this process's connection pools (each uvicorn / Celery worker has its own)"""
+    stats = {
+        "pid": os.getpid(),
+        "pgbouncer_mode": settings.DB_PGBOUNCER_MODE,
+        **_pool_usage(engine.sync_engine.pool),
+        **_connect_usage("primary"),
+    }
+    if replica_engine is not None:
+        stats["replica"] = {
+            **_pool_usage(replica_engine.sync_engine.pool),
+            **_connect_usage("replica"),
+            "lag_seconds": replica_state["lag"],
+            "max_lag_seconds": settings.REPLICA_MAX_LAG_SECONDS,
+        }
+    return stats
@@ -2,9 +2,9 @@ from app.models.user import User
 from app.models.asset import Asset, AssetClass, AssetType, Region
 from app.models.owner import Owner, OwnerType  # 新規追加
 from app.models.holding import Holding, AccountType
-from app.models.price import Price
+from app.models.price import Price, LatestPrice
 from app.models.btc_trade import BTCTrade
-from app.models.valuation import ValuationSnapshot
+from app.models.valuation import ValuationSnapshot, ValuationRollup
 from app.models.cash_balance import CashBalance
 
 __all__ = [
@@ -18,7 +18,9 @@ __all__ = [
     "Holding",
     "AccountType",
     "Price",
+    "LatestPrice",
     "BTCTrade",
     "ValuationSnapshot",
+    "ValuationRollup",
     "CashBalance"
 ]
\ No newline at end of file
@@ -69,8 +69,9 @@ class Asset(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
-    holdings = relationship("Holding", back_populates="asset", cascade="all, delete-orphan")
-    prices = relationship("Price", back_populates="asset", cascade="all, delete-orphan")
+    # 子行の削除はDBのON DELETE CASCADEに任せる（コレクションを読み込まない）
+    holdings = relationship("Holding", back_populates="asset", cascade="all, delete-orphan", passive_deletes=True, lazy="raise_on_sql")
+    prices = relationship("Price", back_populates="asset", cascade="all, delete-orphan", passive_deletes=True, lazy="raise_on_sql")
     
     # Unique constraint
     __table_args__ = (
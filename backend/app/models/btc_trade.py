@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Float, DateTime, String, Text, Enum
+from sqlalchemy import Column, Float, DateTime, String, Text, Enum, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 import enum
@@ -14,10 +14,12 @@ class BTCTrade(Base):
     __tablename__ = "btc_trades"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    # 対象の暗号資産（NULLは既存データ互換でBTC扱い）
+    asset_id = Column(UUID(as_uuid=True), ForeignKey("assets.id"), nullable=True)
     txid = Column(String(100), nullable=True, unique=True)  # Transaction ID if available
-    amount_btc = Column(Float, nullable=False)  # Positive for buy, negative for sell
+    amount_btc = Column(Float, nullable=False)  # Coin amount: positive for buy, negative for sell
     counter_value_jpy = Column(Float, nullable=False)  # JPY amount (always positive)
-    jpy_rate = Column(Float, nullable=False)  # JPY per BTC at time of trade
+    jpy_rate = Column(Float, nullable=False)  # JPY per coin at time of trade
     fee_btc = Column(Float, nullable=True, default=0)
     fee_jpy = Column(Float, nullable=True, default=0)
     timestamp = Column(DateTime(timezone=True), nullable=False)
@@ -31,6 +33,10 @@ class BTCTrade(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
+    __table_args__ = (
+        Index('ix_btc_trades_asset_timestamp', 'asset_id', 'timestamp'),
+    )
+    
     @property
     def is_buy(self):
         return self.amount_btc > 0
\ No newline at end of file
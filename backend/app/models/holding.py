@@ -18,8 +18,8 @@ class Holding(Base):
     __tablename__ = "holdings"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    asset_id = Column(UUID(as_uuid=True), ForeignKey("assets.id"), nullable=False)
-    owner_id = Column(UUID(as_uuid=True), ForeignKey("owners.id"), nullable=False)  # 正しい名義人管理
+    asset_id = Column(UUID(as_uuid=True), ForeignKey("assets.id", ondelete="CASCADE"), nullable=False)
+    owner_id = Column(UUID(as_uuid=True), ForeignKey("owners.id", ondelete="CASCADE"), nullable=False)  # 正しい名義人管理
     quantity = Column(Float, nullable=False)
     cost_total = Column(Float, nullable=False)  # Total cost in asset's currency
     acquisition_date = Column(Date, nullable=False)
@@ -34,8 +34,8 @@ class Holding(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships - データベーススキーマと完全一致
-    asset = relationship("Asset", back_populates="holdings")
-    owner = relationship("Owner", back_populates="holdings")
+    asset = relationship("Asset", back_populates="holdings", lazy="raise_on_sql")
+    owner = relationship("Owner", back_populates="holdings", lazy="raise_on_sql")
     
     @property
     def cost_per_unit(self):
@@ -25,4 +25,4 @@ class Owner(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
-    holdings = relationship("Holding", back_populates="owner", cascade="all, delete-orphan")
\ No newline at end of file
+    holdings = relationship("Holding", back_populates="owner", cascade="all, delete-orphan", passive_deletes=True, lazy="raise_on_sql")
\ No newline at end of file
@@ -1,17 +1,30 @@
-from sqlalchemy import Column, Float, Date, ForeignKey, UniqueConstraint, DateTime, String
+from sqlalchemy import Column, Float, Date, ForeignKey, Index, UniqueConstraint, DateTime, String
 from sqlalchemy.dialects.postgresql import UUID  # 🔧 追加: UUID import
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+import os
+import time
 import uuid  # 🔧 追加: uuid import
 from app.database import Base
 
+def uuid7() -> uuid.UUID:
+    """Time-ordered UUID (version 7): 48-bit Unix ms timestamp + 74 random bits.
+
+    New rows land at the right edge of the primary key index instead of a
+    random page (DB-side equivalent: uuid_generate_v7()).
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | 0x7 << 76  # version 7
+    value = value & ~(0x3 << 62) | 0x2 << 62  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
 class Price(Base):
     __tablename__ = "prices"
     
-    # 🔧 修正: UUID主キーに変更（他のテーブルと統一）
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    asset_id = Column(UUID(as_uuid=True), ForeignKey("assets.id"), nullable=False)  # 🔧 修正: UUID外部キー
-    date = Column(Date, nullable=False, index=True)
+    # 年ごとのレンジパーティション（prices_YYYY）。パーティションキーの date も主キーに含める
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    asset_id = Column(UUID(as_uuid=True), ForeignKey("assets.id", ondelete="CASCADE"), nullable=False)  # 🔧 修正: UUID外部キー
+    date = Column(Date, primary_key=True)
     price = Column(Float, nullable=False)  # Price in asset's currency
     
     # Optional fields for more detailed data
@@ -25,11 +38,29 @@ class Price(Base):
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())  # 価格の鮮度
     
     # Relationships
-    asset = relationship("Asset", back_populates="prices")
+    asset = relationship("Asset", back_populates="prices", lazy="raise_on_sql")
     
-    # Unique constraint on asset_id + date
+    # Unique constraint on asset_id + date（銘柄ごとの履歴・最新価格の検索もこのインデックス）
+    # date は挿入順とほぼ一致するため、範囲検索用はBRINで十分
     __table_args__ = (
         UniqueConstraint('asset_id', 'date', name='_asset_date_uc'),
-    )
\ No newline at end of file
+        Index('ix_prices_date_brin', 'date', postgresql_using='brin'),
+        {'postgresql_partition_by': 'RANGE (date)'},
+    )
+class LatestPrice(Base):
+    """Most recent prices row per asset.
+
+    Maintained by a trigger on prices (migration latest_prices), so it changes
+    in the same transaction as every price insert, upsert and delete. Read-only
+    from the application.
+    """
+    __tablename__ = "latest_prices"
+    
+    asset_id = Column(UUID(as_uuid=True), ForeignKey("assets.id", ondelete="CASCADE"), primary_key=True)
+    date = Column(Date, nullable=False)
+    price = Column(Float, nullable=False)
+    source = Column(String(50), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True)  # prices.updated_at of that row
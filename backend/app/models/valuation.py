@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Float, Date, DateTime, JSON
+from sqlalchemy import Column, Float, Date, DateTime, Integer, JSON, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 import uuid
@@ -33,4 +33,28 @@ class ValuationSnapshot(Base):
     # Example: {"USD/JPY": 150.50, "BTC/JPY": 6500000}
     
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ValuationRollup(Base):
+    """Weekly / monthly / yearly close of the daily valuation snapshots"""
+    __tablename__ = "valuation_rollups"
+    
+    # week（月曜始まり）/ month / year
+    granularity = Column(String(10), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    
+    # 期間内最後のスナップショット（終値）
+    last_date = Column(Date, nullable=False)
+    total_jpy = Column(Float, nullable=False)
+    total_usd = Column(Float, nullable=False)
+    total_btc = Column(Float, nullable=False)
+    breakdown_by_category = Column(JSON, nullable=True)
+    breakdown_by_currency = Column(JSON, nullable=True)
+    breakdown_by_account_type = Column(JSON, nullable=True)
+    
+    # 期間内の高値・安値と日数
+    high_jpy = Column(Float, nullable=False)
+    low_jpy = Column(Float, nullable=False)
+    snapshot_count = Column(Integer, nullable=False)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
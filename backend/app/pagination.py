@@ -0,0 +1,35 @@
+import base64
+from typing import List, Sequence
+import orjson
+
+from app.responses import ORJSON_OPTIONS, FastJSONResponse
+
+# 次ページのカーソルはレスポンスヘッダーで返す（ボディは従来通りの配列）
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(values: Sequence) -> str:
+    """Opaque cursor for the sort key of the last row on a page"""
+    return base64.urlsafe_b64encode(orjson.dumps(list(values), option=ORJSON_OPTIONS)).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> List[str]:
+    """Sort key values (as strings) from a cursor; ValueError if malformed"""
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+def keyset_page_response(result, limit: int, key_columns: Sequence[str]) -> FastJSONResponse:
+    """Serialize up to `limit` rows of a query fetched with LIMIT limit + 1.
+
+    The extra row only signals that another page exists; the cursor points at
+    the last row returned.
+    """
+    rows = [dict(row) for row in result.mappings()]
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor([rows[-1][column] for column in key_columns])
+    return FastJSONResponse(rows, headers=headers)
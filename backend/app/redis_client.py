@@ -0,0 +1,42 @@
+import redis
+import redis.asyncio as aioredis
+from app.config import settings
+
+_redis = None
+
+def get_redis() -> aioredis.Redis:
+    """Shared async Redis client (connections are pooled per process)"""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_timeout=2,
+            socket_connect_timeout=2
+        )
+    return _redis
+
+async def close_redis():
+    """Close the async client; the next get_redis() opens one on the running loop"""
+    global _redis
+    if _redis is not None:
+        client, _redis = _redis, None
+        await client.aclose()
+
+_sync_redis = None
+
+def get_sync_redis() -> redis.Redis:
+    """Blocking Redis client for code paths without an event loop (Celery tasks, threads).
+
+    Never call it on the event loop thread: ORM event listeners of an
+    AsyncSession run there too and use defer_after_commit instead.
+    """
+    global _sync_redis
+    if _sync_redis is None:
+        _sync_redis = redis.Redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_timeout=2,
+            socket_connect_timeout=2
+        )
+    return _sync_redis
@@ -0,0 +1,20 @@
+import orjson
+from fastapi.responses import ORJSONResponse
+
+# PydanticのJSON出力に合わせる（UTCは "Z"、Enumは値、UUIDは文字列）
+# numpy配列はそのまま配列として出力（NaNはnull）
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY
+
+class FastJSONResponse(ORJSONResponse):
+    """orjson response for payloads that are already plain dicts and lists.
+
+    Returning a Response from a route skips response_model validation, so the
+    query behind it must produce exactly the fields of the declared schema.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+def rows_response(result) -> FastJSONResponse:
+    """Serialize labeled result rows as a JSON array, one object per row"""
+    return FastJSONResponse([dict(row) for row in result.mappings()])
@@ -1,20 +1,350 @@
-from datetime import datetime
-from typing import List, Dict, Tuple
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Tuple, Optional
+from dataclasses import dataclass
+from collections import deque, namedtuple
+import asyncio
+import heapq
+import io
+import logging
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.models import BTCTrade
+from sqlalchemy import select, func, or_
+from app.config import settings
+from app.executors import run_in_process
+from app.models import BTCTrade, Asset, LatestPrice, Price
+from app.models.asset import AssetClass
 import pandas as pd
 from enum import Enum
 
+logger = logging.getLogger(__name__)
+
+# BTC価格履歴を保持しているAssetのシンボル
+BTC_SYMBOLS = ("BTC", "BITCOIN")
+
+# asset_idが未設定の取引（既存データ）はBTCとして扱う
+DEFAULT_COIN = "BTC"
+
+# プロセス間で受け渡すための軽量な取引データ（replay_lotsはBTCTradeと同じ属性で扱える）
+TradeRow = namedtuple("TradeRow", ["id", "timestamp", "amount_btc", "counter_value_jpy", "fee_jpy", "exchange"])
+
 class CostBasisMethod(str, Enum):
     FIFO = "FIFO"
     HIFO = "HIFO"
 
+@dataclass(slots=True)
+class OpenLot:
+    """An unmatched (or partially matched) buy lot"""
+    trade_id: object
+    acquired_at: datetime
+    amount_btc: float
+    cost_per_btc: float
+    exchange: Optional[str] = None
+
+    @property
+    def cost_basis(self) -> float:
+        return self.amount_btc * self.cost_per_btc
+
+def replay_lots(trades: List[BTCTrade], method: CostBasisMethod = CostBasisMethod.FIFO) -> Tuple[List[OpenLot], List[Dict]]:
+    """Replay trades in timestamp order and return the remaining open lots
+    plus one position event per trade (quantity and remaining cost basis after it).
+
+    FIFO consumes lots from a deque, HIFO from a max-heap on cost per BTC, so the
+    replay is O(n log n) instead of re-matching every sell from scratch.
+    """
+    fifo: deque = deque()
+    hifo: List[Tuple[float, int, OpenLot]] = []
+    quantity = 0.0
+    cost_basis = 0.0
+    events = []
+
+    for seq, trade in enumerate(sorted(trades, key=lambda t: t.timestamp)):
+        if trade.amount_btc > 0:
+            lot = OpenLot(
+                trade_id=trade.id,
+                acquired_at=trade.timestamp,
+                amount_btc=trade.amount_btc,
+                cost_per_btc=(trade.counter_value_jpy + (trade.fee_jpy or 0)) / trade.amount_btc,
+                exchange=trade.exchange,
+            )
+            if method == CostBasisMethod.FIFO:
+                fifo.append(lot)
+            else:
+                heapq.heappush(hifo, (-lot.cost_per_btc, seq, lot))
+            quantity += lot.amount_btc
+            cost_basis += lot.cost_basis
+        elif trade.amount_btc < 0:
+            remaining = abs(trade.amount_btc)
+            realized_cost = 0.0
+            while remaining > 1e-12 and (fifo or hifo):
+                lot = fifo[0] if method == CostBasisMethod.FIFO else hifo[0][2]
+                use = min(lot.amount_btc, remaining)
+                lot.amount_btc -= use
+                remaining -= use
+                quantity -= use
+                cost_basis -= use * lot.cost_per_btc
+                realized_cost += use * lot.cost_per_btc
+                if lot.amount_btc <= 1e-12:
+                    if method == CostBasisMethod.FIFO:
+                        fifo.popleft()
+                    else:
+                        heapq.heappop(hifo)
+            if remaining > 1e-12:
+                logger.warning(f"Sell {trade.id} exceeds open lots by {remaining} BTC")
+
+        event = {
+            "timestamp": trade.timestamp,
+            "btc_quantity": max(quantity, 0.0),
+            "cost_basis_jpy": max(cost_basis, 0.0),
+        }
+        if trade.amount_btc < 0:
+            event["matched_cost_jpy"] = realized_cost
+            event["unmatched_amount"] = max(remaining, 0.0)
+        events.append(event)
+
+    if method == CostBasisMethod.FIFO:
+        open_lots = list(fifo)
+    else:
+        open_lots = sorted((entry[2] for entry in hifo), key=lambda lot: lot.acquired_at)
+    return open_lots, events
+
+def compute_year_gains(
+    symbol: str,
+    trades: List[TradeRow],
+    method: CostBasisMethod,
+    year: int
+) -> Tuple[str, List[Dict]]:
+    """Lot matching for a single coin, returning report rows for sells in year.
+
+    Runs in a worker process, so it only takes and returns plain data.
+    """
+    _, events = replay_lots(trades, method)
+    rows = []
+    for trade, event in zip(sorted(trades, key=lambda t: t.timestamp), events):
+        if trade.amount_btc >= 0 or trade.timestamp.year != year:
+            continue
+        if event["unmatched_amount"] > 1e-12:
+            logger.warning(f"{symbol} sell {trade.id} has {event['unmatched_amount']} unmatched")
+        gross_proceeds = trade.counter_value_jpy - (trade.fee_jpy or 0)
+        rows.append({
+            "Date": trade.timestamp.strftime("%Y-%m-%d"),
+            f"Amount ({symbol})": abs(trade.amount_btc),
+            "Gross Proceeds (JPY)": gross_proceeds,
+            "Cost Basis (JPY)": event["matched_cost_jpy"],
+            "Realized Gain (JPY)": gross_proceeds - event["matched_cost_jpy"],
+            "Exchange": trade.exchange or "Unknown",
+            "Method": method.value
+        })
+    return symbol, rows
+
+def write_report_workbook(sheets: Dict[str, pd.DataFrame]) -> bytes:
+    """Render report sheets to an .xlsx file (process pool worker)"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        for sheet_name, df in sheets.items():
+            # Excelのシート名は31文字まで
+            sheet_name = sheet_name[:31]
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+            
+            # Format the Excel file
+            worksheet = writer.sheets[sheet_name]
+            for column in worksheet.columns:
+                max_length = max((len(str(cell.value)) for cell in column if cell.value is not None), default=0)
+                worksheet.column_dimensions[column[0].column_letter].width = min(max_length + 2, 50)
+    return output.getvalue()
+
+# 確定済みの日（今日より前）の含み損益系列キャッシュ
+# key: (method, asset_id) -> (fingerprint, daily DataFrame up to yesterday, last position, stored prices)
+_unrealized_cache: Dict[tuple, Tuple[tuple, pd.DataFrame, Dict, pd.DataFrame]] = {}
+
+PNL_COLUMNS = [
+    "date", "btc_quantity", "cost_basis_jpy", "btc_price_jpy",
+    "market_value_jpy", "unrealized_pnl_jpy",
+]
+
+def _to_local_day(values: pd.Series) -> pd.Series:
+    """Convert timestamps to naive local calendar days"""
+    ts = pd.to_datetime(values, utc=True).dt.tz_convert(settings.TIMEZONE)
+    return ts.dt.tz_localize(None).dt.normalize()
+
+def build_daily_pnl_frame(events: pd.DataFrame, prices: pd.DataFrame, start: date, end: date) -> pd.DataFrame:
+    """As-of join of position events and BTC prices onto a daily calendar.
+
+    events: columns day, btc_quantity, cost_basis_jpy (last event per day)
+    prices: columns day, btc_price_jpy
+    """
+    days = pd.DataFrame({"day": pd.date_range(start, end, freq="D")})
+    if days.empty:
+        return pd.DataFrame(columns=PNL_COLUMNS)
+
+    frame = pd.merge_asof(days, events, on="day", direction="backward")
+    frame = pd.merge_asof(frame, prices, on="day", direction="backward")
+    frame[["btc_quantity", "cost_basis_jpy"]] = frame[["btc_quantity", "cost_basis_jpy"]].fillna(0.0)
+
+    frame["market_value_jpy"] = frame["btc_quantity"] * frame["btc_price_jpy"]
+    frame["unrealized_pnl_jpy"] = frame["market_value_jpy"] - frame["cost_basis_jpy"]
+    frame["date"] = frame["day"].dt.date
+    return frame[PNL_COLUMNS]
+
 class BTCGainCalculator:
     """Calculate realized gains for BTC trades"""
     
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, asset_id=None):
         self.db = db
+        # None の場合はBTC（asset_id未設定の既存取引を含む）
+        self.asset_id = asset_id
+        self._btc_asset_id = None
+        self._btc_asset_loaded = False
+    
+    async def _get_price_asset_id(self):
+        """Asset whose stored prices value this calculator's coin"""
+        if self.asset_id is not None:
+            return self.asset_id
+        return await self._get_btc_asset_id()
+    
+    async def trade_filter(self):
+        """WHERE clause selecting this calculator's coin from the shared trade ledger"""
+        btc_asset_id = await self._get_btc_asset_id()
+        if self.asset_id is not None and self.asset_id != btc_asset_id:
+            return BTCTrade.asset_id == self.asset_id
+        if btc_asset_id is None:
+            return BTCTrade.asset_id.is_(None)
+        return or_(BTCTrade.asset_id.is_(None), BTCTrade.asset_id == btc_asset_id)
+    
+    async def get_open_lots(
+        self,
+        method: CostBasisMethod = CostBasisMethod.FIFO,
+        as_of: Optional[datetime] = None
+    ) -> List[OpenLot]:
+        """Get open (unsold) lots after replaying all trades up to as_of"""
+        query = select(BTCTrade).where(await self.trade_filter()).order_by(BTCTrade.timestamp)
+        if as_of is not None:
+            query = query.where(BTCTrade.timestamp <= as_of)
+        result = await self.db.execute(query)
+        open_lots, _ = replay_lots(result.scalars().all(), method)
+        return open_lots
+    
+    async def _get_btc_asset_id(self):
+        if not self._btc_asset_loaded:
+            result = await self.db.execute(
+                select(Asset.id)
+                .where(
+                    Asset.asset_class == AssetClass.Crypto,
+                    func.upper(Asset.symbol).in_(BTC_SYMBOLS)
+                )
+                .limit(1)
+            )
+            self._btc_asset_id = result.scalar_one_or_none()
+            self._btc_asset_loaded = True
+        return self._btc_asset_id
+    
+    async def get_latest_price(self) -> Optional[float]:
+        """Latest stored JPY price of this calculator's coin"""
+        price_asset_id = await self._get_price_asset_id()
+        if price_asset_id is None:
+            return None
+        result = await self.db.execute(
+            select(LatestPrice.price).where(LatestPrice.asset_id == price_asset_id)
+        )
+        return result.scalar_one_or_none()
+    
+    async def _unrealized_fingerprint(self, price_asset_id) -> tuple:
+        """Cheap aggregate that changes whenever trades or prices change"""
+        result = await self.db.execute(
+            select(func.count(BTCTrade.id), func.max(BTCTrade.updated_at), func.max(BTCTrade.timestamp))
+            .where(await self.trade_filter())
+        )
+        trade_fp = tuple(result.one())
+        price_fp = ()
+        if price_asset_id is not None:
+            result = await self.db.execute(
+                # 価格のupsertは既存行の price と updated_at を書き換えるので updated_at で検知する
+                select(func.count(Price.id), func.max(Price.date), func.max(Price.updated_at))
+                .where(Price.asset_id == price_asset_id)
+            )
+            price_fp = tuple(result.one())
+        return (price_asset_id, trade_fp, price_fp)
+    
+    async def calculate_unrealized_series(
+        self,
+        start_date: date,
+        end_date: date,
+        method: CostBasisMethod = CostBasisMethod.FIFO
+    ) -> pd.DataFrame:
+        """Daily BTC quantity, remaining cost basis and unrealized P&L for
+        every day of [start_date, end_date] (zero position before the first trade).
+
+        Trades are replayed once into position events, then events and stored
+        BTC prices are aligned to the calendar with an as-of join. Days before
+        today are cached until a trade or BTC price changes; today and later
+        are valued at the current latest_prices quote on every call.
+        """
+        price_asset_id = await self._get_price_asset_id()
+        fingerprint = await self._unrealized_fingerprint(price_asset_id)
+        today = pd.Timestamp.now(tz=settings.TIMEZONE).tz_localize(None).normalize().date()
+        yesterday = today - timedelta(days=1)
+
+        cache_key = (method.value, self.asset_id)
+        cached = _unrealized_cache.get(cache_key)
+        if not cached or cached[0] != fingerprint or cached[1].empty or cached[1]["date"].iloc[-1] != yesterday:
+            cached = await self._build_unrealized_cache(method, price_asset_id, fingerprint, yesterday)
+            _unrealized_cache[cache_key] = cached
+        _, closed, last_position, prices_df = cached
+
+        frame = closed[(closed["date"] >= start_date) & (closed["date"] <= end_date)]
+        first_closed = closed["date"].iloc[0] if not closed.empty else today
+        if start_date < first_closed:
+            # 最初の取引より前の日は保有ゼロの行で埋め、要求した範囲をすべて返す
+            no_events = pd.DataFrame({
+                "day": pd.Series(dtype="datetime64[ns]"),
+                "btc_quantity": pd.Series(dtype=float),
+                "cost_basis_jpy": pd.Series(dtype=float),
+            })
+            before = build_daily_pnl_frame(
+                no_events, prices_df, start_date, min(end_date, first_closed - timedelta(days=1))
+            )
+            frame = pd.concat([before, frame], ignore_index=True)
+        if end_date >= today:
+            # 今日以降は直近のポジションと現在の価格を前方補完（価格はキャッシュしない）
+            last_price = await self.get_latest_price()
+            live = pd.DataFrame({"day": pd.date_range(max(start_date, today), end_date, freq="D")})
+            live["btc_quantity"] = last_position["btc_quantity"]
+            live["cost_basis_jpy"] = last_position["cost_basis_jpy"]
+            live["btc_price_jpy"] = last_price if last_price is not None else float("nan")
+            live["market_value_jpy"] = live["btc_quantity"] * live["btc_price_jpy"]
+            live["unrealized_pnl_jpy"] = live["market_value_jpy"] - live["cost_basis_jpy"]
+            live["date"] = live["day"].dt.date
+            frame = pd.concat([frame, live[PNL_COLUMNS]], ignore_index=True)
+        return frame.reset_index(drop=True)
+    
+    async def _build_unrealized_cache(self, method: CostBasisMethod, price_asset_id, fingerprint: tuple, yesterday: date):
+        result = await self.db.execute(
+            select(BTCTrade).where(await self.trade_filter()).order_by(BTCTrade.timestamp)
+        )
+        trades = result.scalars().all()
+        _, events = replay_lots(trades, method)
+
+        events_df = pd.DataFrame(events, columns=["timestamp", "btc_quantity", "cost_basis_jpy"])
+        events_df["day"] = _to_local_day(events_df["timestamp"])
+        events_df = events_df.drop(columns="timestamp").groupby("day", as_index=False).last()
+
+        prices_df = pd.DataFrame(columns=["day", "btc_price_jpy"])
+        if price_asset_id is not None:
+            result = await self.db.execute(
+                select(Price.date, Price.price)
+                .where(Price.asset_id == price_asset_id)
+                .order_by(Price.date)
+            )
+            prices_df = pd.DataFrame(result.all(), columns=["day", "btc_price_jpy"])
+        prices_df["day"] = pd.to_datetime(prices_df["day"])
+        prices_df["btc_price_jpy"] = prices_df["btc_price_jpy"].astype(float)
+
+        first_day = events_df["day"].iloc[0].date() if not events_df.empty else yesterday
+        closed = build_daily_pnl_frame(events_df, prices_df, min(first_day, yesterday), yesterday)
+
+        last_position = (
+            events_df.iloc[-1][["btc_quantity", "cost_basis_jpy"]].to_dict()
+            if not events_df.empty else {"btc_quantity": 0.0, "cost_basis_jpy": 0.0}
+        )
+        return (fingerprint, closed, last_position, prices_df)
     
     async def calculate_realized_gain(
         self,
@@ -27,8 +357,10 @@ class BTCGainCalculator:
             raise ValueError("Not a sell trade")
         
         # Get all buy trades before this sell
+        trade_filter = await self.trade_filter()
         result = await self.db.execute(
             select(BTCTrade).where(
+                trade_filter,
                 BTCTrade.amount_btc > 0,
                 BTCTrade.timestamp < sell_trade.timestamp
             ).order_by(BTCTrade.timestamp)
@@ -95,8 +427,10 @@ class BTCGainCalculator:
         """Get amount of a buy trade that has been used in sells before a date"""
         # This would require a separate tracking table in production
         # For MVP, we'll calculate dynamically
+        trade_filter = await self.trade_filter()
         result = await self.db.execute(
             select(BTCTrade).where(
+                trade_filter,
                 BTCTrade.amount_btc < 0,
                 BTCTrade.timestamp < before_date
             ).order_by(BTCTrade.timestamp)
@@ -106,6 +440,7 @@ class BTCGainCalculator:
         # Simple FIFO matching to determine used amount
         result = await self.db.execute(
             select(BTCTrade).where(
+                trade_filter,
                 BTCTrade.amount_btc > 0,
                 BTCTrade.timestamp < before_date
             ).order_by(BTCTrade.timestamp)
@@ -127,57 +462,76 @@ class BTCGainCalculator:
         
         return used_amounts.get(buy_trade_id, 0.0)
     
-    async def generate_gain_report(
+    async def generate_multi_coin_report(
         self,
         year: int,
         method: CostBasisMethod = CostBasisMethod.FIFO
-    ) -> pd.DataFrame:
-        """Generate annual realized gain report"""
-        
-        # Get all sells for the year
-        start_date = datetime(year, 1, 1)
+    ) -> Dict[str, pd.DataFrame]:
+        """Generate annual realized gain report for every coin in the ledger.
+
+        Lot matching is independent per coin, so each coin is matched in a
+        separate worker process. Returns one DataFrame per sheet, with a
+        cross-coin summary sheet first.
+        """
         end_date = datetime(year, 12, 31, 23, 59, 59)
-        
         result = await self.db.execute(
-            select(BTCTrade).where(
-                BTCTrade.amount_btc < 0,
-                BTCTrade.timestamp >= start_date,
-                BTCTrade.timestamp <= end_date
-            ).order_by(BTCTrade.timestamp)
+            select(BTCTrade, Asset.symbol)
+            .outerjoin(Asset, BTCTrade.asset_id == Asset.id)
+            .where(BTCTrade.timestamp <= end_date)
+            .order_by(BTCTrade.timestamp)
         )
-        sell_trades = result.scalars().all()
-        
-        report_data = []
         
-        for sell in sell_trades:
-            try:
-                gain_calc = await self.calculate_realized_gain(sell, method)
-                
-                report_data.append({
-                    "Date": sell.timestamp.strftime("%Y-%m-%d"),
-                    "Amount (BTC)": abs(sell.amount_btc),
-                    "Gross Proceeds (JPY)": gain_calc["gross_proceeds"],
-                    "Cost Basis (JPY)": gain_calc["cost_basis"],
-                    "Realized Gain (JPY)": gain_calc["realized_gain"],
-                    "Exchange": sell.exchange or "Unknown",
-                    "Method": method.value
-                })
-            except Exception as e:
-                print(f"Error calculating gain for trade {sell.id}: {e}")
+        trades_by_coin: Dict[str, List[TradeRow]] = {}
+        for trade, symbol in result.all():
+            coin = (symbol or DEFAULT_COIN).upper()
+            if coin in BTC_SYMBOLS:
+                coin = DEFAULT_COIN
+            trades_by_coin.setdefault(coin, []).append(TradeRow(
+                trade.id, trade.timestamp, trade.amount_btc,
+                trade.counter_value_jpy, trade.fee_jpy or 0, trade.exchange
+            ))
         
-        df = pd.DataFrame(report_data)
+        results = await asyncio.gather(*[
+            run_in_process(compute_year_gains, coin, trades, method, year)
+            for coin, trades in trades_by_coin.items()
+        ])
         
-        # Add summary row
-        if not df.empty:
-            summary = pd.DataFrame([{
+        sheets: Dict[str, pd.DataFrame] = {}
+        summary_rows = []
+        for coin, rows in sorted(results):
+            if not rows:
+                continue
+            df = pd.DataFrame(rows)
+            summary_rows.append({
+                "Coin": coin,
+                "Sells": len(df),
+                "Gross Proceeds (JPY)": df["Gross Proceeds (JPY)"].sum(),
+                "Cost Basis (JPY)": df["Cost Basis (JPY)"].sum(),
+                "Realized Gain (JPY)": df["Realized Gain (JPY)"].sum(),
+                "Method": method.value
+            })
+            total = {column: "" for column in df.columns}
+            total.update({
                 "Date": "TOTAL",
-                "Amount (BTC)": df["Amount (BTC)"].sum(),
+                f"Amount ({coin})": df[f"Amount ({coin})"].sum(),
                 "Gross Proceeds (JPY)": df["Gross Proceeds (JPY)"].sum(),
                 "Cost Basis (JPY)": df["Cost Basis (JPY)"].sum(),
                 "Realized Gain (JPY)": df["Realized Gain (JPY)"].sum(),
-                "Exchange": "",
                 "Method": method.value
-            }])
-            df = pd.concat([df, summary], ignore_index=True)
+            })
+            sheets[f"{coin}_Gains_{year}"] = pd.concat([df, pd.DataFrame([total])], ignore_index=True)
+        
+        summary = pd.DataFrame(summary_rows, columns=[
+            "Coin", "Sells", "Gross Proceeds (JPY)", "Cost Basis (JPY)", "Realized Gain (JPY)", "Method"
+        ])
+        if not summary.empty:
+            summary = pd.concat([summary, pd.DataFrame([{
+                "Coin": "TOTAL",
+                "Sells": summary["Sells"].sum(),
+                "Gross Proceeds (JPY)": summary["Gross Proceeds (JPY)"].sum(),
+                "Cost Basis (JPY)": summary["Cost Basis (JPY)"].sum(),
+                "Realized Gain (JPY)": summary["Realized Gain (JPY)"].sum(),
+                "Method": method.value
+            }])], ignore_index=True)
         
-        return df
\ No newline at end of file
+        return {f"Summary_{year}": summary, **sheets}
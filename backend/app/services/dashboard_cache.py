@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import defer_after_commit
+from app.models import ValuationSnapshot
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# スナップショットが書き込まれるたびにINCRされるバージョン
+SNAPSHOT_VERSION_KEY = "dashboard:snapshot-version"
+CACHE_KEY_PREFIX = "dashboard:response"
+
+async def get_snapshot_version() -> Optional[str]:
+    """Current snapshot version, or None when Redis is unavailable"""
+    try:
+        return await get_redis().get(SNAPSHOT_VERSION_KEY) or "0"
+    except Exception as e:
+        logger.warning(f"Dashboard cache disabled, Redis unavailable: {e}")
+        return None
+
+async def bump_snapshot_version():
+    """Invalidate every cached dashboard response"""
+    try:
+        await get_redis().incr(SNAPSHOT_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Failed to bump dashboard snapshot version: {e}")
+
+class Uncached:
+    """Wraps a payload that cached_response serves but never stores
+    (e.g. the zero default shown while no snapshot exists yet)"""
+
+    def __init__(self, payload: Any):
+        self.payload = payload
+
+def _json_response(payload: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    if isinstance(payload, Uncached):
+        return Response(
+            content=json.dumps(jsonable_encoder(payload.payload)),
+            media_type="application/json",
+            headers={"Cache-Control": "no-store"}
+        )
+    return Response(content=json.dumps(jsonable_encoder(payload)), media_type="application/json", headers=headers)
+
+async def cached_response(
+    request: Request,
+    route: str,
+    params: Dict[str, Any],
+    build: Callable[[], Awaitable[Any]]
+) -> Response:
+    """Serve a dashboard payload from Redis, keyed by route, params and snapshot version.
+
+    The ETag is derived from the same key, so a matching If-None-Match gets a
+    304 without building the payload or touching Postgres. A payload build
+    returns wrapped in Uncached is served as is, without an ETag.
+    """
+    version = await get_snapshot_version()
+    if version is None:
+        return _json_response(await build())
+
+    param_str = "&".join(f"{k}={params[k]}" for k in sorted(params))
+    key = f"{CACHE_KEY_PREFIX}:{route}:{param_str}:v{version}"
+    etag = f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    redis = get_redis()
+    try:
+        body = await redis.get(key)
+    except Exception as e:
+        logger.warning(f"Dashboard cache read failed: {e}")
+        body = None
+
+    if body is None:
+        payload = await build()
+        if isinstance(payload, Uncached):
+            return _json_response(payload)
+        body = json.dumps(jsonable_encoder(payload))
+        try:
+            await redis.set(key, body, ex=settings.DASHBOARD_CACHE_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Dashboard cache write failed: {e}")
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# ORMでValuationSnapshotを書き込んだセッションがコミットされたらキャッシュを無効化
+@event.listens_for(Session, "after_flush")
+def _track_snapshot_writes(session, flush_context):
+    changed = session.new | session.dirty | session.deleted
+    if any(isinstance(obj, ValuationSnapshot) for obj in changed):
+        session.info["valuation_snapshot_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("valuation_snapshot_changed", False):
+        defer_after_commit(session, bump_snapshot_version)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("valuation_snapshot_changed", None)
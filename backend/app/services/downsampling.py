@@ -0,0 +1,117 @@
+from typing import Dict, List
+import numpy as np
+
+def bucket_starts(n: int, points: int) -> np.ndarray:
+    """Start index of each of `points` (or fewer) contiguous buckets over n rows"""
+    return np.unique(np.linspace(0, n, num=min(points, n), endpoint=False).astype(int))
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of the points that best keep the
+    visual shape of y(x). The first and last points are always kept."""
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    # 最初と最後を除いた点を points - 2 個のバケットに分ける
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    selected = np.empty(points, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        # 次のバケットの平均点（最後のバケットは終点）
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+
+    return selected
+
+def _forward_fill_index(valid: np.ndarray) -> np.ndarray:
+    index = np.where(valid, np.arange(len(valid)), 0)
+    return np.maximum.accumulate(index)
+
+def ohlc_buckets(
+    close: np.ndarray,
+    points: int,
+    open_: np.ndarray = None,
+    high: np.ndarray = None,
+    low: np.ndarray = None,
+    volume: np.ndarray = None
+) -> Dict[str, np.ndarray]:
+    """Aggregate a series into at most `points` OHLC bars.
+
+    Missing values (NaN) are ignored; a bucket without any value yields NaN.
+    Without open/high/low columns they are derived from the closes.
+    """
+    n = len(close)
+    starts = bucket_starts(n, points)
+    ends = np.append(starts[1:], n) - 1
+
+    open_ = close if open_ is None else np.where(np.isnan(open_), close, open_)
+    high = close if high is None else np.fmax(high, close)
+    low = close if low is None else np.fmin(low, close)
+
+    valid = ~np.isnan(close)
+    has_data = np.add.reduceat(valid, starts) > 0
+
+    # バケット内の最初/最後の有効値
+    last = close[_forward_fill_index(valid)][ends]
+    first_index = (n - 1) - _forward_fill_index(valid[::-1])[::-1]
+    first = open_[first_index][starts]
+
+    bars = {
+        "start": starts,
+        "end": ends,
+        "open": np.where(has_data, first, np.nan),
+        "high": np.where(has_data, np.fmax.reduceat(high, starts), np.nan),
+        "low": np.where(has_data, np.fmin.reduceat(low, starts), np.nan),
+        "close": np.where(has_data, last, np.nan),
+    }
+    if volume is not None:
+        has_volume = np.add.reduceat(~np.isnan(volume), starts) > 0
+        bars["volume"] = np.where(has_volume, np.add.reduceat(np.nan_to_num(volume), starts), np.nan)
+    return bars
+
+def downsample_price_rows(rows: List[Dict], points: int, method: str = "lttb") -> List[Dict]:
+    """Reduce date-ordered price rows (PriceResponse fields) to at most `points` rows.
+
+    lttb keeps a subset of the original rows. ohlc returns one row per bucket,
+    dated at the bucket start, with the bucket's open/high/low, its last price
+    as the close, summed volume, and the id and source of its last row.
+    """
+    if len(rows) <= points:
+        return rows
+
+    close = np.array([row["price"] for row in rows], dtype=float)
+    if method == "lttb":
+        x = np.array([row["date"].toordinal() for row in rows], dtype=float)
+        return [rows[i] for i in lttb_indices(x, close, points)]
+
+    def column(key):
+        return np.array([row[key] for row in rows], dtype=float)  # None -> NaN
+
+    bars = ohlc_buckets(close, points, column("open"), column("high"), column("low"), column("volume"))
+    result = []
+    for i, (start, end) in enumerate(zip(bars["start"], bars["end"])):
+        last = rows[end]
+        result.append({
+            "id": last["id"],
+            "asset_id": last["asset_id"],
+            "date": rows[start]["date"],
+            "price": float(bars["close"][i]),
+            "open": float(bars["open"][i]),
+            "high": float(bars["high"][i]),
+            "low": float(bars["low"][i]),
+            "volume": None if np.isnan(bars["volume"][i]) else float(bars["volume"][i]),
+            "source": last["source"],
+        })
+    return result
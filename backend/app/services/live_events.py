@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+from functools import partial
+from typing import Any, Dict, Optional, Set
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.database import defer_after_commit
+from app.models import ValuationSnapshot
+from app.redis_client import get_redis, get_sync_redis
+
+logger = logging.getLogger(__name__)
+
+# 全APIワーカーが購読するチャンネル
+LIVE_CHANNEL = "live:events"
+
+# 遅いクライアント用のキュー上限（溢れたら古いイベントを捨てる）
+SUBSCRIBER_QUEUE_SIZE = 100
+
+def _encode(event_type: str, data: Any) -> str:
+    return json.dumps({"type": event_type, "data": jsonable_encoder(data)})
+
+async def publish_event(event_type: str, data: Any):
+    """Publish a live event to every API worker"""
+    try:
+        await get_redis().publish(LIVE_CHANNEL, _encode(event_type, data))
+    except Exception as e:
+        logger.warning(f"Failed to publish {event_type} event: {e}")
+
+def publish_event_sync(event_type: str, data: Any):
+    """Blocking variant for code running off the event loop (threads, sync Celery code)"""
+    try:
+        get_sync_redis().publish(LIVE_CHANNEL, _encode(event_type, data))
+    except Exception as e:
+        logger.warning(f"Failed to publish {event_type} event: {e}")
+
+class LiveEventHub:
+    """Fan out the Redis channel to the SSE clients connected to this worker.
+
+    A single pub/sub subscription is held while at least one client is
+    connected, regardless of how many dashboards are open.
+    """
+
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._reader: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read_channel())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+
+    def _dispatch(self, message: str):
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def _read_channel(self):
+        backoff = 1
+        while self._subscribers:
+            pubsub = get_redis().pubsub()
+            try:
+                await pubsub.subscribe(LIVE_CHANNEL)
+                backoff = 1
+                while self._subscribers:
+                    # socket_timeout より短いタイムアウトでポーリング
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Live event subscription lost, retrying in {backoff}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+hub = LiveEventHub()
+
+def snapshot_event(snapshot: ValuationSnapshot) -> Dict:
+    return {
+        "date": snapshot.date,
+        "total_jpy": snapshot.total_jpy,
+        "total_usd": snapshot.total_usd,
+        "total_btc": snapshot.total_btc,
+    }
+
+# ValuationSnapshotのコミット時に合計値を配信（書き込み元を問わず）
+@event.listens_for(Session, "after_flush")
+def _collect_snapshots(session, flush_context):
+    snapshots = [obj for obj in session.new | session.dirty if isinstance(obj, ValuationSnapshot)]
+    if snapshots:
+        session.info.setdefault("live_snapshots", []).extend(snapshot_event(s) for s in snapshots)
+
+@event.listens_for(Session, "after_commit")
+def _publish_snapshots(session):
+    for payload in session.info.pop("live_snapshots", []):
+        defer_after_commit(session, partial(publish_event, "valuation", payload))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_snapshots(session):
+    session.info.pop("live_snapshots", None)
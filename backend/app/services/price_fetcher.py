@@ -4,9 +4,21 @@ from datetime import datetime, date
 from typing import Dict, Optional, List
 import logging
 from app.config import settings
+from app.services.price_providers import PriceProvider, providers_for
 
 logger = logging.getLogger(__name__)
 
+# シンボルからCoinGecko IDへの対応（ないものは小文字のシンボルをそのままIDとして使う）
+CRYPTO_IDS = {
+    "btc": "bitcoin",
+    "bitcoin": "bitcoin",
+    "eth": "ethereum",
+    "ethereum": "ethereum",
+    "ada": "cardano",
+    "dot": "polkadot",
+    "sol": "solana"
+}
+
 class PriceFetcher:
     """Fetches prices from multiple sources with fallback"""
     
@@ -15,45 +27,39 @@ class PriceFetcher:
         self.alpha_vantage_key = settings.ALPHA_VANTAGE_API_KEY
         self.timeout = httpx.Timeout(30.0)
     
-    async def fetch_price(self, symbol: str, asset_class: str = "Equity", currency: str = "JPY") -> Optional[Dict]:
-        """Fetch price with fallback through multiple sources"""
-        
-        # 日本株の場合はStooqを優先
-        if currency == "JPY" and asset_class == "Equity":
-            price_data = await self._fetch_stooq_jp(symbol)
-            if price_data:
-                price_data['source'] = 'stooq_jp'
-                return price_data
-        
-        # 暗号資産の場合
-        if asset_class == "Crypto":
-            price_data = await self._fetch_crypto_price(symbol.lower())
-            if price_data:
-                price_data['source'] = 'coingecko'
-                return price_data
-        
-        # Try sources in order of preference for other assets
-        if self.twelve_data_key:
-            price_data = await self._fetch_twelve_data(symbol)
-            if price_data:
-                price_data['source'] = 'twelve_data'
-                return price_data
-        
-        # Try Stooq (no API key required)
-        price_data = await self._fetch_stooq(symbol)
-        if price_data:
-            price_data['source'] = 'stooq'
-            return price_data
-        
-        if self.alpha_vantage_key:
-            price_data = await self._fetch_alpha_vantage(symbol)
+    async def fetch_price(
+        self,
+        symbol: str,
+        asset_class: str = "Equity",
+        currency: str = "JPY",
+        region: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Fetch price with fallback through the registered providers (price_providers)"""
+        for provider in providers_for(asset_class, currency, region):
+            price_data = await self.fetch_from(provider, symbol)
             if price_data:
-                price_data['source'] = 'alpha_vantage'
                 return price_data
         
         logger.warning(f"Failed to fetch price for {symbol} from all sources")
         return None
     
+    async def fetch_from(self, provider: PriceProvider, symbol: str) -> Optional[Dict]:
+        """One upstream request to one provider"""
+        price_data = await getattr(self, provider.method)(symbol)
+        if price_data:
+            price_data['source'] = provider.name
+        return price_data
+    
+    async def fetch_batch(self, provider: PriceProvider, symbols: List[str]) -> Dict[str, Optional[Dict]]:
+        """Quotes for up to provider.batch_size symbols, in one request when the provider batches"""
+        if provider.batch_method is None or len(symbols) == 1:
+            return {symbol: await self.fetch_from(provider, symbol) for symbol in symbols}
+        results = await getattr(self, provider.batch_method)(symbols)
+        for price_data in results.values():
+            if price_data:
+                price_data['source'] = provider.name
+        return results
+    
     async def _fetch_stooq_jp(self, symbol: str) -> Optional[Dict]:
         """日本株専用のStooq取得"""
         try:
@@ -185,25 +191,20 @@ class PriceFetcher:
     
     async def _fetch_crypto_price(self, symbol: str = "bitcoin") -> Optional[Dict]:
         """Fetch cryptocurrency price from CoinGecko"""
+        return (await self._fetch_crypto_prices([symbol]))[symbol]
+    
+    async def _fetch_crypto_prices(self, symbols: List[str]) -> Dict[str, Optional[Dict]]:
+        """Fetch several cryptocurrency prices from CoinGecko in one request"""
+        results: Dict[str, Optional[Dict]] = {symbol: None for symbol in symbols}
         try:
             # シンボルからCoinGecko IDにマッピング
-            crypto_mapping = {
-                "btc": "bitcoin",
-                "bitcoin": "bitcoin",
-                "eth": "ethereum", 
-                "ethereum": "ethereum",
-                "ada": "cardano",
-                "dot": "polkadot",
-                "sol": "solana"
-            }
-            
-            crypto_id = crypto_mapping.get(symbol.lower(), symbol.lower())
+            crypto_ids = {symbol: CRYPTO_IDS.get(symbol.lower(), symbol.lower()) for symbol in symbols}
             
             async with httpx.AsyncClient(timeout=self.timeout) as client:
                 response = await client.get(
                     f"https://api.coingecko.com/api/v3/simple/price",
                     params={
-                        "ids": crypto_id,
+                        "ids": ",".join(sorted(set(crypto_ids.values()))),
                         "vs_currencies": "jpy,usd",
                         "include_24hr_vol": "true",
                         "include_24hr_change": "true"
@@ -212,18 +213,19 @@ class PriceFetcher:
                 
                 if response.status_code == 200:
                     data = response.json()
-                    if crypto_id in data:
-                        crypto_data = data[crypto_id]
-                        return {
-                            "price": crypto_data.get("jpy", 0),
-                            "price_usd": crypto_data.get("usd", 0),
-                            "volume": crypto_data.get("jpy_24h_vol", 0),
-                            "change_24h": crypto_data.get("jpy_24h_change", 0),
-                            "date": date.today()
-                        }
+                    for symbol, crypto_id in crypto_ids.items():
+                        if crypto_id in data:
+                            crypto_data = data[crypto_id]
+                            results[symbol] = {
+                                "price": crypto_data.get("jpy", 0),
+                                "price_usd": crypto_data.get("usd", 0),
+                                "volume": crypto_data.get("jpy_24h_vol", 0),
+                                "change_24h": crypto_data.get("jpy_24h_change", 0),
+                                "date": date.today()
+                            }
         except Exception as e:
-            logger.error(f"CoinGecko error for {symbol}: {e}")
-        return None
+            logger.error(f"CoinGecko error for {', '.join(symbols)}: {e}")
+        return results
     
     async def fetch_fx_rate(self, from_currency: str, to_currency: str) -> Optional[float]:
         """Fetch foreign exchange rate"""
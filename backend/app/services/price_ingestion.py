@@ -0,0 +1,128 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import uuid
+from datetime import date
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import Price
+
+logger = logging.getLogger(__name__)
+
+# pricesに書き込む列（プロバイダーの取得結果から取り出す）
+PRICE_FIELDS = ("price", "open", "high", "low", "volume", "source")
+
+@dataclass(slots=True)
+class BatchResult:
+    rows: int
+    inserted: int = 0
+    updated: int = 0
+    error: Optional[str] = None
+
+@dataclass
+class IngestionReport:
+    """Per-batch outcome of one ingestion run"""
+    batches: List[BatchResult] = field(default_factory=list)
+    written: List[Dict] = field(default_factory=list)  # 書き込めた行（失敗したバッチの行は含まない）
+
+    @property
+    def inserted(self) -> int:
+        return sum(batch.inserted for batch in self.batches)
+
+    @property
+    def updated(self) -> int:
+        return sum(batch.updated for batch in self.batches)
+
+    @property
+    def failed(self) -> int:
+        return sum(batch.rows for batch in self.batches if batch.error)
+
+    def as_dict(self) -> Dict:
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "batches": [
+                {"rows": batch.rows, "inserted": batch.inserted, "updated": batch.updated, "error": batch.error}
+                for batch in self.batches
+            ],
+        }
+
+def upsert_statement(rows: List[Dict]):
+    """INSERT ... ON CONFLICT (asset_id, date) DO UPDATE, returning whether each row was new"""
+    stmt = insert(Price).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        constraint='_asset_date_uc',
+        set_={
+            **{name: stmt.excluded[name] for name in PRICE_FIELDS},
+            "updated_at": func.now(),
+        }
+    )
+    # xmax = 0 なら新規挿入、それ以外は既存行の更新
+    return stmt.returning(literal_column("xmax = 0").label("inserted"))
+
+class PriceIngestor:
+    """Collect quotes and write them with chunked upserts.
+
+    Shared by every price-writing path (nightly fetch, /api/prices/current
+    refresh, manual fetch, valuation fallback). Quotes for the same
+    (asset_id, date) collapse to the last one added, since one ON CONFLICT
+    statement cannot update a row twice.
+    """
+
+    def __init__(self, db: AsyncSession, batch_size: Optional[int] = None):
+        self.db = db
+        self.batch_size = batch_size or settings.PRICE_UPSERT_BATCH_SIZE
+        self._rows: Dict[Tuple[uuid.UUID, date], Dict] = {}
+
+    def add(self, asset_id: uuid.UUID, price_data: Dict) -> Dict:
+        """Queue a fetcher result (dict with date, price and optional OHLCV/source)"""
+        row = {"asset_id": asset_id, "date": price_data['date'], "price": price_data['price']}
+        for name in PRICE_FIELDS[1:]:
+            row[name] = price_data.get(name)
+        self._rows[(asset_id, row["date"])] = row
+        return row
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def rows(self) -> List[Dict]:
+        return list(self._rows.values())
+
+    async def flush(self, commit: bool = True) -> IngestionReport:
+        """Upsert the queued rows batch by batch.
+
+        Each batch runs in its own savepoint, so a failing batch is reported
+        and skipped without losing the others. With commit, every batch is
+        committed as soon as it is written.
+        """
+        rows = self.rows
+        self._rows.clear()
+        report = IngestionReport()
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start:start + self.batch_size]
+            batch = BatchResult(rows=len(chunk))
+            try:
+                async with self.db.begin_nested():
+                    result = await self.db.execute(upsert_statement(chunk))
+                    inserted = sum(1 for row in result if row.inserted)
+                if commit:
+                    await self.db.commit()
+                batch.inserted, batch.updated = inserted, len(chunk) - inserted
+                report.written.extend(chunk)
+            except Exception as e:
+                batch.error = str(e)
+                logger.error(f"Price upsert batch {start // self.batch_size} ({len(chunk)} rows) failed: {e}")
+                if commit:
+                    # コミットに失敗した行を次のバッチのコミットに持ち越さない
+                    await self.db.rollback()
+            report.batches.append(batch)
+            logger.info(
+                f"Price upsert batch {start // self.batch_size}: "
+                f"{batch.inserted} inserted, {batch.updated} updated of {batch.rows}"
+            )
+        return report
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.services.live_events import publish_event_sync
+from app.services.price_fetcher import PriceFetcher
+from app.services.price_ingestion import BatchResult, PriceIngestor
+from app.services.price_planner import FetchPlan, plan_nightly_fetch
+from app.services.price_providers import PROVIDERS, PriceProvider
+
+logger = logging.getLogger(__name__)
+
+# 各ステージに終了を伝える目印
+_DONE = object()
+
+@dataclass
+class StageStats:
+    name: str
+    processed: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    max_queue_depth: int = 0  # このステージの入力キューの最大長
+
+    def as_dict(self, elapsed: float) -> Dict:
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "per_second": round(self.processed / elapsed, 2) if elapsed > 0 else None,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+@dataclass
+class PipelineReport:
+    elapsed_seconds: float = 0.0
+    stages: Dict[str, StageStats] = field(default_factory=dict)
+    batches: List[BatchResult] = field(default_factory=list)
+    upstream_calls: Dict[str, int] = field(default_factory=dict)  # プロバイダーごと（フォールバックを含む）
+
+    @property
+    def written(self) -> int:
+        return sum(batch.rows for batch in self.batches if not batch.error)
+
+    def as_dict(self) -> Dict:
+        return {
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "stages": {name: stats.as_dict(self.elapsed_seconds) for name, stats in self.stages.items()},
+            "inserted": sum(batch.inserted for batch in self.batches),
+            "updated": sum(batch.updated for batch in self.batches),
+            "failed": sum(batch.rows for batch in self.batches if batch.error),
+            "upstream_calls": self.upstream_calls,
+        }
+
+class RateLimiter:
+    """Space request starts at least 1/rate seconds apart (one per provider, shared by all fetch workers)"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class PricePipeline:
+    """Nightly price ingestion as concurrent stages joined by bounded queues.
+
+    planner -> fetch workers -> parser -> batched writer. The planner turns
+    the assets into the fewest provider requests (price_planner); each fetch
+    worker runs one request under that provider's rate limit, falling back
+    to the next capable provider per symbol. A full queue blocks the stage
+    feeding it, so quotes in flight stay bounded however many assets there
+    are, and upserts run while later fetches are still in flight.
+    """
+
+    def __init__(
+        self,
+        fetch_workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        rate_per_second: Optional[float] = None,
+        batch_size: Optional[int] = None,
+    ):
+        self.fetch_workers = fetch_workers or settings.PRICE_PIPELINE_FETCH_WORKERS
+        self.queue_size = queue_size or settings.PRICE_PIPELINE_QUEUE_SIZE
+        # rate_per_second を指定すると全プロバイダーの宣言値を上書き
+        self.rate_limiters = {
+            name: RateLimiter(rate_per_second if rate_per_second is not None else provider.rate_per_second)
+            for name, provider in PROVIDERS.items()
+        }
+        self.batch_size = batch_size or settings.PRICE_UPSERT_BATCH_SIZE
+        self.flush_seconds = settings.PRICE_PIPELINE_FLUSH_SECONDS
+        self.price_fetcher = PriceFetcher()
+        self.report = PipelineReport(stages={
+            name: StageStats(name) for name in ("planner", "fetch", "parse", "write")
+        })
+
+    async def run(self) -> PipelineReport:
+        started = time.monotonic()
+        fetch_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        parse_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async def fetchers():
+            await asyncio.gather(*(self._fetch(fetch_queue, parse_queue) for _ in range(self.fetch_workers)))
+            await parse_queue.put(_DONE)
+
+        tasks = [
+            asyncio.create_task(self._plan(fetch_queue)),
+            asyncio.create_task(fetchers()),
+            asyncio.create_task(self._parse(parse_queue, write_queue)),
+            asyncio.create_task(self._write(write_queue)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # どこかのステージが例外で止まったら残りも止める（キュー待ちで詰まらないように）
+            for task in tasks:
+                task.cancel()
+            self.report.elapsed_seconds = time.monotonic() - started
+        return self.report
+
+    async def _put(self, queue: asyncio.Queue, item, stats: StageStats):
+        await queue.put(item)
+        stats.max_queue_depth = max(stats.max_queue_depth, queue.qsize())
+
+    async def plan(self) -> FetchPlan:
+        """Requests for every asset without today's price (also the dry-run output)"""
+        async with AsyncSessionLocal() as db:
+            return await plan_nightly_fetch(db)
+
+    async def _plan(self, fetch_queue: asyncio.Queue):
+        stats = self.report.stages["planner"]
+        try:
+            started = time.monotonic()
+            plan = await self.plan()
+            stats.busy_seconds += time.monotonic() - started
+            stats.processed = plan.asset_count
+            stats.failed = plan.skipped_assets + sum(len(planned.asset_ids) for planned in plan.unroutable)
+            for request in plan.requests:
+                await self._put(fetch_queue, request, self.report.stages["fetch"])
+        finally:
+            for _ in range(self.fetch_workers):
+                await fetch_queue.put(_DONE)
+
+    async def _call(self, provider: PriceProvider, symbols: List[str]) -> Dict[str, Optional[Dict]]:
+        await self.rate_limiters[provider.name].wait()
+        self.report.upstream_calls[provider.name] = self.report.upstream_calls.get(provider.name, 0) + 1
+        started = time.monotonic()
+        try:
+            return await self.price_fetcher.fetch_batch(provider, symbols)
+        except Exception as e:
+            logger.error(f"Error fetching {', '.join(symbols)} from {provider.name}: {e}")
+            return {}
+        finally:
+            self.report.stages["fetch"].busy_seconds += time.monotonic() - started
+
+    async def _fetch(self, fetch_queue: asyncio.Queue, parse_queue: asyncio.Queue):
+        stats = self.report.stages["fetch"]
+        while (request := await fetch_queue.get()) is not _DONE:
+            results = await self._call(PROVIDERS[request.provider], [planned.symbol for planned in request.symbols])
+            for planned in request.symbols:
+                price_data = results.get(planned.symbol)
+                for name in planned.fallbacks:
+                    if price_data:
+                        break
+                    price_data = (await self._call(PROVIDERS[name], [planned.symbol])).get(planned.symbol)
+                if not price_data:
+                    logger.warning(f"Failed to fetch price for {planned.symbol} from all sources")
+                    stats.failed += 1
+                    continue
+                stats.processed += 1
+                await self._put(parse_queue, (planned, price_data), self.report.stages["parse"])
+
+    async def _parse(self, parse_queue: asyncio.Queue, write_queue: asyncio.Queue):
+        stats = self.report.stages["parse"]
+        while (item := await parse_queue.get()) is not _DONE:
+            planned, price_data = item
+            started = time.monotonic()
+            price = price_data.get('price')
+            valid = isinstance(price, (int, float)) and price > 0 and isinstance(price_data.get('date'), date)
+            stats.busy_seconds += time.monotonic() - started
+            if not valid:
+                logger.warning(f"Discarding invalid quote for {planned.symbol}: {price_data}")
+                stats.failed += 1
+                continue
+            stats.processed += 1
+            # 同じシンボルを共有する資産それぞれに行を書く
+            for asset_id in planned.asset_ids:
+                await self._put(write_queue, (asset_id, price_data), self.report.stages["write"])
+        await write_queue.put(_DONE)
+
+    async def _write(self, write_queue: asyncio.Queue):
+        stats = self.report.stages["write"]
+        async with AsyncSessionLocal() as db:
+            ingestor = PriceIngestor(db, batch_size=self.batch_size)
+            deadline = None
+            while True:
+                # バッチが埋まるか、最初の行から flush_seconds 経ったら書き込む
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    item = await asyncio.wait_for(write_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    item = None
+                if item is not None and item is not _DONE:
+                    ingestor.add(*item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_seconds
+                    if len(ingestor) < self.batch_size:
+                        continue
+                if len(ingestor):
+                    await self._flush(ingestor, stats)
+                deadline = None
+                if item is _DONE:
+                    return
+
+    async def _flush(self, ingestor: PriceIngestor, stats: StageStats):
+        started = time.monotonic()
+        result = await ingestor.flush()
+        stats.busy_seconds += time.monotonic() - started
+        self.report.batches.extend(result.batches)
+        stats.processed += len(result.written)
+        stats.failed += result.failed
+        if result.written:
+            await asyncio.to_thread(publish_event_sync, "prices", [
+                {key: row[key] for key in ("asset_id", "date", "price", "source")}
+                for row in result.written
+            ])
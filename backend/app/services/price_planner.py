@@ -0,0 +1,116 @@
+import uuid
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Asset, LatestPrice
+from app.services.price_providers import PROVIDERS, providers_for
+from app.services.read_models import read
+
+@dataclass
+class PlannedSymbol:
+    """One symbol to price, shared by every asset that resolves to the same request"""
+    symbol: str
+    asset_class: str
+    currency: str
+    region: Optional[str]
+    asset_ids: List[uuid.UUID] = field(default_factory=list)
+    fallbacks: List[str] = field(default_factory=list)  # 主プロバイダーで取れなかった場合に順に試す
+
+    def as_dict(self) -> Dict:
+        return {
+            "symbol": self.symbol,
+            "asset_class": self.asset_class,
+            "currency": self.currency,
+            "region": self.region,
+            "asset_ids": [str(asset_id) for asset_id in self.asset_ids],
+            "fallbacks": self.fallbacks,
+        }
+
+@dataclass
+class PlannedRequest:
+    """One upstream call: a provider and the symbols it is asked for"""
+    provider: str
+    symbols: List[PlannedSymbol]
+
+@dataclass
+class FetchPlan:
+    requests: List[PlannedRequest] = field(default_factory=list)
+    unroutable: List[PlannedSymbol] = field(default_factory=list)  # 対応するプロバイダーがない
+    asset_count: int = 0
+    skipped_assets: int = 0  # シンボルがない
+
+    def as_dict(self) -> Dict:
+        by_provider: Dict[str, Dict[str, int]] = {}
+        for request in self.requests:
+            stats = by_provider.setdefault(request.provider, {"calls": 0, "symbols": 0})
+            stats["calls"] += 1
+            stats["symbols"] += len(request.symbols)
+        return {
+            "assets": self.asset_count,
+            "skipped_assets": self.skipped_assets,
+            "symbols": sum(len(request.symbols) for request in self.requests),
+            "upstream_calls": len(self.requests),
+            "by_provider": by_provider,
+            "requests": [
+                {"provider": request.provider, "symbols": [planned.as_dict() for planned in request.symbols]}
+                for request in self.requests
+            ],
+            "unroutable": [planned.as_dict() for planned in self.unroutable],
+        }
+
+def build_plan(assets: Iterable) -> FetchPlan:
+    """Group assets into as few provider requests as possible.
+
+    assets are rows with id, symbol, asset_class, currency and region. Assets
+    whose symbol resolves to the same provider chain (e.g. the same ticker
+    registered with different asset types) share one symbol; symbols of a
+    batching provider are packed batch_size per request.
+    """
+    plan = FetchPlan()
+    symbols: Dict[Tuple[str, Tuple[str, ...]], PlannedSymbol] = {}
+    for asset in assets:
+        plan.asset_count += 1
+        if not asset.symbol or not asset.symbol.strip():
+            plan.skipped_assets += 1
+            continue
+        asset_class = asset.asset_class.value if asset.asset_class else "Equity"
+        region = asset.region.value if asset.region else None
+        chain = tuple(provider.name for provider in providers_for(asset_class, asset.currency, region))
+        key = (asset.symbol.strip().upper(), chain)
+        planned = symbols.get(key)
+        if planned is None:
+            planned = symbols[key] = PlannedSymbol(
+                symbol=asset.symbol.strip(),
+                asset_class=asset_class,
+                currency=asset.currency,
+                region=region,
+                fallbacks=list(chain[1:]),
+            )
+            if not chain:
+                plan.unroutable.append(planned)
+        planned.asset_ids.append(asset.id)
+
+    by_provider: Dict[str, List[PlannedSymbol]] = {}
+    for (_, chain), planned in symbols.items():
+        if chain:
+            by_provider.setdefault(chain[0], []).append(planned)
+    for name, planned_symbols in by_provider.items():
+        batch_size = max(PROVIDERS[name].batch_size, 1)
+        for start in range(0, len(planned_symbols), batch_size):
+            plan.requests.append(PlannedRequest(provider=name, symbols=planned_symbols[start:start + batch_size]))
+    return plan
+
+async def plan_nightly_fetch(db: AsyncSession, as_of: Optional[date] = None) -> FetchPlan:
+    """Plan for every asset without a price for as_of (today by default)"""
+    as_of = as_of or date.today()
+    rows = await read(
+        db,
+        select(Asset.id, Asset.symbol, Asset.asset_class, Asset.currency, Asset.region)
+        .outerjoin(LatestPrice, LatestPrice.asset_id == Asset.id)
+        .where(or_(LatestPrice.date.is_(None), LatestPrice.date < as_of))
+        .order_by(Asset.symbol)
+    )
+    return build_plan(rows)
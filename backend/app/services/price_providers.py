@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional
+
+from app.config import settings
+
+# 価格プロバイダーの登録簿。PriceFetcher.fetch_price のフォールバック順と、
+# 夜間取得の計画（price_planner）はここに登録された能力だけで決まる
+
+@dataclass(frozen=True)
+class PriceProvider:
+    """What an upstream price source can do and how hard it may be called"""
+    name: str  # prices.source に入る値
+    method: str  # 1銘柄を取得する PriceFetcher のメソッド
+    asset_classes: Optional[FrozenSet[str]] = None  # None = 制限なし
+    currencies: Optional[FrozenSet[str]] = None
+    regions: Optional[FrozenSet[str]] = None
+    priority: int = 100  # 小さいほど先に使う
+    batch_size: int = 1  # 1リクエストで取得できる銘柄数
+    batch_method: Optional[str] = None  # batch_size > 1 の場合の PriceFetcher のメソッド
+    rate_per_second: float = 1.0
+    supports_history: bool = False  # 使っているエンドポイントが日足の履歴を返すか
+    api_key_setting: Optional[str] = None  # 必要なAPIキーの設定名（未設定なら使わない）
+
+    @property
+    def enabled(self) -> bool:
+        return not self.api_key_setting or bool(getattr(settings, self.api_key_setting, ""))
+
+    def supports(self, asset_class: str, currency: str, region: Optional[str] = None) -> bool:
+        return (
+            (self.asset_classes is None or asset_class in self.asset_classes)
+            and (self.currencies is None or currency in self.currencies)
+            and (self.regions is None or region in self.regions)
+        )
+
+PROVIDERS: Dict[str, PriceProvider] = {}
+
+def register_provider(provider: PriceProvider) -> PriceProvider:
+    PROVIDERS[provider.name] = provider
+    return provider
+
+def providers_for(asset_class: str, currency: str, region: Optional[str] = None) -> List[PriceProvider]:
+    """Enabled providers that can price this asset, in fallback order"""
+    return sorted(
+        (provider for provider in PROVIDERS.values() if provider.enabled and provider.supports(asset_class, currency, region)),
+        key=lambda provider: (provider.priority, -provider.batch_size)
+    )
+
+# 日本株はStooqの東証シンボルを優先
+register_provider(PriceProvider(
+    name="stooq_jp",
+    method="_fetch_stooq_jp",
+    asset_classes=frozenset({"Equity"}),
+    currencies=frozenset({"JPY"}),
+    priority=10,
+    rate_per_second=1.0,
+    supports_history=True,
+))
+
+# CoinGeckoの simple/price は ids をカンマ区切りで複数指定できる
+register_provider(PriceProvider(
+    name="coingecko",
+    method="_fetch_crypto_price",
+    asset_classes=frozenset({"Crypto"}),
+    priority=10,
+    batch_size=100,
+    batch_method="_fetch_crypto_prices",
+    rate_per_second=0.2,  # 無料枠は毎分10〜30回程度
+))
+
+register_provider(PriceProvider(
+    name="twelve_data",
+    method="_fetch_twelve_data",
+    priority=20,
+    rate_per_second=0.13,  # 無料枠は毎分8回
+    api_key_setting="TWELVE_DATA_API_KEY",
+))
+
+register_provider(PriceProvider(
+    name="stooq",
+    method="_fetch_stooq",
+    priority=30,
+    rate_per_second=1.0,
+    supports_history=True,
+))
+
+register_provider(PriceProvider(
+    name="alpha_vantage",
+    method="_fetch_alpha_vantage",
+    priority=40,
+    rate_per_second=0.08,  # 無料枠は毎分5回
+    api_key_setting="ALPHA_VANTAGE_API_KEY",
+))
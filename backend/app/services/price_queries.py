@@ -0,0 +1,84 @@
+from array import array
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+import uuid
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Asset, LatestPrice, Price
+
+def latest_price_subquery(as_of: Optional[date] = None):
+    """One row per asset with its most recent price.
+
+    Current quotes come from latest_prices (one row per asset); only a past
+    as_of scans prices (DISTINCT ON over _asset_date_uc, per yearly partition).
+    """
+    if as_of is None:
+        return select(
+            LatestPrice.asset_id, LatestPrice.date, LatestPrice.price, LatestPrice.source, LatestPrice.updated_at
+        ).subquery("latest_price")
+    query = (
+        select(Price.asset_id, Price.date, Price.price, Price.source, Price.updated_at)
+        .distinct(Price.asset_id)
+        .order_by(Price.asset_id, Price.date.desc())
+        .where(Price.date <= as_of)
+    )
+    return query.subquery("latest_price")
+
+async def fetch_latest_prices(db: AsyncSession, as_of: Optional[date] = None):
+    """Latest price joined with asset metadata for every asset that has a price, in one query"""
+    latest = latest_price_subquery(as_of)
+    result = await db.execute(
+        select(
+            Asset.id.label("asset_id"),
+            Asset.symbol,
+            Asset.name,
+            Asset.currency,
+            latest.c.price,
+            latest.c.date,
+            latest.c.source,
+        )
+        .join(latest, latest.c.asset_id == Asset.id)
+        .order_by(Asset.name)
+    )
+    return result.all()
+
+# サーバーサイドカーソルで一度に読む行数
+PRICE_MATRIX_BATCH = 10000
+
+async def fetch_price_matrix(
+    db: AsyncSession,
+    asset_ids: Sequence[uuid.UUID],
+    start_date: date,
+    end_date: date
+) -> Tuple[List[date], Dict[uuid.UUID, np.ndarray]]:
+    """Closing prices of several assets on one shared date axis.
+
+    A single date-ordered query is streamed through a server-side cursor into
+    one float array per asset (NaN where an asset has no price that day), so
+    no per-row objects are kept regardless of the range.
+    """
+    index = {asset_id: i for i, asset_id in enumerate(asset_ids)}
+    columns = [array("d") for _ in asset_ids]
+    dates: List[date] = []
+    nan = float("nan")
+
+    result = await db.stream(
+        select(Price.date, Price.asset_id, Price.price)
+        .where(
+            Price.asset_id.in_(list(asset_ids)),
+            Price.date >= start_date,
+            Price.date <= end_date
+        )
+        .order_by(Price.date)
+        .execution_options(yield_per=PRICE_MATRIX_BATCH)
+    )
+    async for row_date, asset_id, price in result:
+        if not dates or dates[-1] != row_date:
+            dates.append(row_date)
+            for column in columns:
+                column.append(nan)
+        columns[index[asset_id]][-1] = price
+
+    return dates, {asset_id: np.asarray(columns[i], dtype=float) for asset_id, i in index.items()}
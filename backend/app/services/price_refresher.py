@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models import Asset, Holding, ValuationSnapshot
+from app.models.asset import AssetClass
+from app.redis_client import get_redis
+from app.services.price_fetcher import PriceFetcher
+from app.services.price_ingestion import PriceIngestor
+from app.services.live_events import publish_event
+from app.services.price_queries import latest_price_subquery
+
+logger = logging.getLogger(__name__)
+
+REFRESH_LOCK_KEY = "prices:current:refresh-lock"
+
+# 自分のトークンのときだけ削除（期限切れ後に他のワーカーが取ったロックを消さない）
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 直近に取得したFXレート（プロセス内キャッシュ）
+_fx_cache: Dict = {"rates": {}, "fetched_at": None}
+
+# 実行中のバックグラウンドリフレッシュ（プロセス内の重複防止）
+_refresh_task: Optional[asyncio.Task] = None
+
+def price_ttl_seconds(asset_class: Optional[AssetClass]) -> int:
+    if asset_class == AssetClass.Crypto:
+        return settings.CRYPTO_PRICE_TTL_SECONDS
+    return settings.PRICE_TTL_SECONDS
+
+class PriceRefresher:
+    """Read stored quotes for held assets and refresh them from providers"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.price_fetcher = PriceFetcher()
+
+    async def get_held_assets(self, asset_ids: Optional[List] = None) -> List[Asset]:
+        query = select(Asset).where(Asset.id.in_(select(Holding.asset_id)))
+        if asset_ids is not None:
+            query = query.where(Asset.id.in_(asset_ids))
+        result = await self.db.execute(query)
+        return result.scalars().all()
+
+    async def get_stored_quotes(self, assets: List[Asset]) -> Dict:
+        """Latest stored price row per asset id, in one query"""
+        latest = latest_price_subquery()
+        result = await self.db.execute(
+            select(latest).where(latest.c.asset_id.in_([asset.id for asset in assets]))
+        )
+        return {row.asset_id: row for row in result.all()}
+
+    async def get_fx_rates(self) -> Dict[str, float]:
+        """FX rates from the last refresh, falling back to the latest snapshot"""
+        if _fx_cache["rates"]:
+            return _fx_cache["rates"]
+        result = await self.db.execute(
+            select(ValuationSnapshot.fx_rates)
+            .order_by(ValuationSnapshot.date.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none() or {}
+
+    async def refresh(self, assets: List[Asset]) -> Tuple[Dict[str, Optional[Dict]], Dict[str, float]]:
+        """Fetch current prices and FX rates from providers and upsert today's rows"""
+        symbols_to_fetch = [
+            (asset.symbol, asset.asset_class.value, asset.currency)
+            for asset in assets if asset.symbol
+        ]
+        price_results = await self.price_fetcher.fetch_multiple_prices(symbols_to_fetch)
+        fx_rates = await self._fetch_fx_rates({asset.currency for asset in assets})
+
+        ingestor = PriceIngestor(self.db)
+        for asset in assets:
+            price_data = price_results.get(asset.symbol) if asset.symbol else None
+            if price_data:
+                ingestor.add(asset.id, price_data)
+        rows = ingestor.rows
+
+        if rows:
+            # 既存チェックのSELECTを行わず (asset_id, date) でUPSERT
+            report = await ingestor.flush()
+            if report.written:
+                await publish_event("prices", [
+                    {key: row[key] for key in ("asset_id", "date", "price", "source")}
+                    for row in report.written
+                ])
+
+        if fx_rates:
+            await publish_event("fx", fx_rates)
+
+        logger.info(f"Refreshed {len(rows)}/{len(assets)} prices")
+        return price_results, fx_rates
+
+    async def _fetch_fx_rates(self, currencies) -> Dict[str, float]:
+        fx_rates = {}
+        for currency in currencies:
+            if currency != "JPY":
+                rate = await self.price_fetcher.fetch_fx_rate(currency, "JPY")
+                if rate:
+                    fx_rates[f"{currency}/JPY"] = rate
+
+        # BTC価格も取得
+        btc_data = await self.price_fetcher._fetch_crypto_price("bitcoin")
+        if btc_data:
+            fx_rates["BTC/JPY"] = btc_data['price']
+            fx_rates["BTC/USD"] = btc_data.get('price_usd', 0)
+
+        if fx_rates:
+            _fx_cache["rates"] = fx_rates
+            _fx_cache["fetched_at"] = datetime.now(timezone.utc)
+        return fx_rates
+
+async def schedule_refresh(asset_ids: List) -> bool:
+    """Start a background refresh of the given assets unless one is already
+    running in this process or (via a Redis lock) in another worker."""
+    global _refresh_task
+    if _refresh_task is not None and not _refresh_task.done():
+        return False
+
+    lock_token: Optional[str] = uuid.uuid4().hex
+    try:
+        acquired = await get_redis().set(
+            REFRESH_LOCK_KEY, lock_token, nx=True, ex=settings.PRICE_REFRESH_LOCK_SECONDS
+        )
+        if not acquired:
+            return False
+    except Exception as e:
+        logger.warning(f"Redis lock unavailable, deduplicating refresh in-process only: {e}")
+        lock_token = None
+
+    _refresh_task = asyncio.create_task(_run_refresh(asset_ids, lock_token))
+    return True
+
+async def _run_refresh(asset_ids: List, lock_token: Optional[str]):
+    try:
+        async with AsyncSessionLocal() as db:
+            refresher = PriceRefresher(db)
+            assets = await refresher.get_held_assets(asset_ids)
+            price_results, _ = await refresher.refresh(assets)
+            await publish_event("refresh_complete", {
+                "requested": len(assets),
+                "refreshed": sum(1 for result in price_results.values() if result),
+            })
+    except Exception as e:
+        logger.error(f"Background price refresh failed: {e}")
+    finally:
+        if lock_token is not None:
+            try:
+                await get_redis().eval(_RELEASE_LOCK, 1, REFRESH_LOCK_KEY, lock_token)
+            except Exception as e:
+                logger.warning(f"Failed to release price refresh lock: {e}")
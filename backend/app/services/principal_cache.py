@@ -0,0 +1,158 @@
+import json
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from functools import partial
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import defer_after_commit
+from app.models import User
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "auth:principal"
+# ユーザーごとの無効化の回数。読み込み前の値と変わっていたらキャッシュに書かない
+GENERATION_KEY_PREFIX = "auth:principal-gen"
+
+# 世代が読み込み前と同じときだけSET（無効化と入れ違いに古い行を書き戻さない）
+_SET_IF_GENERATION = """
+if (redis.call('GET', KEYS[1]) or '0') == ARGV[1] then
+    return redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+end
+return false
+"""
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as seen by request handlers (read-only, no secrets)"""
+    id: uuid.UUID
+    username: str
+    email: str
+    is_active: bool
+    is_superuser: bool
+    totp_enabled: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            is_active=bool(user.is_active),
+            is_superuser=bool(user.is_superuser),
+            totp_enabled=bool(user.totp_enabled),
+        )
+
+@dataclass(frozen=True)
+class Generation:
+    """How often a username had been invalidated when its row was read"""
+    local: int
+    shared: Optional[str]  # None = Redisを使わない、または読めなかった
+
+# username -> (期限, Principal)。他ワーカーでの変更はこのTTLで反映される
+_local: Dict[str, Tuple[float, Principal]] = {}
+# username -> このプロセスでの無効化の回数
+_local_generations: Dict[str, int] = {}
+
+def _redis_key(username: str) -> str:
+    return f"{REDIS_KEY_PREFIX}:{username}"
+
+def _generation_key(username: str) -> str:
+    return f"{GENERATION_KEY_PREFIX}:{username}"
+
+async def get_cached_principal(username: str) -> Optional[Principal]:
+    entry = _local.get(username)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+
+    if not settings.AUTH_CACHE_REDIS:
+        return None
+    local_generation = _local_generations.get(username, 0)
+    try:
+        cached = await get_redis().get(_redis_key(username))
+    except Exception as e:
+        logger.warning(f"Principal cache read failed: {e}")
+        return None
+    if cached is None:
+        return None
+
+    data = json.loads(cached)
+    principal = Principal(**{**data, "id": uuid.UUID(data["id"])})
+    if _local_generations.get(username, 0) == local_generation:
+        _store_local(principal)
+    return principal
+
+async def principal_generation(username: str) -> Generation:
+    """Take before loading the user row; pass to cache_principal"""
+    local = _local_generations.get(username, 0)
+    if not settings.AUTH_CACHE_REDIS:
+        return Generation(local, None)
+    try:
+        shared = await get_redis().get(_generation_key(username)) or "0"
+    except Exception as e:
+        logger.warning(f"Principal cache generation read failed: {e}")
+        shared = None
+    return Generation(local, shared)
+
+async def cache_principal(principal: Principal, generation: Generation):
+    """Cache a principal loaded after principal_generation(), unless the user
+    was invalidated in between (the row may then predate the change)"""
+    if _local_generations.get(principal.username, 0) != generation.local:
+        return
+    _store_local(principal)
+    if generation.shared is None:
+        return
+    try:
+        payload = json.dumps({**asdict(principal), "id": str(principal.id)})
+        await get_redis().eval(
+            _SET_IF_GENERATION, 2,
+            _generation_key(principal.username), _redis_key(principal.username),
+            generation.shared, payload, settings.AUTH_CACHE_TTL_SECONDS
+        )
+    except Exception as e:
+        logger.warning(f"Principal cache write failed: {e}")
+
+async def invalidate_principal(username: str):
+    _local.pop(username, None)
+    _local_generations[username] = _local_generations.get(username, 0) + 1
+    if not settings.AUTH_CACHE_REDIS:
+        return
+    try:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.incr(_generation_key(username))
+            pipe.delete(_redis_key(username))
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Principal cache invalidation failed: {e}")
+
+def _store_local(principal: Principal):
+    now = time.monotonic()
+    if len(_local) > 1024:
+        for username in [name for name, (expires, _) in _local.items() if expires <= now]:
+            del _local[username]
+    _local[principal.username] = (now + settings.AUTH_LOCAL_CACHE_TTL_SECONDS, principal)
+
+# ユーザーの変更（TOTP有効化・無効化、削除など）がコミットされたらキャッシュを破棄
+@event.listens_for(Session, "after_flush")
+def _collect_user_changes(session, flush_context):
+    usernames = set()
+    for obj in session.dirty | session.deleted:
+        if isinstance(obj, User):
+            usernames.add(obj.username)
+            usernames.update(inspect(obj).attrs.username.history.deleted or ())
+    if usernames:
+        session.info.setdefault("changed_usernames", set()).update(usernames)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    for username in session.info.pop("changed_usernames", ()):
+        defer_after_commit(session, partial(invalidate_principal, username))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("changed_usernames", None)
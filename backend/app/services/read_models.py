@@ -0,0 +1,151 @@
+from datetime import date
+from typing import Optional, Sequence
+import uuid
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Asset, Holding, Owner, ValuationSnapshot
+
+# 一覧・ダッシュボード用の読み取り専用クエリ。
+# ORMインスタンスを作らず、identity mapにも登録しない（行はRowのタプル）
+
+async def read(db: AsyncSession, statement) -> Sequence[Row]:
+    """Run a select() as Core on the session's connection.
+
+    Same transaction as db, but no ORM loading: rows are plain Row tuples with
+    attribute access, never added to the identity map. Pending ORM changes are
+    not autoflushed, so use this only on read paths.
+    """
+    connection = await db.connection()
+    result = await connection.execute(statement)
+    return result.all()
+
+# ─────────────────────────────
+# 資産・保有・名義人
+# ─────────────────────────────
+
+# AssetResponseと同じ列
+ASSET_COLUMNS = (
+    Asset.id,
+    Asset.symbol,
+    Asset.name,
+    Asset.asset_class,
+    Asset.asset_type,
+    Asset.region,
+    Asset.sub_category,
+    Asset.currency,
+    Asset.exchange,
+    Asset.isin,
+)
+
+# OwnerResponseと同じ列
+OWNER_COLUMNS = (
+    Owner.id,
+    Owner.name,
+    Owner.owner_type,
+    Owner.created_at,
+    Owner.updated_at,
+)
+
+def holding_rows_query():
+    """Holdings joined with their asset and owner, columns only"""
+    return (
+        select(
+            Holding.id,
+            Holding.quantity,
+            Holding.cost_total,
+            Holding.acquisition_date,
+            Holding.account_type,
+            Holding.broker,
+            Holding.notes,
+            Asset.id.label("asset_id"),
+            Asset.symbol,
+            Asset.name,
+            Asset.asset_class,
+            Asset.asset_type,
+            Asset.region,
+            Asset.sub_category,
+            Asset.currency,
+            Owner.id.label("owner_id"),
+            Owner.name.label("owner_name"),
+            Owner.owner_type,
+        )
+        .join(Asset, Holding.asset_id == Asset.id)
+        .join(Owner, Holding.owner_id == Owner.id)  # 名義人情報を含める
+    )
+
+def holding_row_dict(row) -> dict:
+    """A holding_rows_query() row in the HoldingResponse shape"""
+    return {
+        "id": row.id,
+        "asset": {
+            "id": row.asset_id,
+            "symbol": row.symbol,
+            "name": row.name,
+            "asset_class": row.asset_class,
+            "asset_type": row.asset_type,
+            "region": row.region,
+            "sub_category": row.sub_category,
+            "currency": row.currency,
+        },
+        "owner": {
+            "id": row.owner_id,
+            "name": row.owner_name,
+            "owner_type": row.owner_type,
+        },
+        "quantity": row.quantity,
+        "cost_total": row.cost_total,
+        "acquisition_date": row.acquisition_date,
+        "account_type": row.account_type,
+        "broker": row.broker,
+        "notes": row.notes,
+        "cost_per_unit": row.cost_total / row.quantity if row.quantity > 0 else 0.0,
+    }
+
+async def fetch_owners(db: AsyncSession, owner_id: Optional[uuid.UUID] = None) -> Sequence[Row]:
+    query = select(*OWNER_COLUMNS).order_by(Owner.name)
+    if owner_id is not None:
+        query = query.where(Owner.id == owner_id)
+    return await read(db, query)
+
+# ─────────────────────────────
+# 評価額スナップショット
+# ─────────────────────────────
+
+SNAPSHOT_TOTAL_COLUMNS = (
+    ValuationSnapshot.date,
+    ValuationSnapshot.total_jpy,
+    ValuationSnapshot.total_usd,
+    ValuationSnapshot.total_btc,
+)
+
+SNAPSHOT_BREAKDOWN_COLUMNS = (
+    ValuationSnapshot.breakdown_by_category,
+    ValuationSnapshot.breakdown_by_currency,
+    ValuationSnapshot.breakdown_by_account_type,
+)
+
+async def fetch_latest_snapshot(db: AsyncSession) -> Optional[Row]:
+    """Totals, breakdowns and FX rates of the most recent snapshot"""
+    rows = await read(
+        db,
+        select(*SNAPSHOT_TOTAL_COLUMNS, *SNAPSHOT_BREAKDOWN_COLUMNS, ValuationSnapshot.fx_rates)
+        .order_by(ValuationSnapshot.date.desc())
+        .limit(1)
+    )
+    return rows[0] if rows else None
+
+async def fetch_snapshot_total(db: AsyncSession, day: date) -> Optional[float]:
+    rows = await read(db, select(ValuationSnapshot.total_jpy).where(ValuationSnapshot.date == day))
+    return rows[0].total_jpy if rows else None
+
+async def fetch_snapshot_history(db: AsyncSession, start_date: date, breakdowns: bool = False) -> Sequence[Row]:
+    """Daily snapshots since start_date, oldest first (breakdown JSON only when asked for)"""
+    columns = SNAPSHOT_TOTAL_COLUMNS + (SNAPSHOT_BREAKDOWN_COLUMNS if breakdowns else ())
+    return await read(
+        db,
+        select(*columns)
+        .where(ValuationSnapshot.date >= start_date)
+        .order_by(ValuationSnapshot.date)
+    )
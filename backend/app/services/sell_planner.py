@@ -0,0 +1,156 @@
+from typing import List, Dict, Optional
+import numpy as np
+
+from app.services.btc_gain_calculator import OpenLot
+
+# ロット単位売却時のDPの解像度（目標金額をこの数のバケットに分割）
+KNAPSACK_BUCKETS = 2000
+
+class SellPlanner:
+    """Choose which open lots to sell for a target amount or loss harvest"""
+
+    def __init__(self, lots: List[OpenLot], price_jpy: float, tax_rate: float = 0.0):
+        self.lots = [lot for lot in lots if lot.amount_btc > 0]
+        self.price_jpy = price_jpy
+        self.tax_rate = tax_rate
+
+        self.amounts = np.array([lot.amount_btc for lot in self.lots], dtype=float)
+        self.costs = np.array([lot.cost_per_btc for lot in self.lots], dtype=float)
+        self.proceeds = self.amounts * price_jpy
+        self.gains = (price_jpy - self.costs) * self.amounts
+
+    def minimize_gain(self, target_jpy: float, whole_lots: bool = False, max_overshoot: float = 0.05) -> Dict:
+        """Raise target_jpy of proceeds with the smallest realized gain.
+
+        Partial lots are allowed by default, in which case selling the highest
+        cost lots first is optimal (fractional knapsack). With whole_lots the
+        greedy choice is refined by a 0/1 knapsack over bucketed proceeds.
+        """
+        sell = np.zeros(len(self.lots))
+        if len(self.lots) == 0 or target_jpy <= 0:
+            return self._build_plan("min_gain", sell, target_jpy=target_jpy)
+
+        # 1BTCあたりの利益が小さい順 = 取得単価が高い順
+        order = np.argsort(-self.costs, kind="stable")
+        if whole_lots:
+            sell = self._knapsack_cover(order, target_jpy, max_overshoot)
+        else:
+            cumulative = np.cumsum(self.proceeds[order])
+            cut = int(np.searchsorted(cumulative, target_jpy))
+            sell[order[:cut]] = self.amounts[order[:cut]]
+            if cut < len(order):
+                already = cumulative[cut - 1] if cut > 0 else 0.0
+                sell[order[cut]] = (target_jpy - already) / self.price_jpy
+        return self._build_plan("min_gain", sell, target_jpy=target_jpy)
+
+    def harvest_losses(self, loss_limit_jpy: float, whole_lots: bool = False) -> Dict:
+        """Realize losses, largest loss per BTC first, up to loss_limit_jpy"""
+        sell = np.zeros(len(self.lots))
+        loss_idx = np.flatnonzero(self.gains < 0)
+        if len(loss_idx) == 0 or loss_limit_jpy <= 0:
+            return self._build_plan("harvest_loss", sell, loss_limit_jpy=loss_limit_jpy)
+
+        order = loss_idx[np.argsort(self.price_jpy - self.costs[loss_idx], kind="stable")]
+        losses = -self.gains[order]
+        cumulative = np.cumsum(losses)
+        cut = int(np.searchsorted(cumulative, loss_limit_jpy, side="right"))
+        sell[order[:cut]] = self.amounts[order[:cut]]
+        if cut < len(order) and not whole_lots:
+            already = cumulative[cut - 1] if cut > 0 else 0.0
+            loss_per_btc = self.costs[order[cut]] - self.price_jpy
+            sell[order[cut]] = (loss_limit_jpy - already) / loss_per_btc
+        return self._build_plan("harvest_loss", sell, loss_limit_jpy=loss_limit_jpy)
+
+    def _knapsack_cover(self, order: np.ndarray, target_jpy: float, max_overshoot: float) -> np.ndarray:
+        """0/1 knapsack: minimum total gain among lot sets whose proceeds fall
+        within [target, target * (1 + max_overshoot)]"""
+        sell = np.zeros(len(self.lots))
+        resolution = target_jpy / KNAPSACK_BUCKETS
+        upper = int(np.ceil(KNAPSACK_BUCKETS * (1 + max_overshoot)))
+        # 切り捨てにより、DP上で目標到達なら実際の売却額も目標以上になる
+        weights = np.floor(self.proceeds[order] / resolution).astype(int)
+        gains = self.gains[order]
+
+        # dp[b]: 売却額がちょうど b バケットとなる組合せの最小利益
+        dp = np.full(upper + 1, np.inf)
+        dp[0] = 0.0
+        take = np.zeros((len(order), upper + 1), dtype=bool)
+        for i in range(len(order)):
+            w = weights[i]
+            if w > upper:
+                continue
+            candidate = np.full(upper + 1, np.inf)
+            candidate[w:] = dp[:upper + 1 - w] + gains[i]
+            take[i] = candidate < dp
+            dp = np.where(take[i], candidate, dp)
+
+        window = dp[KNAPSACK_BUCKETS:]
+        if np.isfinite(window).any():
+            b = KNAPSACK_BUCKETS + int(np.argmin(window))
+            for i in range(len(order) - 1, -1, -1):
+                if take[i, b]:
+                    sell[order[i]] = self.amounts[order[i]]
+                    b -= weights[i]
+            return sell
+
+        # 許容範囲内の組合せがない場合は、貪欲法で目標を超えるまで売る
+        cumulative = np.cumsum(self.proceeds[order])
+        cut = min(int(np.searchsorted(cumulative, target_jpy)) + 1, len(order))
+        sell[order[:cut]] = self.amounts[order[:cut]]
+        return sell
+
+    def _build_plan(
+        self,
+        objective: str,
+        sell: np.ndarray,
+        target_jpy: Optional[float] = None,
+        loss_limit_jpy: Optional[float] = None
+    ) -> Dict:
+        selected = np.flatnonzero(sell > 0)
+        # 古いロットから表示
+        selected = sorted(selected, key=lambda i: self.lots[i].acquired_at)
+
+        plan_lots = []
+        for i in selected:
+            lot = self.lots[i]
+            amount = float(sell[i])
+            cost_basis = amount * lot.cost_per_btc
+            proceeds = amount * self.price_jpy
+            plan_lots.append({
+                "trade_id": str(lot.trade_id),
+                "acquired_at": lot.acquired_at,
+                "exchange": lot.exchange,
+                "available_btc": lot.amount_btc,
+                "sell_btc": amount,
+                "cost_per_btc": lot.cost_per_btc,
+                "proceeds_jpy": proceeds,
+                "cost_basis_jpy": cost_basis,
+                "realized_gain_jpy": proceeds - cost_basis,
+            })
+
+        total_btc = float(sell.sum())
+        proceeds_jpy = total_btc * self.price_jpy
+        cost_basis_jpy = float((sell * self.costs).sum())
+        realized_gain = proceeds_jpy - cost_basis_jpy
+
+        if objective == "min_gain":
+            target_met = proceeds_jpy >= (target_jpy or 0) * (1 - 1e-9)
+        else:
+            target_met = -realized_gain >= (loss_limit_jpy or 0) * (1 - 1e-9)
+
+        return {
+            "objective": objective,
+            "price_jpy": self.price_jpy,
+            "target_jpy": target_jpy,
+            "loss_limit_jpy": loss_limit_jpy,
+            "target_met": bool(target_met),
+            "open_lots": len(self.lots),
+            "total_btc": total_btc,
+            "proceeds_jpy": proceeds_jpy,
+            "cost_basis_jpy": cost_basis_jpy,
+            "realized_gain_jpy": realized_gain,
+            "tax_rate": self.tax_rate,
+            # 損失は他の雑所得と通算できる前提で、負の税額 = 節税額
+            "estimated_tax_jpy": realized_gain * self.tax_rate,
+            "lots": plan_lots,
+        }
@@ -5,8 +5,10 @@ from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 import logging
 
-from app.models import Holding, Asset, Price, ValuationSnapshot, BTCTrade
+from app.models import Holding, Asset, LatestPrice, Price, ValuationSnapshot, BTCTrade
 from app.services.price_fetcher import PriceFetcher
+from app.services.price_ingestion import PriceIngestor
+from app.services.btc_gain_calculator import BTCGainCalculator
 
 logger = logging.getLogger(__name__)
 
@@ -131,15 +133,22 @@ class ValuationCalculator:
     
     async def _get_latest_price(self, asset: Asset, target_date: date) -> Optional[float]:
         """Get latest price for an asset"""
-        # First try to get price from database
+        # First try to get price from database（通常は latest_prices の主キー検索で済む）
         result = await self.db.execute(
-            select(Price)
-            .where(Price.asset_id == asset.id)
-            .where(Price.date <= target_date)
-            .order_by(Price.date.desc())
-            .limit(1)
+            select(LatestPrice.date, LatestPrice.price).where(LatestPrice.asset_id == asset.id)
         )
-        price_record = result.scalar_one_or_none()
+        price_record = result.first()
+        
+        if price_record and price_record.date > target_date:
+            # 過去日の評価: その日以前の最新価格
+            result = await self.db.execute(
+                select(Price.date, Price.price)
+                .where(Price.asset_id == asset.id)
+                .where(Price.date <= target_date)
+                .order_by(Price.date.desc())
+                .limit(1)
+            )
+            price_record = result.first()
         
         if price_record:
             logger.info(f"💾 Found cached price for {asset.symbol}: {price_record.price}")
@@ -153,27 +162,20 @@ class ValuationCalculator:
         # If no price in database, try to fetch
         logger.info(f"🌐 Fetching live price for {asset.symbol}")
         
-        # 🔧 修正: asset_class は Enum オブジェクトなので .value でアクセス
-        if asset.asset_class and asset.asset_class.value == "Crypto":
-            price_data = await self.price_fetcher.fetch_crypto_price(asset.symbol.lower())
-        else:
-            price_data = await self.price_fetcher.fetch_price(asset.symbol)
+        # 🔧 修正: asset_class は Enum オブジェクトなので .value でアクセス（暗号資産はfetch_price内でCoinGeckoへ）
+        price_data = await self.price_fetcher.fetch_price(
+            asset.symbol,
+            asset.asset_class.value if asset.asset_class else "Equity",
+            asset.currency
+        )
         
         if price_data:
-            # Save fetched price
-            new_price = Price(
-                asset_id=asset.id,
-                date=price_data['date'],
-                price=price_data['price'],
-                open=price_data.get('open'),
-                high=price_data.get('high'),
-                low=price_data.get('low'),
-                volume=price_data.get('volume'),
-                source=price_data.get('source')
-            )
-            self.db.add(new_price)
-            await self.db.commit()
-            logger.info(f"💾 Saved new price for {asset.symbol}: {price_data['price']}")
+            # Save fetched price（他の取得経路と同じUPSERT）
+            ingestor = PriceIngestor(self.db)
+            ingestor.add(asset.id, price_data)
+            report = await ingestor.flush()
+            if not report.failed:
+                logger.info(f"💾 Saved new price for {asset.symbol}: {price_data['price']}")
             return price_data['price']
         
         logger.warning(f"❌ Failed to fetch price for {asset.symbol}")
@@ -190,7 +192,7 @@ class ValuationCalculator:
                 rates[f"{from_curr}/{to_curr}"] = rate
         
         # Get crypto rates
-        btc_data = await self.price_fetcher.fetch_crypto_price("bitcoin")
+        btc_data = await self.price_fetcher._fetch_crypto_price("bitcoin")
         if btc_data:
             rates["BTC/JPY"] = btc_data['price']
             rates["BTC/USD"] = btc_data.get('price_usd', 0)
@@ -199,8 +201,9 @@ class ValuationCalculator:
     
     async def _calculate_btc_holdings(self) -> float:
         """Calculate total BTC holdings from trades"""
+        btc_filter = await BTCGainCalculator(self.db).trade_filter()
         result = await self.db.execute(
-            select(func.sum(BTCTrade.amount_btc))
+            select(func.sum(BTCTrade.amount_btc)).where(btc_filter)
         )
         total_btc = result.scalar()
         return total_btc or 0.0
\ No newline at end of file
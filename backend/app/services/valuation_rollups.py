@@ -0,0 +1,117 @@
+from datetime import date, timedelta
+from typing import Iterable, Sequence, Set, Tuple
+from sqlalchemy import and_, delete, event, func, insert, inspect, literal, select, true
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import ValuationRollup, ValuationSnapshot
+from app.services.read_models import read
+
+ROLLUP_GRANULARITIES = ("week", "month", "year")
+
+def period_bounds(day: date, granularity: str) -> Tuple[date, date]:
+    """[start, end) of the week (Monday start), month or year containing day"""
+    if granularity == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    if granularity == "month":
+        start = day.replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    if granularity == "year":
+        start = day.replace(month=1, day=1)
+        return start, start.replace(year=start.year + 1)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+def rollup_statements(granularity: str, day: date) -> list:
+    """Recompute the rollup row of the period containing day from its snapshots.
+
+    Delete + INSERT ... SELECT, so a period whose snapshots were all deleted
+    simply loses its row.
+    """
+    start, end = period_bounds(day, granularity)
+    in_period = and_(ValuationSnapshot.date >= start, ValuationSnapshot.date < end)
+
+    last = (
+        select(ValuationSnapshot)
+        .where(in_period)
+        .order_by(ValuationSnapshot.date.desc())
+        .limit(1)
+        .subquery()
+    )
+    stats = (
+        select(
+            func.max(ValuationSnapshot.total_jpy).label("high_jpy"),
+            func.min(ValuationSnapshot.total_jpy).label("low_jpy"),
+            func.count().label("snapshot_count"),
+        )
+        .where(in_period)
+        .subquery()
+    )
+    source = select(
+        literal(granularity),
+        literal(start),
+        last.c.date,
+        last.c.total_jpy,
+        last.c.total_usd,
+        last.c.total_btc,
+        last.c.breakdown_by_category,
+        last.c.breakdown_by_currency,
+        last.c.breakdown_by_account_type,
+        stats.c.high_jpy,
+        stats.c.low_jpy,
+        stats.c.snapshot_count,
+    ).select_from(last.join(stats, true()))
+
+    return [
+        delete(ValuationRollup).where(
+            ValuationRollup.granularity == granularity,
+            ValuationRollup.period_start == start
+        ),
+        insert(ValuationRollup).from_select(
+            [
+                "granularity", "period_start", "last_date",
+                "total_jpy", "total_usd", "total_btc",
+                "breakdown_by_category", "breakdown_by_currency", "breakdown_by_account_type",
+                "high_jpy", "low_jpy", "snapshot_count",
+            ],
+            source
+        ),
+    ]
+
+def affected_periods(days: Iterable[date]) -> Set[Tuple[str, date]]:
+    return {
+        (granularity, period_bounds(day, granularity)[0])
+        for day in days
+        for granularity in ROLLUP_GRANULARITIES
+    }
+
+async def fetch_rollups(db: AsyncSession, granularity: str, start_date: date) -> Sequence[Row]:
+    """Rollup rows of every period overlapping [start_date, today]"""
+    first_period, _ = period_bounds(start_date, granularity)
+    return await read(
+        db,
+        select(ValuationRollup.__table__)
+        .where(
+            ValuationRollup.granularity == granularity,
+            ValuationRollup.period_start >= first_period
+        )
+        .order_by(ValuationRollup.period_start)
+    )
+
+# スナップショットの追加・更新・削除と同じトランザクションでロールアップを更新
+@event.listens_for(Session, "after_flush")
+def _refresh_rollups(session, flush_context):
+    days = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, ValuationSnapshot):
+            days.add(obj.date)
+            # 日付が変更された場合は元の期間も再計算
+            days.update(inspect(obj).attrs.date.history.deleted or ())
+    if not days:
+        return
+
+    connection = session.connection()
+    for granularity, period_start in affected_periods(days):
+        for statement in rollup_statements(granularity, period_start):
+            connection.execute(statement)
@@ -1,16 +1,18 @@
 from celery import Celery
 from celery.schedules import crontab
 from datetime import datetime, date
-import asyncio
-from sqlalchemy import select
+from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 
 from app.config import settings
-from app.database import AsyncSessionLocal
-from app.models import Asset, Price, Holding, ValuationSnapshot, CashBalance
-from app.services.price_fetcher import PriceFetcher
+from app.database import AsyncSessionLocal, run_async
+from app.models import CashBalance
+from app.services.price_pipeline import PricePipeline
 from app.services.valuation_calculator import ValuationCalculator
+from app.services import dashboard_cache  # noqa: F401 スナップショット書き込み時のキャッシュ無効化を登録
+from app.services import valuation_rollups  # noqa: F401 スナップショット書き込み時のロールアップ更新を登録
+from app.services.live_events import publish_event_sync
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +43,10 @@ try:
                     minute=settings.PRICE_FETCH_MINUTE + 10  # 10 minutes after price fetch
                 ),
             },
+            'ensure-price-partitions': {
+                'task': 'app.tasks.scheduled_tasks.ensure_price_partitions',
+                'schedule': crontab(day_of_month=1, hour=3, minute=0),
+            },
             'scrape-money-forward': {
                 'task': 'app.tasks.scheduled_tasks.scrape_money_forward',
                 'schedule': crontab(
@@ -79,71 +85,43 @@ def setup_periodic_tasks():
         logger.warning("Celery not available - periodic tasks disabled")
 
 @celery_app.task
-def fetch_daily_prices():
-    """Fetch latest prices for all assets"""
+def fetch_daily_prices(dry_run: bool = False):
+    """Fetch latest prices for all assets (dry_run: only return the fetch plan)"""
     if not CELERY_AVAILABLE:
         logger.warning("Celery not available - skipping price fetch")
         return
-    asyncio.run(_fetch_daily_prices())
+    if dry_run:
+        return run_async(_plan_daily_prices)
+    return run_async(_fetch_daily_prices)
+
+async def _plan_daily_prices():
+    plan = (await PricePipeline().plan()).as_dict()
+    logger.info(
+        f"Daily price fetch plan: {plan['assets']} assets, {plan['symbols']} symbols, "
+        f"{plan['upstream_calls']} upstream calls {plan['by_provider']}"
+    )
+    return plan
 
 async def _fetch_daily_prices():
-    async with AsyncSessionLocal() as db:
-        try:
-            # Get all unique assets from holdings
-            result = await db.execute(
-                select(Asset).distinct()
-            )
-            assets = result.scalars().all()
-            
-            price_fetcher = PriceFetcher()
-            
-            for asset in assets:
-                try:
-                    # Skip if we already have today's price
-                    existing = await db.execute(
-                        select(Price).where(
-                            Price.asset_id == asset.id,
-                            Price.date == date.today()
-                        )
-                    )
-                    if existing.scalar_one_or_none():
-                        continue
-                    
-                    # 🔧 修正: symbolがNoneの場合をスキップ
-                    if not asset.symbol:
-                        logger.warning(f"Skipping asset {asset.name} - no symbol")
-                        continue
-                    
-                    # Fetch price based on asset type
-                    # 🔧 修正: asset_class は Enum なので .value でアクセス
-                    if asset.asset_class and asset.asset_class.value == "Crypto":
-                        price_data = await price_fetcher.fetch_crypto_price(asset.symbol.lower())
-                    else:
-                        price_data = await price_fetcher.fetch_price(asset.symbol)
-                    
-                    if price_data:
-                        # Save price
-                        price = Price(
-                            asset_id=asset.id,
-                            date=price_data['date'],
-                            price=price_data['price'],
-                            open=price_data.get('open'),
-                            high=price_data.get('high'),
-                            low=price_data.get('low'),
-                            volume=price_data.get('volume'),
-                            source=price_data.get('source')
-                        )
-                        db.add(price)
-                        logger.info(f"Fetched price for {asset.symbol}: {price_data['price']}")
-                    
-                except Exception as e:
-                    logger.error(f"Error fetching price for {asset.symbol}: {e}")
-            
-            await db.commit()
-            logger.info("Daily price fetch completed")
-            
-        except Exception as e:
-            logger.error(f"Error in daily price fetch: {e}")
+    try:
+        # 取得・解析・書き込みをステージごとに並行実行（書き込みはバッチごとにコミット）
+        report = await PricePipeline().run()
+        stats = report.as_dict()
+        logger.info(
+            f"Daily price fetch completed in {stats['elapsed_seconds']}s: "
+            f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['failed']} failed"
+        )
+        for name, stage in stats["stages"].items():
+            logger.info(f"  {name}: {stage}")
+        
+        publish_event_sync("refresh_complete", {
+            "requested": report.stages["planner"].processed,
+            "refreshed": report.written,
+        })
+        return stats
+        
+    except Exception as e:
+        logger.error(f"Error in daily price fetch: {e}")
 
 @celery_app.task
 def calculate_daily_valuation():
@@ -151,7 +129,7 @@ def calculate_daily_valuation():
     if not CELERY_AVAILABLE:
         logger.warning("Celery not available - skipping valuation calculation")
         return
-    asyncio.run(_calculate_daily_valuation())
+    run_async(_calculate_daily_valuation)
 
 async def _calculate_daily_valuation():
     async with AsyncSessionLocal() as db:
@@ -167,13 +145,34 @@ async def _calculate_daily_valuation():
         except Exception as e:
             logger.error(f"Error in daily valuation calculation: {e}")
 
+@celery_app.task
+def ensure_price_partitions():
+    """Create next year's prices partition ahead of time"""
+    if not CELERY_AVAILABLE:
+        logger.warning("Celery not available - skipping partition maintenance")
+        return
+    run_async(_ensure_price_partitions)
+
+async def _ensure_price_partitions():
+    async with AsyncSessionLocal() as db:
+        try:
+            # 今年・来年に加え、デフォルトパーティションに入ってしまった年も切り出す
+            result = await db.execute(text("SELECT DISTINCT extract(year FROM date)::int FROM prices_default"))
+            years = {date.today().year, date.today().year + 1} | set(result.scalars())
+            for year in sorted(years):
+                await db.execute(text("SELECT ensure_prices_partition(:year)"), {"year": year})
+            await db.commit()
+            logger.info(f"Price partitions ensured for {sorted(years)}")
+        except Exception as e:
+            logger.error(f"Error ensuring price partitions: {e}")
+
 @celery_app.task
 def scrape_money_forward():
     """Run Money Forward scraper"""
     if not CELERY_AVAILABLE:
         logger.warning("Celery not available - skipping Money Forward scrape")
         return
-    asyncio.run(_scrape_money_forward())
+    run_async(_scrape_money_forward)
 
 async def _scrape_money_forward():
     try:
@@ -0,0 +1,96 @@
+"""Per-row serialization cost of list endpoints: Pydantic + response_model vs orjson rows.
+
+    cd backend && python scripts/bench_serialization.py [rows]
+
+No database needed; both paths start from rows that are already loaded.
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/bench")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("SECRET_KEY", "bench")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData
+
+from app.api.btc_trades import BTCTradeResponse
+from app.models import BTCTrade
+from app.responses import rows_response
+
+COLUMNS = [
+    "id", "asset_id", "txid", "amount_btc", "counter_value_jpy", "jpy_rate",
+    "fee_btc", "fee_jpy", "timestamp", "exchange", "trade_type", "notes",
+]
+
+def make_rows(n: int):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(n):
+        amount = 0.01 if i % 3 else -0.005
+        rows.append((
+            uuid.uuid4(), None, f"tx{i}", amount, amount * 5_000_000, 5_000_000.0,
+            0.0, 100.0, start + timedelta(hours=i), "bitFlyer",
+            "buy" if amount > 0 else "sell", None,
+        ))
+    return rows
+
+def legacy_path(trades: List[BTCTrade], field) -> bytes:
+    """ORM objects -> hand-written Pydantic models -> response_model validation -> json"""
+    models = [
+        BTCTradeResponse(
+            id=str(trade.id),
+            asset_id=str(trade.asset_id) if trade.asset_id else None,
+            txid=trade.txid,
+            amount_btc=trade.amount_btc,
+            counter_value_jpy=trade.counter_value_jpy,
+            jpy_rate=trade.jpy_rate,
+            fee_btc=trade.fee_btc,
+            fee_jpy=trade.fee_jpy,
+            timestamp=trade.timestamp,
+            exchange=trade.exchange,
+            trade_type="buy" if trade.amount_btc > 0 else "sell",
+            notes=trade.notes
+        )
+        for trade in trades
+    ]
+    content = asyncio.run(serialize_response(field=field, response_content=models))
+    return JSONResponse(content).body
+
+def fast_path(rows) -> bytes:
+    """Result tuples -> dict per row -> orjson"""
+    result = IteratorResult(SimpleResultMetaData(COLUMNS), iter(rows))
+    return rows_response(result).body
+
+def bench(func, repeat: int = 5) -> float:
+    return min(_timed(func) for _ in range(repeat))
+
+def _timed(func) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rows = make_rows(n)
+    trades = [BTCTrade(**{k: v for k, v in zip(COLUMNS, row) if k != "trade_type"}) for row in rows]
+    field = create_response_field(name="response", type_=List[BTCTradeResponse])
+
+    legacy = bench(lambda: legacy_path(trades, field))
+    fast = bench(lambda: fast_path(rows))
+
+    print(f"rows: {n}")
+    print(f"pydantic + response_model: {legacy * 1000:8.1f} ms  ({legacy / n * 1e6:6.2f} us/row)")
+    print(f"orjson rows:               {fast * 1000:8.1f} ms  ({fast / n * 1e6:6.2f} us/row)")
+    print(f"speedup: {legacy / fast:.1f}x")
+
+if __name__ == "__main__":
+    main()
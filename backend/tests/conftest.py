@@ -0,0 +1,56 @@
+import os
+
+# app.config の必須設定（テストでは実際には接続しない）
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/15")
+os.environ.setdefault("SECRET_KEY", "test")
+# 計画外の遅延ロードを例外にする（app.database の読み込み時に参照される）
+os.environ.setdefault("STRICT_ORM_LOADING", "true")
+
+import httpx
+import pytest
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+pytest.importorskip("aiosqlite")
+
+from app.database import AppSession, Base, get_db, get_read_db
+from app.api.auth import get_current_user
+from app.main import app as api
+
+# テストはインメモリのSQLiteで動かす（PostgreSQLのUUID型は文字列として保存）
+@compiles(UUID, "sqlite")
+def _compile_uuid_sqlite(type_, compiler, **kw):
+    return "CHAR(36)"
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def engine():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+@pytest.fixture
+def sessions(engine):
+    return async_sessionmaker(engine, class_=AppSession, expire_on_commit=False)
+
+@pytest.fixture
+async def client(sessions):
+    """API client on the test database, authenticated as a dummy user"""
+    async def _get_db():
+        async with sessions() as session:
+            yield session
+
+    api.dependency_overrides[get_db] = _get_db
+    api.dependency_overrides[get_read_db] = _get_db
+    api.dependency_overrides[get_current_user] = lambda: None
+    async with httpx.AsyncClient(app=api, base_url="http://test") as client:
+        yield client
+    api.dependency_overrides.clear()
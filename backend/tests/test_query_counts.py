@@ -0,0 +1,49 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from app.models import Asset, LatestPrice
+from app.models.asset import AssetClass
+
+pytestmark = pytest.mark.anyio
+
+async def add_priced_assets(sessions, count: int, start: int = 0):
+    # SQLiteにはlatest_pricesを更新するトリガーがないので直接書く
+    async with sessions() as db:
+        for i in range(start, start + count):
+            asset = Asset(symbol=f"SYM{i}", name=f"Asset {i}", asset_class=AssetClass.Equity, currency="JPY")
+            db.add(asset)
+            await db.flush()
+            db.add(LatestPrice(asset_id=asset.id, date=date(2024, 1, 5), price=100.0 + i, source="test"))
+        await db.commit()
+
+async def get_counting_queries(engine, client, url: str):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = await client.get(url)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    return response.json(), len(statements)
+
+@pytest.mark.parametrize("url, prices_of", [
+    ("/api/prices/latest", lambda body: body),
+    ("/api/dashboard/prices", lambda body: body["prices"]),
+])
+async def test_latest_prices_query_count_does_not_grow_with_assets(engine, sessions, client, url, prices_of):
+    await add_priced_assets(sessions, 1)
+    body, one_asset = await get_counting_queries(engine, client, url)
+    assert len(prices_of(body)) == 1
+
+    await add_priced_assets(sessions, 24, start=1)
+    body, many_assets = await get_counting_queries(engine, client, url)
+    assert len(prices_of(body)) == 25
+
+    assert one_asset > 0
+    assert many_assets == one_asset
@@ -0,0 +1,62 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session
+
+from app import database
+from app.config import settings
+from app.models import Asset, Holding, Owner
+from app.models.asset import AssetClass
+from app.models.holding import AccountType
+from app.models.owner import OwnerType
+
+pytestmark = pytest.mark.anyio
+
+async def add_holding(sessions):
+    async with sessions() as db:
+        asset = Asset(symbol="VTI", name="Vanguard Total Stock", asset_class=AssetClass.Equity, currency="USD")
+        owner = Owner(name="me", owner_type=OwnerType.self)
+        db.add_all([asset, owner])
+        await db.flush()
+        holding = Holding(
+            asset_id=asset.id, owner_id=owner.id, quantity=2, cost_total=400,
+            acquisition_date=date(2024, 1, 5), account_type=AccountType.specific,
+        )
+        db.add(holding)
+        await db.commit()
+        return asset.id, owner.id, holding.id
+
+async def test_strict_loading_is_enabled(sessions):
+    assert settings.STRICT_ORM_LOADING
+    assert event.contains(Session, "do_orm_execute", database._raiseload_unplanned_relationships)
+    await add_holding(sessions)
+    async with sessions() as db:
+        holding = (await db.execute(select(Holding))).scalar_one()
+        with pytest.raises(InvalidRequestError):
+            holding.asset
+
+async def test_holdings_list_runs_under_raiseload(sessions, client):
+    asset_id, owner_id, _ = await add_holding(sessions)
+
+    response = await client.get("/api/holdings/")
+    assert response.status_code == 200
+    [holding] = response.json()
+    assert holding["asset"]["id"] == str(asset_id)
+    assert holding["owner"]["id"] == str(owner_id)
+
+async def test_deletes_run_under_raiseload(sessions, client):
+    asset_id, owner_id, holding_id = await add_holding(sessions)
+
+    # 保有がある間は拒否（コレクションを読み込まずに確認する）
+    assert (await client.delete(f"/api/owners/{owner_id}")).status_code == 400
+    assert (await client.delete(f"/api/assets/{asset_id}")).status_code == 400
+
+    assert (await client.delete(f"/api/holdings/{holding_id}")).status_code == 200
+    assert (await client.delete(f"/api/owners/{owner_id}")).status_code == 200
+    assert (await client.delete(f"/api/assets/{asset_id}")).status_code == 200
+
+    async with sessions() as db:
+        assert (await db.execute(select(Asset.id))).first() is None
+        assert (await db.execute(select(Owner.id))).first() is None
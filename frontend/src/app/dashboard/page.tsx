@@ -1,6 +1,6 @@
 'use client'
 
-import { useQuery } from '@tanstack/react-query'
+import { useQuery, useQueryClient } from '@tanstack/react-query'
 import { dashboardAPI, pricesAPI, useAuthStore } from '@/lib/api'
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
 import { NetWorthChart } from '@/components/charts/NetWorthChart'
@@ -16,6 +16,7 @@ export default function DashboardPage() {
   const [isRefreshing, setIsRefreshing] = useState(false)
   const [currentPrices, setCurrentPrices] = useState<any>(null)
   const router = useRouter()
+  const queryClient = useQueryClient()
   
   const { token, isAuthenticated } = useAuthStore()
 
@@ -26,7 +27,7 @@ export default function DashboardPage() {
     }
   }, [isAuthenticated, router])
 
-  // ダッシュボードデータ取得
+  // ダッシュボードデータ取得（キャッシュ付きの overview を使う。失敗はそのままエラー表示へ）
   const { data, isLoading, error, refetch } = useQuery({
     queryKey: ['dashboard'],
     queryFn: dashboardAPI.overview,
@@ -44,10 +45,28 @@ export default function DashboardPage() {
     queryKey: ['current-prices'],
     queryFn: pricesAPI.current,
     enabled: isAuthenticated(),
-    refetchInterval: 5 * 60 * 1000, // 5分おきに自動更新
-    refetchIntervalInBackground: false,
   })
 
+  // ライブイベントでキャッシュを無効化（ポーリングの代わり）
+  useEffect(() => {
+    if (!isAuthenticated()) {
+      return
+    }
+    return dashboardAPI.subscribe((event) => {
+      switch (event.type) {
+        case 'prices':
+        case 'fx':
+          queryClient.invalidateQueries({ queryKey: ['current-prices'] })
+          break
+        case 'valuation':
+        case 'refresh_complete':
+          queryClient.invalidateQueries({ queryKey: ['dashboard'] })
+          queryClient.invalidateQueries({ queryKey: ['current-prices'] })
+          break
+      }
+    })
+  }, [token, isAuthenticated, queryClient])
+
   useEffect(() => {
     if (pricesData) {
       setCurrentPrices(pricesData)
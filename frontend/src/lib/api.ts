@@ -5,14 +5,21 @@ import type {
   User, 
   Asset, 
   AssetCreate, 
+  AssetUpdate,
+  AssetBulkResult,
   Owner,
   OwnerCreate,
   OwnerUpdate,
   Holding, 
   HoldingCreate, 
+  HoldingUpdate,
+  HoldingBulkResult,
   BTCTrade, 
   BTCTradeCreate, 
-  DashboardData 
+  DashboardData,
+  DashboardBootstrap,
+  LiveEvent,
+  PriceHistoryColumns
 } from '@/types'
 
 
@@ -216,6 +223,17 @@ export const assetsAPI = {
     await api.delete(`/api/assets/${id}`)
   },
 
+  // 一括登録・更新（エラーの行以外は反映される）
+  bulkCreate: async (assets: AssetCreate[]) => {
+    const response = await api.post<AssetBulkResult>('/api/assets/bulk', { assets })
+    return response.data
+  },
+
+  bulkUpdate: async (assets: (AssetUpdate & { id: string })[]) => {
+    const response = await api.put<AssetBulkResult>('/api/assets/bulk', { assets })
+    return response.data
+  },
+
   search: async (query: string) => {
     const response = await api.get(`/api/assets/search/${query}`)
     return response.data
@@ -272,6 +290,17 @@ export const holdingsAPI = {
 
   delete: async (id: string) => {
     await api.delete(`/api/holdings/${id}`)
+  },
+
+  // 一括登録・更新（エラーの行以外は反映される）
+  bulkCreate: async (holdings: HoldingCreate[]) => {
+    const response = await api.post<HoldingBulkResult>('/api/holdings/bulk', { holdings })
+    return response.data
+  },
+
+  bulkUpdate: async (holdings: (HoldingUpdate & { id: string })[]) => {
+    const response = await api.put<HoldingBulkResult>('/api/holdings/bulk', { holdings })
+    return response.data
   }
 }
 
@@ -312,9 +341,16 @@ export const dashboardAPI = {
     return response.data
   },
 
-  history: async (days: number = 365) => {
+  // 概要・サマリー・保有・最新価格・BTCサマリーを1リクエストで取得
+  bootstrap: async () => {
+    const response = await api.get<DashboardBootstrap>('/api/dashboard/bootstrap')
+    return response.data
+  },
+
+  // granularity: week/month/year は期間ごとの集計行を返す（長期チャート向け）
+  history: async (days: number = 365, granularity: 'day' | 'week' | 'month' | 'year' = 'day') => {
     const response = await api.get('/api/dashboard/history', {
-      params: { days }
+      params: { days, granularity }
     })
     return response.data
   },
@@ -322,6 +358,53 @@ export const dashboardAPI = {
   refreshPrices: async () => {
     const response = await api.post('/api/dashboard/refresh-prices')
     return response.data
+  },
+
+  // SSEで価格・FX・評価額の更新を受け取る（EventSourceはヘッダーを付けられないのでfetchで読む）
+  // 戻り値の関数を呼ぶと購読を終了する
+  subscribe: (onEvent: (event: LiveEvent) => void) => {
+    const controller = new AbortController()
+
+    const connect = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          const token = useAuthStore.getState().token
+          const response = await fetch(`${API_URL}/api/dashboard/stream`, {
+            headers: token ? { Authorization: `Bearer ${token}` } : {},
+            signal: controller.signal,
+          })
+          if (!response.ok || !response.body) {
+            throw new Error(`Stream failed: ${response.status}`)
+          }
+
+          const reader = response.body.getReader()
+          const decoder = new TextDecoder()
+          let buffer = ''
+          while (true) {
+            const { value, done } = await reader.read()
+            if (done) break
+            buffer += decoder.decode(value, { stream: true })
+            const frames = buffer.split('\n\n')
+            buffer = frames.pop() ?? ''
+            for (const frame of frames) {
+              const data = frame
+                .split('\n')
+                .filter((line) => line.startsWith('data: '))
+                .map((line) => line.slice(6))
+                .join('\n')
+              if (data) onEvent(JSON.parse(data))
+            }
+          }
+        } catch (error) {
+          if (controller.signal.aborted) return
+          console.warn('Live stream disconnected, reconnecting:', error)
+        }
+        await new Promise((resolve) => setTimeout(resolve, 5000))
+      }
+    }
+
+    connect()
+    return () => controller.abort()
   }
 }
 
@@ -351,6 +434,17 @@ export const pricesAPI = {
     return response.data
   },
 
+  // 複数資産の価格を共通の日付軸に揃えた列形式で取得
+  historyBulk: async (assetIds: string[], startDate?: string, endDate?: string, points?: number) => {
+    const response = await api.post<PriceHistoryColumns>('/api/prices/history/bulk', {
+      asset_ids: assetIds,
+      start_date: startDate,
+      end_date: endDate,
+      points
+    })
+    return response.data
+  },
+
   fetch: async (assetId: string) => {
     const response = await api.post(`/api/prices/fetch/${assetId}`)
     return response.data
@@ -84,6 +84,15 @@ export interface User {
     isin?: string
   }
   
+  // ─────────────────────────────────────────────
+  // 一括登録・更新 (POST / PUT /api/assets/bulk, /api/holdings/bulk)
+  // ─────────────────────────────────────────────
+
+  export interface BulkRowError {
+    index: number  // リクエスト内の行番号（0始まり）
+    error: string
+  }
+
   export type AccountType =
   | "NISA_growth"
   | "NISA_reserve"
@@ -131,6 +140,18 @@ export interface User {
     notes?: string
   }
   
+  export interface AssetBulkResult {
+    processed: number
+    errors: BulkRowError[]
+    assets: Asset[]
+  }
+
+  export interface HoldingBulkResult {
+    processed: number
+    errors: BulkRowError[]
+    holdings: Holding[]
+  }
+
   export interface HoldingUpdate {
     asset_id?: string
     owner_id?: string
@@ -156,6 +177,7 @@ export interface User {
   
   export interface BTCTrade {
     id: string  // UUID string
+    asset_id?: string  // 暗号資産のUUID（未設定はBTC）
     txid?: string
     amount_btc: number
     counter_value_jpy: number
@@ -168,6 +190,7 @@ export interface User {
   }
   
   export interface BTCTradeCreate {
+    asset_id?: string
     txid?: string
     amount_btc: number
     counter_value_jpy: number
@@ -193,4 +216,33 @@ export interface User {
       total_jpy: number
       total_usd: number
     }>
-  }
\ No newline at end of file
+  }
+
+  // /api/dashboard/bootstrap（初回表示用にまとめて取得、失敗したセクションは null）
+  export interface DashboardBootstrap {
+    overview: DashboardData | null
+    summary: Record<string, any> | null
+    holdings: Holding[] | null
+    latest_prices: Record<string, any> | null
+    btc_summary: Record<string, any> | null
+    timings_ms: Record<string, number>
+    errors: Record<string, string>
+  }
+
+  // /api/dashboard/stream のイベント
+  export type LiveEvent =
+    | { type: 'prices'; data: Array<{ asset_id: string; date: string; price: number; source?: string }> }
+    | { type: 'fx'; data: Record<string, number> }
+    | { type: 'refresh_complete'; data: { requested: number; refreshed: number } }
+    | { type: 'valuation'; data: { date: string; total_jpy: number; total_usd: number; total_btc: number } }
+
+  // /api/prices/history/bulk のレスポンス（series は dates と同じ長さ、価格なしは null）
+  export interface PriceHistoryColumns {
+    start_date: string
+    end_date: string
+    dates: string[]
+    series: Record<string, Array<number | null>>
+    // points 指定時のみ（series はバケットの終値）
+    ohlc?: Record<string, { open: Array<number | null>; high: Array<number | null>; low: Array<number | null> }>
+    assets: Array<{ asset_id: string; symbol?: string; name: string; currency: string }>
+  }